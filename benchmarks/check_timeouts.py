@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Verifica que un webhook lento se reporte como timeout.
+
+Levanta `mock_n8n.py` en el mismo proceso con una latencia mayor que
+`WEBHOOK_TIMEOUT_SECONDS` y comprueba que la consulta y la carga de un
+archivo retornan el mensaje de timeout (y no el de error de conexión) y que
+las métricas clasifican las llamadas como timeout.
+
+También comprueba, sin red, que el timeout adaptativo vuelve a subir cuando
+el backend se pone lento y que la petición de prueba de un circuito
+semiabierto usa el timeout completo. Termina con código 1 si alguna
+comprobación falla.
+
+Uso:
+    python benchmarks/check_timeouts.py
+"""
+
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+CORE_DIR = ROOT / "core"
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from mock_n8n import CHAT_PATH, UPLOAD_PATH, MockSettings, start_server
+from run_benchmarks import BenchmarkFile
+
+TIMEOUT_SECONDS = 1
+LATENCY_MS = 2500
+
+def check_adaptive_timeout(failures: list[str]) -> None:
+    """El timeout adaptativo se recupera tras una racha de timeouts"""
+    from config import get_config
+    from metrics import OUTCOME_SUCCESS, OUTCOME_TIMEOUT, CallRecord, registry
+    from resilience import get_circuit_breaker, webhook_timeout
+
+    config = get_config()
+    config.ADAPTIVE_TIMEOUT_ENABLED = True
+    config.ADAPTIVE_TIMEOUT_MIN_SECONDS = 0.5
+    config.WEBHOOK_TIMEOUT_SECONDS = 30
+    webhook = "check-adaptive"
+
+    def record(latency: float, outcome: str) -> None:
+        call = CallRecord()
+        call.outcome = outcome
+        registry.record(webhook, latency, call)
+
+    for _ in range(config.ADAPTIVE_TIMEOUT_MIN_SAMPLES):
+        record(0.2, OUTCOME_SUCCESS)
+    _, fast_timeout = webhook_timeout(webhook)
+    # El backend se vuelve lento: todas las llamadas agotan el timeout reducido
+    for _ in range(config.ADAPTIVE_TIMEOUT_MIN_SAMPLES):
+        record(fast_timeout, OUTCOME_TIMEOUT)
+    _, slow_timeout = webhook_timeout(webhook)
+    if slow_timeout <= fast_timeout:
+        failures.append(f"adaptativo: tras los timeouts se mantuvo en {slow_timeout:.2f}s (antes {fast_timeout:.2f}s)")
+
+    url = "http://check-adaptive.invalid"
+    breaker = get_circuit_breaker(webhook, url)
+    for _ in range(breaker.failure_threshold):
+        breaker.record_failure()
+    _, probe_timeout = webhook_timeout(webhook, url)
+    if probe_timeout != config.WEBHOOK_TIMEOUT_SECONDS:
+        failures.append(f"adaptativo: la petición de prueba usó {probe_timeout:.2f}s y no el timeout completo")
+
+def main() -> int:
+    server = start_server(MockSettings(latency_ms=LATENCY_MS, jitter_ms=0, seed=1))
+    base_url = f"http://127.0.0.1:{server.server_port}"
+
+    os.environ["N8N_CHAT_WEBHOOK_URL"] = base_url + CHAT_PATH
+    os.environ["N8N_UPLOAD_WEBHOOK_URL"] = base_url + UPLOAD_PATH
+    os.environ["APP_DATA_DIR"] = tempfile.mkdtemp(prefix="check-timeouts-")
+    os.environ["WEBHOOK_TIMEOUT_SECONDS"] = str(TIMEOUT_SECONDS)
+    os.environ["ADAPTIVE_TIMEOUT_ENABLED"] = "false"
+    sys.path.insert(0, str(CORE_DIR))
+
+    from chat import send_message_to_chat_webhook
+    from config import get_config
+    from metrics import OUTCOME_TIMEOUT, registry
+    from uploads import send_file_to_webhook
+
+    config = get_config()
+    expected = config.MESSAGES["timeout_error"]
+    failures = []
+
+    _, chat_message = send_message_to_chat_webhook("¿Plazo de prescripción?", config.CHAT_WEBHOOK_URL, "check-timeouts")
+    if chat_message != expected:
+        failures.append(f"chat: se esperaba el mensaje de timeout y se obtuvo {chat_message!r}")
+
+    _, upload_message = send_file_to_webhook(BenchmarkFile("lento.txt", 1024), config.UPLOAD_WEBHOOK_URL, "check-timeouts")
+    if upload_message != expected:
+        failures.append(f"upload: se esperaba el mensaje de timeout y se obtuvo {upload_message!r}")
+
+    for webhook in ("chat", "upload"):
+        timeouts = registry.calls.get((webhook, OUTCOME_TIMEOUT), 0)
+        if timeouts != 1:
+            failures.append(f"{webhook}: se esperaba 1 llamada clasificada como timeout y hubo {timeouts}")
+
+    server.shutdown()
+    check_adaptive_timeout(failures)
+    for failure in failures:
+        print(f"FALLO {failure}")
+    if failures:
+        return 1
+    print("OK: los webhooks lentos se reportan como timeout y el timeout adaptativo se recupera")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
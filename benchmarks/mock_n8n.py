@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+Servidor local que imita los webhooks de N8N para pruebas de carga.
+
+Implementa los contratos de `UPLOAD_WEBHOOK_URL` (multipart/form-data,
+responde 200), `UPLOAD_BATCH_WEBHOOK_URL` (JSON con fragmentos, responde 200)
+y `CHAT_WEBHOOK_URL` (JSON con "message", responde con {"output": ...} o en
+streaming). La latencia, la variación, la tasa de errores
+y el modo de streaming son configurables.
+
+Uso:
+    python benchmarks/mock_n8n.py --port 5678 --latency-ms 300 --jitter-ms 100 --stream sse
+"""
+
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+UPLOAD_PATH = "/webhook/upload-files"
+UPLOAD_BATCH_PATH = "/webhook/upload-batch"
+CHAT_PATH = "/webhook/send-message"
+
+STREAM_CONTENT_TYPES = {
+    "sse": "text/event-stream",
+    "ndjson": "application/x-ndjson",
+    "text": "text/plain; charset=utf-8",
+}
+
+class MockSettings:
+    """Comportamiento simulado del backend"""
+
+    def __init__(
+        self,
+        latency_ms: float = 200,
+        jitter_ms: float = 50,
+        error_rate: float = 0.0,
+        stream: str = "none",
+        tokens: int = 40,
+        token_delay_ms: float = 10,
+        answer_word: str = "respuesta",
+        seed: Optional[int] = None
+    ):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.stream = stream
+        self.tokens = tokens
+        self.token_delay_ms = token_delay_ms
+        self.answer_word = answer_word
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = {"upload": 0, "chat": 0, "errors": 0}
+
+    def delay(self) -> float:
+        with self.lock:
+            jitter = self.random.uniform(-self.jitter_ms, self.jitter_ms)
+        return max(0.0, self.latency_ms + jitter) / 1000
+
+    def should_fail(self) -> bool:
+        with self.lock:
+            return self.random.random() < self.error_rate
+
+class MockN8nServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Un cliente que corta la conexión no es un error del servidor simulado
+        if isinstance(sys.exc_info()[1], (BrokenPipeError, ConnectionResetError)):
+            return
+        super().handle_error(request, client_address)
+
+def make_handler(settings: MockSettings):
+    class MockN8nHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def _read_body(self) -> bytes:
+            length = int(self.headers.get("Content-Length", 0))
+            return self.rfile.read(length) if length else b""
+
+        def _send_json(self, status: int, data: dict):
+            body = json.dumps(data).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _send_chunk(self, data: bytes):
+            self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+            self.wfile.flush()
+
+        def _count(self, kind: str, failed: bool):
+            with settings.lock:
+                settings.requests[kind] += 1
+                if failed:
+                    settings.requests["errors"] += 1
+
+        def do_GET(self):
+            if self.path == "/stats":
+                with settings.lock:
+                    self._send_json(200, dict(settings.requests))
+            else:
+                self._send_json(404, {"error": "not found"})
+
+        def do_POST(self):
+            body = self._read_body()
+            if self.path.startswith(UPLOAD_PATH) or self.path.startswith(UPLOAD_BATCH_PATH):
+                self._handle_upload(body)
+            elif self.path.startswith(CHAT_PATH):
+                self._handle_chat(body)
+            else:
+                self._send_json(404, {"error": "not found"})
+
+        def _handle_upload(self, body: bytes):
+            failed = settings.should_fail()
+            self._count("upload", failed)
+            time.sleep(settings.delay())
+            if failed:
+                self._send_json(500, {"error": "simulated failure"})
+            else:
+                self._send_json(200, {"status": "ok", "bytes": len(body)})
+
+        def _handle_chat(self, body: bytes):
+            failed = settings.should_fail()
+            self._count("chat", failed)
+            try:
+                payload = json.loads(body or b"{}")
+            except json.JSONDecodeError:
+                payload = {}
+
+            time.sleep(settings.delay())
+            if failed:
+                self._send_json(500, {"error": "simulated failure"})
+                return
+
+            words = [f"{settings.answer_word}{index} " for index in range(settings.tokens)]
+            if settings.stream == "none" or not payload.get("stream"):
+                self._send_json(200, {"output": "".join(words)})
+                return
+
+            self.send_response(200)
+            self.send_header("Content-Type", STREAM_CONTENT_TYPES[settings.stream])
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            for word in words:
+                if settings.stream == "sse":
+                    self._send_chunk(f"data: {json.dumps({'content': word})}\n\n".encode())
+                elif settings.stream == "ndjson":
+                    self._send_chunk((json.dumps({"type": "item", "content": word}) + "\n").encode())
+                else:
+                    self._send_chunk(word.encode())
+                time.sleep(settings.token_delay_ms / 1000)
+            if settings.stream == "sse":
+                self._send_chunk(b"data: [DONE]\n\n")
+            self.wfile.write(b"0\r\n\r\n")
+            self.wfile.flush()
+
+    return MockN8nHandler
+
+def start_server(settings: MockSettings, host: str = "127.0.0.1", port: int = 0) -> ThreadingHTTPServer:
+    """Inicia el servidor en un hilo y lo retorna (el puerto real en `server_port`)"""
+    server = MockN8nServer((host, port), make_handler(settings))
+    threading.Thread(target=server.serve_forever, name="mock-n8n", daemon=True).start()
+    return server
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--latency-ms", type=float, default=200, help="Latencia media por petición")
+    parser.add_argument("--jitter-ms", type=float, default=50, help="Variación uniforme ± de la latencia")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fracción de peticiones que responden 500")
+    parser.add_argument("--stream", choices=["none", *STREAM_CONTENT_TYPES], default="none", help="Formato de streaming del chat")
+    parser.add_argument("--tokens", type=int, default=40, help="Fragmentos por respuesta de chat")
+    parser.add_argument("--token-delay-ms", type=float, default=10, help="Pausa entre fragmentos en streaming")
+    parser.add_argument("--seed", type=int, default=None, help="Semilla para resultados reproducibles")
+
+def settings_from_args(args: argparse.Namespace) -> MockSettings:
+    return MockSettings(
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        error_rate=args.error_rate,
+        stream=args.stream,
+        tokens=args.tokens,
+        token_delay_ms=args.token_delay_ms,
+        seed=args.seed
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor simulado de webhooks de N8N")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5678)
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    server = MockN8nServer((args.host, args.port), make_handler(settings_from_args(args)))
+    host, port = server.server_address[:2]
+    print(f"MOCK_N8N_URL=http://{host}:{port}", flush=True)
+    print(f"  upload: http://{host}:{port}{UPLOAD_PATH}", file=sys.stderr)
+    print(f"  lotes:  http://{host}:{port}{UPLOAD_BATCH_PATH}", file=sys.stderr)
+    print(f"  chat:   http://{host}:{port}{CHAT_PATH}", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
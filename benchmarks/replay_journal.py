@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""
+Reproduce una bitácora de webhooks (`JOURNAL_ENABLED=true`) contra otro backend.
+
+Lee las entradas (incluidas las rotaciones) en orden y vuelve a ejecutar cada
+operación con las mismas funciones que usa la aplicación, respetando los
+intervalos originales entre llamadas divididos por `--speed` (2 = el doble de
+rápido, 0 = sin esperas). Las consultas se reenvían con su texto y sesión
+originales; los documentos se reemplazan por contenido aleatorio del mismo
+nombre, tipo y tamaño, y las peticiones de lote por un JSON del mismo tamaño.
+
+Sin `--target` ni URLs explícitas se levanta `mock_n8n.py` localmente. Los
+resultados por operación (p50/p95/p99 grabados y reproducidos, throughput,
+errores) se guardan en JSON y se pueden comparar con `--baseline` igual que en
+`run_benchmarks.py`, por ejemplo para medir dos versiones de un workflow.
+
+Las bitácoras del modo de producción (una por proceso) se pueden pasar juntas
+y se reproducen intercaladas en orden cronológico.
+
+Uso:
+    python benchmarks/replay_journal.py .data/journal/webhooks.jsonl --speed 2
+    python benchmarks/replay_journal.py .data/journal/webhooks.worker*.jsonl
+    python benchmarks/replay_journal.py bitacora.jsonl --target http://localhost:5678 --output v2.json --baseline v1.json
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from mock_n8n import CHAT_PATH, UPLOAD_BATCH_PATH, UPLOAD_PATH, add_arguments
+from run_benchmarks import CORE_DIR, BenchmarkFile, compare_with_baseline, latency_summary, peak_rss_mb, start_mock
+
+def placeholder_message(length: int) -> str:
+    """Consulta de relleno para bitácoras grabadas sin contenido"""
+    return ("consulta de prueba " * (length // 19 + 1))[:max(length, 3)]
+
+def placeholder_batch(size: int) -> bytes:
+    """Petición de lote de relleno con el tamaño grabado"""
+    envelope = json.dumps({"replay": True, "documents": [], "chunks": [], "padding": ""}).encode("utf-8")
+    return envelope[:-2] + b"x" * max(0, size - len(envelope)) + envelope[-2:]
+
+def load_entries(paths: list[str], operations: set[str], limit: int) -> list[dict]:
+    from journal import read_journal
+
+    entries = []
+    for path in paths:
+        for entry in read_journal(path):
+            if operations and entry.get("operation") not in operations:
+                continue
+            entries.append(entry)
+    entries.sort(key=lambda entry: entry["timestamp"])
+    return entries[:limit] if limit else entries
+
+def replay(
+    entries: list[dict],
+    chat_url: str,
+    upload_url: str,
+    speed: float,
+    max_workers: int,
+    upload_batch_url: str
+) -> dict:
+    """Ejecuta las entradas con sus intervalos originales y agrega los tiempos por operación"""
+    from chat import send_message_to_chat_webhook, stream_message_to_chat_webhook
+    from uploads import _send_batch_request, send_file_to_webhook
+
+    def run_entry(entry: dict) -> bool:
+        request = entry.get("request", {})
+        session_id = entry.get("session_id")
+        operation = entry["operation"]
+        if operation in ("send_message", "stream_message"):
+            message = request.get("message") or placeholder_message(request.get("message_chars", 0))
+            if operation == "stream_message":
+                success, _ = stream_message_to_chat_webhook(message, chat_url, session_id=session_id)
+            else:
+                success, _ = send_message_to_chat_webhook(
+                    message, chat_url, session_id=session_id, scope=request.get("scope"),
+                    webhook=entry.get("webhook", "chat"), memory_session_id=request.get("memory_session_id")
+                )
+            return success
+        if operation == "send_batch":
+            success, _ = _send_batch_request(
+                upload_batch_url, placeholder_batch(request.get("request_bytes", 0)), session_id=session_id
+            )
+            return success
+        document = BenchmarkFile(
+            request.get("filename", "documento.txt"),
+            request.get("file_size", 0),
+            request.get("content_type") or "application/octet-stream"
+        )
+        success, _ = send_file_to_webhook(document, upload_url, session_id=session_id)
+        return success
+
+    latencies: dict[str, list[float]] = {}
+    errors: dict[str, int] = {}
+    lags: list[float] = []
+    lock = threading.Lock()
+
+    def timed(entry: dict):
+        started = time.perf_counter()
+        try:
+            success = run_entry(entry)
+        except Exception:
+            success = False
+        elapsed = time.perf_counter() - started
+        with lock:
+            latencies.setdefault(entry["operation"], []).append(elapsed)
+            if not success:
+                errors[entry["operation"]] = errors.get(entry["operation"], 0) + 1
+
+    first_timestamp = entries[0]["timestamp"]
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="replay") as executor:
+        for entry in entries:
+            due = (entry["timestamp"] - first_timestamp) / speed if speed > 0 else 0.0
+            wait = due - (time.perf_counter() - started)
+            if wait > 0:
+                time.sleep(wait)
+            lags.append(max(0.0, -wait))
+            executor.submit(timed, entry)
+    duration = time.perf_counter() - started
+
+    scenarios = {}
+    for operation in sorted({entry["operation"] for entry in entries}):
+        recorded = [entry["duration_seconds"] for entry in entries if entry["operation"] == operation]
+        replayed = latencies.get(operation, [])
+        scenarios[operation] = {
+            "operations": len(replayed),
+            "errors": errors.get(operation, 0),
+            "recorded_errors": sum(1 for entry in entries if entry["operation"] == operation and not entry.get("success")),
+            "duration_seconds": round(duration, 3),
+            "throughput_ops_per_second": round(len(replayed) / duration, 2) if duration else 0.0,
+            "latency_ms": latency_summary(replayed),
+            "recorded_latency_ms": latency_summary(recorded),
+        }
+    return {"scenarios": scenarios, "schedule_lag_ms": latency_summary(lags)}
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Reproduce una bitácora de webhooks del Asistente Legal")
+    parser.add_argument("journal", nargs="+", help="Archivos de bitácora (las rotaciones .1, .2... se leen automáticamente)")
+    parser.add_argument("--target", help="URL base del backend (se agregan las rutas de N8N)")
+    parser.add_argument("--chat-url", help="URL del webhook de chat (tiene prioridad sobre --target)")
+    parser.add_argument("--upload-url", help="URL del webhook de carga (tiene prioridad sobre --target)")
+    parser.add_argument("--upload-batch-url", help="URL del webhook de lotes (tiene prioridad sobre --target)")
+    parser.add_argument("--speed", type=float, default=1.0, help="Factor de velocidad (2 = el doble de rápido, 0 = sin esperas)")
+    parser.add_argument("--max-workers", type=int, default=32, help="Operaciones simultáneas como máximo")
+    parser.add_argument("--operations", default="", help="Operaciones a reproducir (por defecto todas)")
+    parser.add_argument("--limit", type=int, default=0, help="Cantidad máxima de entradas")
+    parser.add_argument("--output", default="replay_results.json", help="Archivo JSON de resultados")
+    parser.add_argument("--baseline", help="Resultados previos para detectar regresiones")
+    parser.add_argument("--max-regression", type=float, default=0.2, help="Regresión tolerada (0.2 = 20%%)")
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    # La reproducción no debe escribir en la bitácora ni en los datos de la app
+    os.environ["JOURNAL_ENABLED"] = "false"
+    os.environ["APP_DATA_DIR"] = tempfile.mkdtemp(prefix="legal-replay-")
+    sys.path.insert(0, str(CORE_DIR))
+
+    operations = {name.strip() for name in args.operations.split(",") if name.strip()}
+    entries = load_entries(args.journal, operations, args.limit)
+    if not entries:
+        print("❌ La bitácora no tiene entradas para reproducir")
+        return 1
+
+    mock_process = None
+    base_url = args.target.rstrip("/") if args.target else None
+    has_batches = any(entry["operation"] == "send_batch" for entry in entries)
+    if not base_url and not (args.chat_url and args.upload_url and (args.upload_batch_url or not has_batches)):
+        mock_process, base_url = start_mock(args)
+    chat_url = args.chat_url or base_url + CHAT_PATH
+    upload_url = args.upload_url or base_url + UPLOAD_PATH
+    upload_batch_url = args.upload_batch_url or (base_url + UPLOAD_BATCH_PATH if base_url else "")
+
+    span = entries[-1]["timestamp"] - entries[0]["timestamp"]
+    print(f"⏯️ Reproduciendo {len(entries)} llamadas ({span:.1f} s grabados) a velocidad x{args.speed or '∞'}")
+    try:
+        results = replay(entries, chat_url, upload_url, args.speed, args.max_workers, upload_batch_url)
+    finally:
+        if mock_process is not None:
+            mock_process.terminate()
+            mock_process.wait(timeout=10)
+
+    results = {
+        "timestamp": datetime.now().isoformat(),
+        "settings": {
+            key: value for key, value in vars(args).items()
+            if key not in ("output", "baseline")
+        },
+        **results,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+    for name, scenario in results["scenarios"].items():
+        print(
+            f"  {name:<15} {scenario['operations']:>5} ops  "
+            f"p50 {scenario['recorded_latency_ms'].get('p50')} → {scenario['latency_ms'].get('p50')} ms  "
+            f"p95 {scenario['recorded_latency_ms'].get('p95')} → {scenario['latency_ms'].get('p95')} ms  "
+            f"errores {scenario['recorded_errors']} → {scenario['errors']}"
+        )
+
+    with open(args.output, "w", encoding="utf-8") as output_file:
+        json.dump(results, output_file, indent=2, ensure_ascii=False)
+    print(f"📄 Resultados guardados en {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as baseline_file:
+            baseline = json.load(baseline_file)
+        regressions = compare_with_baseline(results, baseline, args.max_regression)
+        if regressions:
+            print("❌ Regresiones detectadas:")
+            for regression in regressions:
+                print(f"   - {regression}")
+            return 1
+        print("✅ Sin regresiones respecto de la ejecución base")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+"""
+Pruebas de carga locales del Asistente Legal contra un N8N simulado.
+
+Levanta `mock_n8n.py` en un proceso aparte, apunta los webhooks de la
+aplicación a él y simula N sesiones concurrentes que ejecutan:
+- consultas con `send_message_to_chat_webhook`
+- consultas en streaming con `stream_message_to_chat_webhook` (si el mock
+  tiene streaming activo)
+- envíos individuales con `send_file_to_webhook`
+- lotes completos con `upload_files_concurrently`
+
+Los resultados (p50/p95/p99, throughput, memoria pico) se guardan en JSON.
+Con `--baseline` se comparan contra una ejecución anterior y el proceso
+termina con código 1 si hay una regresión mayor a `--max-regression`.
+
+Uso:
+    python benchmarks/run_benchmarks.py --sessions 10 --output resultados.json
+    python benchmarks/run_benchmarks.py --baseline resultados.json --max-regression 0.2
+"""
+
+import argparse
+import io
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Optional
+
+ROOT = Path(__file__).resolve().parent.parent
+CORE_DIR = ROOT / "core"
+MOCK_SCRIPT = Path(__file__).resolve().parent / "mock_n8n.py"
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from mock_n8n import CHAT_PATH, UPLOAD_PATH, add_arguments
+
+class BenchmarkFile(io.BytesIO):
+    """Imita un `UploadedFile` de Streamlit con contenido aleatorio"""
+
+    def __init__(self, name: str, size: int, content_type: str = "text/plain"):
+        super().__init__(os.urandom(size))
+        self.name = name
+        self.type = content_type
+        self.size = size
+
+def peak_rss_mb() -> Optional[float]:
+    """Memoria residente máxima del proceso en MB (None si no está disponible)"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reporta KB; macOS reporta bytes
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+def latency_summary(samples: list[float]) -> dict:
+    from metrics import percentile
+
+    if not samples:
+        return {}
+    ordered = sorted(samples)
+    return {
+        "p50": round(percentile(ordered, 50) * 1000, 2),
+        "p95": round(percentile(ordered, 95) * 1000, 2),
+        "p99": round(percentile(ordered, 99) * 1000, 2),
+        "mean": round(statistics.fmean(ordered) * 1000, 2),
+        "max": round(ordered[-1] * 1000, 2),
+    }
+
+def run_scenario(name: str, sessions: int, operations: int, operation: Callable[[int, int], tuple[bool, dict]]) -> dict:
+    """Ejecuta `operation(sesion, indice)` en N hilos concurrentes y agrega los tiempos"""
+    latencies: list[float] = []
+    first_tokens: list[float] = []
+    errors = 0
+    lock = threading.Lock()
+    start_barrier = threading.Barrier(sessions)
+
+    def session_worker(session_index: int):
+        nonlocal errors
+        start_barrier.wait()
+        for operation_index in range(operations):
+            started = time.perf_counter()
+            success, extra = operation(session_index, operation_index)
+            elapsed = time.perf_counter() - started
+            with lock:
+                latencies.append(elapsed)
+                if not success:
+                    errors += 1
+                if extra.get("first_token") is not None:
+                    first_tokens.append(extra["first_token"] - started)
+
+    threads = [threading.Thread(target=session_worker, args=(index,)) for index in range(sessions)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    duration = time.perf_counter() - started
+
+    result = {
+        "operations": len(latencies),
+        "errors": errors,
+        "duration_seconds": round(duration, 3),
+        "throughput_ops_per_second": round(len(latencies) / duration, 2) if duration else 0.0,
+        "latency_ms": latency_summary(latencies),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+    if first_tokens:
+        result["first_token_ms"] = latency_summary(first_tokens)
+    print(
+        f"  {name:<14} {result['operations']:>5} ops  {result['throughput_ops_per_second']:>8} ops/s  "
+        f"p50 {result['latency_ms'].get('p50')} ms  p95 {result['latency_ms'].get('p95')} ms  "
+        f"errores {errors}"
+    )
+    return result
+
+def start_mock(args: argparse.Namespace) -> tuple[subprocess.Popen, str]:
+    """Inicia el servidor simulado en otro proceso y retorna su URL base"""
+    command = [
+        sys.executable, str(MOCK_SCRIPT), "--port", "0",
+        "--latency-ms", str(args.latency_ms),
+        "--jitter-ms", str(args.jitter_ms),
+        "--error-rate", str(args.error_rate),
+        "--stream", args.stream,
+        "--tokens", str(args.tokens),
+        "--token-delay-ms", str(args.token_delay_ms),
+    ]
+    if args.seed is not None:
+        command += ["--seed", str(args.seed)]
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, text=True)
+    line = process.stdout.readline().strip()
+    if not line.startswith("MOCK_N8N_URL="):
+        process.kill()
+        raise RuntimeError("No se pudo iniciar el servidor simulado")
+    return process, line.split("=", 1)[1]
+
+def compare_with_baseline(results: dict, baseline: dict, max_regression: float) -> list[str]:
+    """Retorna la lista de regresiones respecto de una ejecución anterior"""
+    regressions = []
+    for name, current in results["scenarios"].items():
+        previous = baseline.get("scenarios", {}).get(name)
+        if not previous:
+            continue
+        for percentile_name in ("p50", "p95", "p99"):
+            before = previous.get("latency_ms", {}).get(percentile_name)
+            after = current.get("latency_ms", {}).get(percentile_name)
+            if before and after and after > before * (1 + max_regression):
+                regressions.append(f"{name}: {percentile_name} {before} ms → {after} ms")
+        before = previous.get("throughput_ops_per_second")
+        after = current.get("throughput_ops_per_second")
+        if before and after is not None and after < before * (1 - max_regression):
+            regressions.append(f"{name}: throughput {before} → {after} ops/s")
+    return regressions
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark local de los webhooks del Asistente Legal")
+    parser.add_argument("--sessions", type=int, default=8, help="Sesiones concurrentes simuladas")
+    parser.add_argument("--chat-messages", type=int, default=10, help="Consultas por sesión")
+    parser.add_argument("--files-per-session", type=int, default=5, help="Documentos por sesión")
+    parser.add_argument("--file-size-kb", type=int, default=256, help="Tamaño de cada documento")
+    parser.add_argument("--scenarios", default="chat,chat_stream,upload_file,upload_batch", help="Escenarios a ejecutar")
+    parser.add_argument("--output", default="benchmark_results.json", help="Archivo JSON de resultados")
+    parser.add_argument("--baseline", help="Resultados previos para detectar regresiones")
+    parser.add_argument("--max-regression", type=float, default=0.2, help="Regresión tolerada (0.2 = 20%%)")
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    mock_process, base_url = start_mock(args)
+    data_dir = tempfile.mkdtemp(prefix="legal-bench-")
+    try:
+        # La configuración se lee al importar los módulos de la aplicación
+        os.environ["N8N_UPLOAD_WEBHOOK_URL"] = base_url + UPLOAD_PATH
+        os.environ["N8N_CHAT_WEBHOOK_URL"] = base_url + CHAT_PATH
+        os.environ["APP_DATA_DIR"] = data_dir
+        sys.path.insert(0, str(CORE_DIR))
+
+        from config import get_config
+        from chat import send_message_to_chat_webhook, stream_message_to_chat_webhook
+        from uploads import send_file_to_webhook, upload_files_concurrently
+
+        config = get_config()
+        file_size = args.file_size_kb * 1024
+        scenarios = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+        if args.stream == "none" and "chat_stream" in scenarios:
+            scenarios.remove("chat_stream")
+
+        def chat_operation(session_index: int, operation_index: int) -> tuple[bool, dict]:
+            success, _ = send_message_to_chat_webhook(
+                f"Consulta {operation_index} sobre el plazo de prescripción",
+                config.CHAT_WEBHOOK_URL,
+                session_id=f"bench-{session_index}"
+            )
+            return success, {}
+
+        def chat_stream_operation(session_index: int, operation_index: int) -> tuple[bool, dict]:
+            extra = {}
+
+            def on_token(_partial: str):
+                extra.setdefault("first_token", time.perf_counter())
+
+            success, _ = stream_message_to_chat_webhook(
+                f"Consulta {operation_index} sobre requisitos de una SAS",
+                config.CHAT_WEBHOOK_URL,
+                on_token=on_token,
+                session_id=f"bench-{session_index}"
+            )
+            return success, extra
+
+        def upload_file_operation(session_index: int, operation_index: int) -> tuple[bool, dict]:
+            document = BenchmarkFile(f"documento-{session_index}-{operation_index}.txt", file_size)
+            success, _ = send_file_to_webhook(document, config.UPLOAD_WEBHOOK_URL, session_id=f"bench-{session_index}")
+            return success, {}
+
+        def upload_batch_operation(session_index: int, operation_index: int) -> tuple[bool, dict]:
+            documents = [
+                BenchmarkFile(f"lote-{session_index}-{operation_index}-{index}.txt", file_size)
+                for index in range(args.files_per_session)
+            ]
+            results = upload_files_concurrently(documents, config.UPLOAD_WEBHOOK_URL, session_id=f"bench-{session_index}")
+            return all(success for _, success, _ in results), {}
+
+        definitions = {
+            "chat": (args.chat_messages, chat_operation),
+            "chat_stream": (args.chat_messages, chat_stream_operation),
+            "upload_file": (args.files_per_session, upload_file_operation),
+            "upload_batch": (1, upload_batch_operation),
+        }
+
+        print(f"⚖️ Benchmark contra {base_url} con {args.sessions} sesiones concurrentes")
+        results = {
+            "timestamp": datetime.now().isoformat(),
+            "settings": {
+                key: value for key, value in vars(args).items()
+                if key not in ("output", "baseline")
+            },
+            "scenarios": {},
+        }
+        for name in scenarios:
+            operations, operation = definitions[name]
+            results["scenarios"][name] = run_scenario(name, args.sessions, operations, operation)
+        results["peak_rss_mb"] = peak_rss_mb()
+    finally:
+        mock_process.terminate()
+        mock_process.wait(timeout=10)
+
+    with open(args.output, "w", encoding="utf-8") as output_file:
+        json.dump(results, output_file, indent=2, ensure_ascii=False)
+    print(f"📄 Resultados guardados en {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as baseline_file:
+            baseline = json.load(baseline_file)
+        regressions = compare_with_baseline(results, baseline, args.max_regression)
+        if regressions:
+            print("❌ Regresiones detectadas:")
+            for regression in regressions:
+                print(f"   - {regression}")
+            return 1
+        print("✅ Sin regresiones respecto de la ejecución base")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,124 @@
+"""
+Ingesta por lotes: fragmentación local y empaquetado de varios documentos.
+
+En lugar de una petición (y una ejecución de N8N) por archivo, el texto de los
+documentos se divide aquí en fragmentos con solapamiento y los fragmentos de
+muchos archivos se agrupan en unas pocas peticiones JSON, cada una por debajo
+de un tamaño máximo. Cada petición tiene esta forma:
+
+    {
+      "batch_id": "...", "request_index": 0, "request_count": 2,
+      "upload_time": "...", "session_id": "...",
+      "chunk_chars": 1500, "chunk_overlap": 200,
+      "documents": [{"document_id": "<sha256>", "filename": "...", "file_size": 1234,
+                     "content_type": "text/plain", "chunk_count": 3}],
+      "chunks": [{"document_id": "<sha256>", "chunk_index": 0, "offset": 0, "text": "..."}]
+    }
+
+Un documento cuyos fragmentos no caben en una sola petición se reparte entre
+varias; `documents` incluye en cada petición los documentos que aparecen en
+sus `chunks`.
+"""
+
+import json
+from typing import Iterator
+
+def chunk_text(text: str, chunk_chars: int, overlap: int) -> list[tuple[int, str]]:
+    """Divide el texto en fragmentos de hasta `chunk_chars` caracteres.
+
+    Retorna pares `(offset, fragmento)`. Cuando es posible el corte se hace en
+    un salto de párrafo o un espacio cerca del final de la ventana, y cada
+    fragmento repite los últimos `overlap` caracteres del anterior.
+    """
+    chunk_chars = max(1, chunk_chars)
+    overlap = max(0, min(overlap, chunk_chars // 2))
+    chunks = []
+    start = 0
+    length = len(text)
+
+    while start < length:
+        end = min(start + chunk_chars, length)
+        if end < length:
+            # Buscar un corte natural en el último 20% de la ventana
+            floor = start + int(chunk_chars * 0.8)
+            for separator in ("\n\n", "\n", " "):
+                cut = text.rfind(separator, floor, end)
+                if cut > start:
+                    end = cut + len(separator)
+                    break
+        chunks.append((start, text[start:end]))
+        if end >= length:
+            break
+        start = max(end - overlap, start + 1)
+
+    return chunks
+
+def _encoded_size(value) -> int:
+    return len(json.dumps(value, ensure_ascii=False).encode("utf-8"))
+
+def _iter_chunk_entries(documents: list[dict]) -> Iterator[tuple[int, dict]]:
+    for index, document in enumerate(documents):
+        for chunk_index, (offset, text) in enumerate(document["chunks"]):
+            yield index, {
+                "document_id": document["document_id"],
+                "chunk_index": chunk_index,
+                "offset": offset,
+                "text": text,
+            }
+
+def _document_entry(document: dict) -> dict:
+    return {
+        "document_id": document["document_id"],
+        "filename": document["filename"],
+        "file_size": document["file_size"],
+        "content_type": document["content_type"],
+        "chunk_count": len(document["chunks"]),
+    }
+
+def build_batch_payloads(documents: list[dict], fields: dict, max_bytes: int) -> list[tuple[bytes, set[int]]]:
+    """Empaqueta los fragmentos de varios documentos en peticiones JSON.
+
+    `documents` es una lista de diccionarios con `document_id`, `filename`,
+    `file_size`, `content_type` y `chunks` (salida de `chunk_text`). `fields`
+    se copia en cada petición. Retorna `(cuerpo, índices de documentos)` por
+    petición, respetando `max_bytes` salvo que un único fragmento lo supere.
+    """
+    # Margen para request_index/request_count, que se conocen al final
+    envelope_size = _encoded_size({**fields, "request_index": 0, "request_count": 0, "documents": [], "chunks": []}) + 32
+
+    requests_chunks: list[list[dict]] = []
+    requests_documents: list[list[int]] = []
+    current_chunks: list[dict] = []
+    current_documents: list[int] = []
+    current_size = envelope_size
+
+    for index, entry in _iter_chunk_entries(documents):
+        added_size = _encoded_size(entry) + 1
+        if index not in current_documents:
+            added_size += _encoded_size(_document_entry(documents[index])) + 1
+        if current_chunks and current_size + added_size > max_bytes:
+            requests_chunks.append(current_chunks)
+            requests_documents.append(current_documents)
+            current_chunks, current_documents, current_size = [], [], envelope_size
+            added_size = _encoded_size(entry) + _encoded_size(_document_entry(documents[index])) + 2
+        if index not in current_documents:
+            current_documents.append(index)
+        current_chunks.append(entry)
+        current_size += added_size
+
+    if current_chunks:
+        requests_chunks.append(current_chunks)
+        requests_documents.append(current_documents)
+
+    payloads = []
+    for request_index, (chunks, document_indexes) in enumerate(zip(requests_chunks, requests_documents)):
+        payload = {
+            **fields,
+            "request_index": request_index,
+            "request_count": len(requests_chunks),
+            "documents": [_document_entry(documents[index]) for index in document_indexes],
+            "chunks": chunks,
+        }
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        payloads.append((body, set(document_indexes)))
+    return payloads
@@ -0,0 +1,136 @@
+"""
+Cliente del webhook de chat del asistente legal.
+
+Envía consultas en modo tradicional (respuesta completa) o en streaming. No
+depende de Streamlit: el identificador de sesión lo aporta quien llama.
+"""
+
+import json
+from datetime import datetime
+from typing import Callable, Optional
+
+import requests
+
+from config import get_config
+from journal import describe_chat_request, journaled
+from resilience import CircuitOpenError, guarded_call, webhook_timeout
+from scheduler import QueueTimeoutError
+from streaming import STREAM_ACCEPT_HEADER, iter_response_tokens
+from transport import get_http_session
+
+config = get_config()
+
+def build_chat_payload(message: str, session_id: Optional[str] = None, scope: Optional[dict] = None) -> dict:
+    """Construye el cuerpo de la consulta para el webhook de chat.
+
+    `scope` limita la consulta a un documento (ver `fanout`).
+    """
+    payload = {
+        "message": message,
+        "timestamp": datetime.now().isoformat(),
+        "session_id": session_id or "user_session"
+    }
+    if scope:
+        payload["scope"] = scope
+    return payload
+
+@journaled("send_message", "chat", describe_chat_request)
+def send_message_to_chat_webhook(
+    message: str,
+    webhook_url: str,
+    session_id: Optional[str] = None,
+    scope: Optional[dict] = None,
+    webhook: str = "chat",
+    memory_session_id: Optional[str] = None
+) -> tuple[bool, str]:
+    """Envía mensaje al asistente legal.
+
+    `webhook` es el nombre con el que se planifica y mide la llamada ("chat",
+    o "prefetch" para las consultas especulativas de menor prioridad). La
+    llamada se planifica con `session_id`; `memory_session_id`, si se indica,
+    reemplaza la sesión que recibe N8N (su memoria de conversación).
+    """
+    try:
+        payload = build_chat_payload(message, memory_session_id or session_id, scope)
+        body = json.dumps(payload).encode("utf-8")
+        
+        with guarded_call(webhook, webhook_url, session_id) as call:
+            call.request_bytes = len(body)
+            response = get_http_session(webhook_url).post(
+                webhook_url,
+                data=body,
+                headers={"Content-Type": "application/json"},
+                timeout=webhook_timeout(webhook, webhook_url)
+            )
+            call.status_code = response.status_code
+            call.response_bytes = len(response.content)
+        
+        if response.status_code == 200:
+            try:
+                response_data = response.json()
+                return True, response_data.get("output", response.text)
+            except json.JSONDecodeError:
+                return True, response.text
+        else:
+            return False, config.MESSAGES["chat_error"]
+            
+    except CircuitOpenError:
+        return False, config.MESSAGES["service_unavailable"]
+    except QueueTimeoutError:
+        return False, config.MESSAGES["service_busy"]
+    except requests.exceptions.Timeout:
+        return False, config.MESSAGES["timeout_error"]
+    except requests.exceptions.ConnectionError:
+        return False, config.MESSAGES["connection_error"]
+    except Exception as e:
+        return False, config.MESSAGES["chat_error"]
+
+@journaled("stream_message", "chat", describe_chat_request)
+def stream_message_to_chat_webhook(
+    message: str,
+    webhook_url: str,
+    on_token: Optional[Callable[[str], None]] = None,
+    session_id: Optional[str] = None
+) -> tuple[bool, str]:
+    """Envía mensaje al asistente legal leyendo la respuesta de forma incremental.
+
+    `on_token(texto_acumulado)` se invoca cada vez que llega un fragmento. Si el
+    webhook responde con JSON tradicional se recibe un único fragmento, por lo
+    que el resultado es equivalente a `send_message_to_chat_webhook`.
+    """
+    try:
+        payload = build_chat_payload(message, session_id)
+        payload["stream"] = True
+        body = json.dumps(payload).encode("utf-8")
+        
+        with guarded_call("chat", webhook_url, session_id) as call, get_http_session(webhook_url).post(
+            webhook_url,
+            data=body,
+            headers={"Content-Type": "application/json", "Accept": STREAM_ACCEPT_HEADER},
+            timeout=webhook_timeout("chat", webhook_url),
+            stream=True
+        ) as response:
+            call.request_bytes = len(body)
+            call.status_code = response.status_code
+            if response.status_code != 200:
+                return False, config.MESSAGES["chat_error"]
+            
+            answer = ""
+            for token in iter_response_tokens(response):
+                call.mark_first_byte()
+                answer += token
+                call.response_bytes += len(token.encode("utf-8"))
+                if on_token is not None:
+                    on_token(answer)
+            return True, answer
+            
+    except CircuitOpenError:
+        return False, config.MESSAGES["service_unavailable"]
+    except QueueTimeoutError:
+        return False, config.MESSAGES["service_busy"]
+    except requests.exceptions.Timeout:
+        return False, config.MESSAGES["timeout_error"]
+    except requests.exceptions.ConnectionError:
+        return False, config.MESSAGES["connection_error"]
+    except Exception as e:
+        return False, config.MESSAGES["chat_error"]
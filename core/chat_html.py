@@ -0,0 +1,34 @@
+"""
+HTML de los mensajes del chat.
+
+Vive en un módulo importado (igual que `styles`) porque Streamlit vuelve a
+ejecutar el script en un módulo nuevo en cada rerun: una caché definida ahí
+empezaría vacía cada vez. Aquí dura lo que el proceso, así que el HTML de los
+mensajes del historial, que no cambian una vez agregados, se reutiliza entre
+reruns y entre sesiones.
+"""
+
+from functools import lru_cache
+
+from config import get_config
+
+config = get_config()
+
+def chat_message_html(role: str, message: str, timestamp: str) -> str:
+    """Retorna el HTML de un mensaje del chat"""
+    if role == "user":
+        return f'''
+                    <div class="chat-message-user">
+                        <strong>🧑‍💼 Tú • {timestamp}</strong><br><br>
+                        {message}
+                    </div>
+                    '''
+    return f'''
+                    <div class="chat-message-assistant">
+                        <strong>⚖️ Asistente Legal • {timestamp}</strong><br><br>
+                        {message}
+                    </div>
+                    '''
+
+# Para los mensajes del historial; los parciales del streaming usan la versión sin caché
+cached_chat_message_html = lru_cache(maxsize=config.CHAT_HTML_CACHE_SIZE)(chat_message_html)
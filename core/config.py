@@ -4,6 +4,7 @@ Este archivo contiene todas las configuraciones necesarias para el funcionamient
 """
 
 import os
+from functools import lru_cache
 from typing import Optional
 
 class Config:
@@ -13,12 +14,188 @@ class Config:
     UPLOAD_WEBHOOK_URL: str = os.getenv("N8N_UPLOAD_WEBHOOK_URL", "https://saludsync.vexy.host/webhook/upload-files")
     CHAT_WEBHOOK_URL: str = os.getenv("N8N_CHAT_WEBHOOK_URL", "https://saludsync.vexy.host/webhook/send-message")
     
+    # Webhooks de chat adicionales (separados por comas) para repartir sesiones
+    # entre varios workers de N8N. Cada sesión se asigna siempre al mismo.
+    CHAT_WEBHOOK_URLS: list[str] = [
+        url.strip() for url in os.getenv("N8N_CHAT_WEBHOOK_URLS", "").split(",") if url.strip()
+    ] or [CHAT_WEBHOOK_URL]
+    CHAT_ROUTER_VIRTUAL_NODES: int = int(os.getenv("CHAT_ROUTER_VIRTUAL_NODES", "100"))
+    
     # Configuración de archivos
     MAX_FILE_SIZE_MB: int = int(os.getenv("MAX_FILE_SIZE_MB", "10"))
     ALLOWED_FILE_TYPES: list[str] = ["pdf", "docx", "txt", "md"]
     
+    # Preprocesamiento local: "off", "replace" (enviar solo el texto extraído
+    # comprimido con gzip) o "alongside" (enviar el texto junto al original)
+    UPLOAD_PREPROCESS_MODE: str = os.getenv("UPLOAD_PREPROCESS_MODE", "off").lower()
+    EXTRACTION_WORKERS: int = int(os.getenv("EXTRACTION_WORKERS", "2"))
+    EXTRACTION_TIMEOUT_SECONDS: float = float(os.getenv("EXTRACTION_TIMEOUT_SECONDS", "60"))
+    EXTRACTION_MAX_FILE_SIZE_MB: int = int(os.getenv("EXTRACTION_MAX_FILE_SIZE_MB", "50"))
+    
+    # Carga por partes (reanudable) para documentos grandes
+    UPLOAD_CHUNKING_ENABLED: bool = os.getenv("UPLOAD_CHUNKING_ENABLED", "false").lower() == "true"
+    UPLOAD_CHUNK_SIZE_MB: int = int(os.getenv("UPLOAD_CHUNK_SIZE_MB", "8"))
+    
+    # Ingesta por lotes: los documentos de texto se dividen localmente en
+    # fragmentos y se agrupan varios archivos en pocas peticiones JSON. Requiere
+    # N8N_UPLOAD_BATCH_WEBHOOK_URL (el webhook de upload espera multipart)
+    UPLOAD_BATCHING_ENABLED: bool = os.getenv("UPLOAD_BATCHING_ENABLED", "false").lower() == "true"
+    UPLOAD_BATCH_WEBHOOK_URL: str = os.getenv("N8N_UPLOAD_BATCH_WEBHOOK_URL", "")
+    UPLOAD_BATCH_CHUNK_CHARS: int = int(os.getenv("UPLOAD_BATCH_CHUNK_CHARS", "1500"))
+    UPLOAD_BATCH_CHUNK_OVERLAP: int = int(os.getenv("UPLOAD_BATCH_CHUNK_OVERLAP", "200"))
+    UPLOAD_BATCH_MAX_REQUEST_KB: int = int(os.getenv("UPLOAD_BATCH_MAX_REQUEST_KB", "1024"))
+    UPLOAD_BATCH_MAX_FILES: int = int(os.getenv("UPLOAD_BATCH_MAX_FILES", "50"))
+    
     # Configuración de timeouts
     WEBHOOK_TIMEOUT_SECONDS: int = int(os.getenv("WEBHOOK_TIMEOUT_SECONDS", "30"))
+    WEBHOOK_CONNECT_TIMEOUT_SECONDS: float = float(os.getenv("WEBHOOK_CONNECT_TIMEOUT_SECONDS", "5"))
+    
+    # Timeout adaptativo: p99 de las llamadas recientes (exitosas o con timeout)
+    # por un factor, acotado entre el mínimo y WEBHOOK_TIMEOUT_SECONDS. Solo
+    # cuentan las muestras de los últimos ADAPTIVE_TIMEOUT_WINDOW_SECONDS
+    ADAPTIVE_TIMEOUT_ENABLED: bool = os.getenv("ADAPTIVE_TIMEOUT_ENABLED", "true").lower() == "true"
+    ADAPTIVE_TIMEOUT_MULTIPLIER: float = float(os.getenv("ADAPTIVE_TIMEOUT_MULTIPLIER", "3"))
+    ADAPTIVE_TIMEOUT_MIN_SECONDS: float = float(os.getenv("ADAPTIVE_TIMEOUT_MIN_SECONDS", "5"))
+    ADAPTIVE_TIMEOUT_MIN_SAMPLES: int = int(os.getenv("ADAPTIVE_TIMEOUT_MIN_SAMPLES", "20"))
+    ADAPTIVE_TIMEOUT_WINDOW_SECONDS: float = float(os.getenv("ADAPTIVE_TIMEOUT_WINDOW_SECONDS", "300"))
+    
+    # Circuit breaker por webhook (falla rápido mientras el backend está caído)
+    CIRCUIT_FAILURE_THRESHOLD: int = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))
+    CIRCUIT_RESET_SECONDS: float = float(os.getenv("CIRCUIT_RESET_SECONDS", "30"))
+    CIRCUIT_HALF_OPEN_MAX_CALLS: int = int(os.getenv("CIRCUIT_HALF_OPEN_MAX_CALLS", "1"))
+    
+    # Planificador del tráfico saliente (compartido por todas las sesiones).
+    # Tasas en llamadas por segundo; 0 = sin límite de tasa
+    SCHEDULER_ENABLED: bool = os.getenv("SCHEDULER_ENABLED", "true").lower() == "true"
+    SCHEDULER_MAX_CONCURRENT: int = int(os.getenv("SCHEDULER_MAX_CONCURRENT", "16"))
+    SCHEDULER_CHAT_RESERVED_SLOTS: int = int(os.getenv("SCHEDULER_CHAT_RESERVED_SLOTS", "4"))
+    SCHEDULER_CHAT_RATE_PER_SECOND: float = float(os.getenv("SCHEDULER_CHAT_RATE_PER_SECOND", "0"))
+    SCHEDULER_CHAT_BURST: int = int(os.getenv("SCHEDULER_CHAT_BURST", "10"))
+    SCHEDULER_CHAT_MAX_WAIT_SECONDS: float = float(os.getenv("SCHEDULER_CHAT_MAX_WAIT_SECONDS", "10"))
+    SCHEDULER_UPLOAD_RATE_PER_SECOND: float = float(os.getenv("SCHEDULER_UPLOAD_RATE_PER_SECOND", "0"))
+    SCHEDULER_UPLOAD_BURST: int = int(os.getenv("SCHEDULER_UPLOAD_BURST", "10"))
+    SCHEDULER_UPLOAD_MAX_CONCURRENT: int = int(os.getenv("SCHEDULER_UPLOAD_MAX_CONCURRENT", "8"))
+    # Consultas especulativas: menor prioridad, sin cupos reservados y descartables
+    SCHEDULER_PREFETCH_RATE_PER_SECOND: float = float(os.getenv("SCHEDULER_PREFETCH_RATE_PER_SECOND", "1"))
+    SCHEDULER_PREFETCH_BURST: int = int(os.getenv("SCHEDULER_PREFETCH_BURST", "2"))
+    SCHEDULER_PREFETCH_MAX_CONCURRENT: int = int(os.getenv("SCHEDULER_PREFETCH_MAX_CONCURRENT", "2"))
+    SCHEDULER_PREFETCH_MAX_WAIT_SECONDS: float = float(os.getenv("SCHEDULER_PREFETCH_MAX_WAIT_SECONDS", "5"))
+    
+    # Configuración del pool de conexiones HTTP (keep-alive por host de webhook)
+    WEBHOOK_POOL_CONNECTIONS: int = int(os.getenv("WEBHOOK_POOL_CONNECTIONS", "4"))
+    WEBHOOK_POOL_MAXSIZE: int = int(os.getenv("WEBHOOK_POOL_MAXSIZE", "16"))
+    
+    # Configuración de reintentos con backoff exponencial
+    WEBHOOK_MAX_RETRIES: int = int(os.getenv("WEBHOOK_MAX_RETRIES", "2"))
+    WEBHOOK_BACKOFF_FACTOR: float = float(os.getenv("WEBHOOK_BACKOFF_FACTOR", "0.5"))
+    WEBHOOK_RETRY_STATUSES: list[int] = [
+        int(code) for code in os.getenv("WEBHOOK_RETRY_STATUSES", "429,503").split(",") if code.strip()
+    ]
+    
+    # Configuración de streaming de respuestas del chat
+    CHAT_STREAMING_ENABLED: bool = os.getenv("CHAT_STREAMING_ENABLED", "true").lower() == "true"
+    CHAT_STREAM_RENDER_INTERVAL_SECONDS: float = float(os.getenv("CHAT_STREAM_RENDER_INTERVAL_SECONDS", "0.05"))
+    
+    # Consultas en paralelo documento por documento (respuesta combinada con citas)
+    CHAT_FANOUT_ENABLED: bool = os.getenv("CHAT_FANOUT_ENABLED", "true").lower() == "true"
+    CHAT_FANOUT_MAX_DOCUMENTS: int = int(os.getenv("CHAT_FANOUT_MAX_DOCUMENTS", "8"))
+    CHAT_FANOUT_MAX_WORKERS: int = int(os.getenv("CHAT_FANOUT_MAX_WORKERS", "4"))
+    CHAT_FANOUT_DOCUMENT_OPTIONS: int = int(os.getenv("CHAT_FANOUT_DOCUMENT_OPTIONS", "200"))
+    
+    # Precarga especulativa de preguntas de seguimiento mientras el usuario lee.
+    # PREFETCH_SESSION_BUDGET consultas como máximo por sesión cada PREFETCH_BUDGET_WINDOW_SECONDS
+    PREFETCH_ENABLED: bool = os.getenv("PREFETCH_ENABLED", "false").lower() == "true"
+    PREFETCH_FOLLOW_UPS: int = int(os.getenv("PREFETCH_FOLLOW_UPS", "2"))
+    PREFETCH_SESSION_BUDGET: int = int(os.getenv("PREFETCH_SESSION_BUDGET", "6"))
+    PREFETCH_BUDGET_WINDOW_SECONDS: float = float(os.getenv("PREFETCH_BUDGET_WINDOW_SECONDS", "600"))
+    PREFETCH_MAX_WORKERS: int = int(os.getenv("PREFETCH_MAX_WORKERS", "2"))
+    PREFETCH_TTL_SECONDS: float = float(os.getenv("PREFETCH_TTL_SECONDS", "900"))
+    PREFETCH_CLICK_WAIT_SECONDS: float = float(os.getenv("PREFETCH_CLICK_WAIT_SECONDS", "15"))
+    
+    # Ventana del historial de chat (turnos visibles y caché de HTML renderizado)
+    CHAT_HISTORY_WINDOW_TURNS: int = int(os.getenv("CHAT_HISTORY_WINDOW_TURNS", "10"))
+    CHAT_HTML_CACHE_SIZE: int = int(os.getenv("CHAT_HTML_CACHE_SIZE", "2048"))
+    
+    # Caché de respuestas del chat (opcional)
+    CHAT_CACHE_ENABLED: bool = os.getenv("CHAT_CACHE_ENABLED", "false").lower() == "true"
+    CHAT_CACHE_MAX_ENTRIES: int = int(os.getenv("CHAT_CACHE_MAX_ENTRIES", "512"))
+    CHAT_CACHE_MAX_BYTES: int = int(os.getenv("CHAT_CACHE_MAX_BYTES", str(8 * 1024 * 1024)))
+    CHAT_CACHE_TTL_SECONDS: float = float(os.getenv("CHAT_CACHE_TTL_SECONDS", "3600"))
+    
+    # Caché semántica (opcional): reutiliza la respuesta de una consulta casi
+    # idéntica (similitud coseno de n-gramas con hashing >= umbral)
+    CHAT_SEMANTIC_CACHE_ENABLED: bool = os.getenv("CHAT_SEMANTIC_CACHE_ENABLED", "false").lower() == "true"
+    CHAT_SEMANTIC_CACHE_THRESHOLD: float = float(os.getenv("CHAT_SEMANTIC_CACHE_THRESHOLD", "0.85"))
+    CHAT_SEMANTIC_CACHE_MAX_ENTRIES: int = int(os.getenv("CHAT_SEMANTIC_CACHE_MAX_ENTRIES", "1024"))
+    CHAT_SEMANTIC_CACHE_DIMENSIONS: int = int(os.getenv("CHAT_SEMANTIC_CACHE_DIMENSIONS", "2048"))
+    
+    # Configuración de concurrencia para la carga de documentos
+    UPLOAD_MAX_WORKERS: int = int(os.getenv("UPLOAD_MAX_WORKERS", "4"))
+    
+    # Perfil de tiempos por sección de cada rerun (se imprime en la terminal)
+    PROFILE_ENABLED: bool = os.getenv("APP_PROFILE", "false").lower() == "true"
+    PROFILE_HISTORY_SIZE: int = int(os.getenv("APP_PROFILE_HISTORY_SIZE", "200"))
+    
+    # Directorio para datos locales persistentes (registros, cachés, etc.)
+    DATA_DIR: str = os.getenv("APP_DATA_DIR", ".data")
+    
+    # Modo de producción con varios procesos (`run.py --workers N`): número de
+    # este proceso y almacén SQLite compartido para la caché de respuestas y la
+    # versión de la biblioteca. run.py los configura en cada proceso
+    APP_WORKER_ID: int = int(os.getenv("APP_WORKER_ID", "0"))
+    SHARED_STORE_ENABLED: bool = os.getenv("SHARED_STORE_ENABLED", "false").lower() == "true"
+    SHARED_STORE_PATH: str = os.getenv("SHARED_STORE_PATH", os.path.join(DATA_DIR, "shared_store.sqlite3"))
+    
+    # Registro de documentos ya cargados (deduplicación por hash de contenido)
+    UPLOAD_LEDGER_PATH: str = os.getenv("UPLOAD_LEDGER_PATH", os.path.join(DATA_DIR, "upload_ledger.sqlite3"))
+    UPLOAD_LEDGER_MAX_ENTRIES: int = int(os.getenv("UPLOAD_LEDGER_MAX_ENTRIES", "50000"))
+    UPLOAD_LEDGER_MAX_AGE_DAYS: float = float(os.getenv("UPLOAD_LEDGER_MAX_AGE_DAYS", "90"))
+    
+    # Índice local de la biblioteca (nombre, hash, tamaño, tipo, estado) con búsqueda
+    LIBRARY_INDEX_PATH: str = os.getenv("LIBRARY_INDEX_PATH", os.path.join(DATA_DIR, "library.sqlite3"))
+    LIBRARY_SEARCH_LIMIT: int = int(os.getenv("LIBRARY_SEARCH_LIMIT", "8"))
+    
+    # Historial de chat persistente ("sqlite" o "memory"). En la sesión solo se
+    # mantienen los últimos CHAT_HISTORY_MEMORY_TURNS turnos; el resto se pagina
+    CHAT_HISTORY_BACKEND: str = os.getenv("CHAT_HISTORY_BACKEND", "sqlite").lower()
+    CHAT_HISTORY_DB_PATH: str = os.getenv("CHAT_HISTORY_DB_PATH", os.path.join(DATA_DIR, "chat_history.sqlite3"))
+    CHAT_HISTORY_MEMORY_TURNS: int = int(os.getenv("CHAT_HISTORY_MEMORY_TURNS", "30"))
+    CHAT_HISTORY_MAX_AGE_DAYS: float = float(os.getenv("CHAT_HISTORY_MAX_AGE_DAYS", "30"))
+    
+    # Memoria de las sesiones del navegador: tope por sesión (los turnos más
+    # antiguos quedan solo en el almacén), tope del proceso y expulsión de las
+    # sesiones inactivas (se liberan su ventana de historial y sus archivos subidos)
+    SESSION_MEMORY_MAX_BYTES: int = int(os.getenv("SESSION_MEMORY_MAX_BYTES", str(2 * 1024 * 1024)))
+    SESSION_MEMORY_TOTAL_MAX_BYTES: int = int(os.getenv("SESSION_MEMORY_TOTAL_MAX_BYTES", str(256 * 1024 * 1024)))
+    SESSION_IDLE_TIMEOUT_SECONDS: float = float(os.getenv("SESSION_IDLE_TIMEOUT_SECONDS", "1800"))
+    
+    # Cola de cargas en segundo plano (persistida en disco)
+    UPLOAD_BACKGROUND_ENABLED: bool = os.getenv("UPLOAD_BACKGROUND_ENABLED", "true").lower() == "true"
+    UPLOAD_JOBS_DB_PATH: str = os.getenv("UPLOAD_JOBS_DB_PATH", os.path.join(DATA_DIR, "upload_jobs.sqlite3"))
+    UPLOAD_SPOOL_DIR: str = os.getenv("UPLOAD_SPOOL_DIR", os.path.join(DATA_DIR, "spool"))
+    UPLOAD_JOB_POLL_SECONDS: float = float(os.getenv("UPLOAD_JOB_POLL_SECONDS", "5"))
+    UPLOAD_STATUS_REFRESH_SECONDS: float = float(os.getenv("UPLOAD_STATUS_REFRESH_SECONDS", "1.5"))
+    UPLOAD_JOB_RETENTION_HOURS: float = float(os.getenv("UPLOAD_JOB_RETENTION_HOURS", "72"))
+    # Latido de los trabajos en curso; sin latido durante UPLOAD_JOB_STALE_SECONDS
+    # el trabajo vuelve a la cola (su proceso ya no existe)
+    UPLOAD_JOB_HEARTBEAT_SECONDS: float = float(os.getenv("UPLOAD_JOB_HEARTBEAT_SECONDS", "10"))
+    UPLOAD_JOB_STALE_SECONDS: float = float(os.getenv("UPLOAD_JOB_STALE_SECONDS", "60"))
+    
+    # Bitácora de llamadas a los webhooks (JSON por línea, rota por tamaño).
+    # Con JOURNAL_INCLUDE_CONTENT=false no se guarda el texto de consultas ni respuestas
+    JOURNAL_ENABLED: bool = os.getenv("JOURNAL_ENABLED", "false").lower() == "true"
+    JOURNAL_PATH: str = os.getenv("JOURNAL_PATH", os.path.join(DATA_DIR, "journal", "webhooks.jsonl"))
+    JOURNAL_MAX_MB: float = float(os.getenv("JOURNAL_MAX_MB", "20"))
+    JOURNAL_BACKUP_COUNT: int = int(os.getenv("JOURNAL_BACKUP_COUNT", "5"))
+    JOURNAL_INCLUDE_CONTENT: bool = os.getenv("JOURNAL_INCLUDE_CONTENT", "true").lower() == "true"
+    JOURNAL_RESPONSE_MAX_CHARS: int = int(os.getenv("JOURNAL_RESPONSE_MAX_CHARS", "2000"))
+    
+    # Métricas de los webhooks (endpoint Prometheus local y/o archivo)
+    METRICS_HOST: str = os.getenv("METRICS_HOST", "127.0.0.1")
+    METRICS_PORT: int = int(os.getenv("METRICS_PORT", "0"))
+    METRICS_FILE_PATH: str = os.getenv("METRICS_FILE_PATH", "")
+    METRICS_DUMP_INTERVAL_SECONDS: float = float(os.getenv("METRICS_DUMP_INTERVAL_SECONDS", "10"))
+    METRICS_WINDOW_SIZE: int = int(os.getenv("METRICS_WINDOW_SIZE", "200"))
     
     # Configuración de la UI
     PAGE_TITLE: str = "Asistente Legal Inteligente"
@@ -31,17 +208,25 @@ class Config:
     MESSAGES = {
         "upload_success": "✅ Documento '{filename}' agregado exitosamente.",
         "upload_error": "❌ No pudimos procesar el documento: {error}",
+        "file_too_large": "❌ '{filename}' supera el tamaño máximo permitido de {max_size_mb} MB.",
+        "upload_duplicate": "♻️ '{filename}' ya está en tu biblioteca, no se volvió a enviar.",
         "chat_error": "Lo siento, no pude procesar tu consulta en este momento. Intenta de nuevo.",
         "message_too_short": "❌ Tu consulta es muy corta. Escribe al menos {min_length} caracteres.",
         "no_files_selected": "❌ Por favor selecciona al menos un documento.",
         "processing": "🤔 Analizando tu consulta...",
         "uploading": "📤 Agregando documentos a tu biblioteca...",
+        "upload_queued": "📥 {count} documento(s) en cola. Puedes seguir usando la aplicación mientras se agregan.",
         "connection_error": "❌ Problema de conexión. Verifica tu internet e intenta nuevamente.",
-        "timeout_error": "⏱️ La consulta está tardando más de lo normal. Intenta nuevamente."
+        "timeout_error": "⏱️ La consulta está tardando más de lo normal. Intenta nuevamente.",
+        "service_unavailable": "⏸️ El asistente no está disponible en este momento. Intenta nuevamente en unos segundos.",
+        "fanout_pending": "⏳ Consultando...",
+        "fanout_failed": "⚠️ Sin respuesta para este documento. {error}",
+        "service_busy": "⏳ Hay muchas consultas en curso. Intenta nuevamente en unos segundos."
     }
 
+@lru_cache(maxsize=None)
 def get_config() -> Config:
-    """Retorna la instancia de configuración"""
+    """Retorna la instancia de configuración (única por proceso)"""
     return Config()
 
 # INSTRUCCIONES PARA CONFIGURAR TUS WEBHOOKS:
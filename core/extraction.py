@@ -0,0 +1,144 @@
+"""
+Extracción y compresión de texto de los documentos antes de enviarlos.
+
+Para los tipos de `ALLOWED_FILE_TYPES` se extrae el texto localmente, se
+normaliza y se comprime con gzip, de modo que el webhook pueda recibir solo el
+texto (o el texto junto al archivo original) en lugar de extraerlo en N8N.
+
+La extracción corre en un pool de procesos para no bloquear el intérprete de
+Streamlit. Los PDFs requieren el paquete opcional `pypdf`; los DOCX se leen
+con la biblioteca estándar. Si un documento no puede procesarse se envía el
+archivo original sin cambios.
+"""
+
+import gzip
+import io
+import multiprocessing
+import re
+import threading
+import unicodedata
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+from xml.etree import ElementTree
+
+from config import get_config
+
+config = get_config()
+
+_WORD_NAMESPACE = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+_CONTROL_CHARS = re.compile(r"[\x00-\x08\x0b\x0c\x0e-\x1f\x7f]")
+_INLINE_SPACES = re.compile(r"[ \t\u00a0]+")
+_BLANK_LINES = re.compile(r"\n{3,}")
+
+class ExtractedText:
+    """Texto extraído y comprimido de un documento"""
+
+    def __init__(self, gzipped: bytes, chars: int):
+        self.gzipped = gzipped
+        self.chars = chars
+
+def _extension(filename: str) -> str:
+    return filename.rsplit(".", 1)[-1].lower() if "." in filename else ""
+
+def _extract_docx(data: bytes) -> str:
+    with zipfile.ZipFile(io.BytesIO(data)) as archive:
+        document = archive.read("word/document.xml")
+    paragraphs = []
+    current = []
+    for event, element in ElementTree.iterparse(io.BytesIO(document), events=("end",)):
+        if element.tag == f"{_WORD_NAMESPACE}t":
+            current.append(element.text or "")
+        elif element.tag == f"{_WORD_NAMESPACE}tab":
+            current.append("\t")
+        elif element.tag in (f"{_WORD_NAMESPACE}br", f"{_WORD_NAMESPACE}cr"):
+            current.append("\n")
+        elif element.tag == f"{_WORD_NAMESPACE}p":
+            paragraphs.append("".join(current))
+            current = []
+            element.clear()
+    return "\n".join(paragraphs)
+
+def _extract_pdf(data: bytes) -> Optional[str]:
+    try:
+        from pypdf import PdfReader
+    except ImportError:
+        return None
+    reader = PdfReader(io.BytesIO(data))
+    return "\n\n".join(page.extract_text() or "" for page in reader.pages)
+
+def extract_text(filename: str, data: bytes) -> Optional[str]:
+    """Extrae el texto según la extensión; None si el tipo no es soportado"""
+    extension = _extension(filename)
+    if extension in ("txt", "md"):
+        return data.decode("utf-8", errors="replace")
+    if extension == "docx":
+        return _extract_docx(data)
+    if extension == "pdf":
+        return _extract_pdf(data)
+    return None
+
+def normalize_text(text: str) -> str:
+    """Normaliza Unicode, espacios y saltos de línea"""
+    text = unicodedata.normalize("NFC", text.replace("\r\n", "\n").replace("\r", "\n"))
+    text = _CONTROL_CHARS.sub("", text)
+    text = "\n".join(_INLINE_SPACES.sub(" ", line).strip() for line in text.split("\n"))
+    return _BLANK_LINES.sub("\n\n", text).strip()
+
+def normalized_text(filename: str, data: bytes) -> Optional[str]:
+    """Extrae y normaliza el texto. Se ejecuta en el pool de procesos."""
+    text = extract_text(filename, data)
+    if not text:
+        return None
+    return normalize_text(text) or None
+
+def prepare_text(filename: str, data: bytes) -> Optional[tuple[bytes, int]]:
+    """Extrae, normaliza y comprime el texto. Se ejecuta en el pool de procesos."""
+    text = normalized_text(filename, data)
+    if text is None:
+        return None
+    return gzip.compress(text.encode("utf-8"), compresslevel=6), len(text)
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+def get_extraction_pool() -> ProcessPoolExecutor:
+    """Retorna el pool de procesos de extracción compartido"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                # "spawn" evita heredar los hilos del servidor de Streamlit
+                _pool = ProcessPoolExecutor(
+                    max_workers=config.EXTRACTION_WORKERS,
+                    mp_context=multiprocessing.get_context("spawn")
+                )
+    return _pool
+
+def _run_in_pool(function, filename: str, buffer: memoryview):
+    """Ejecuta `function(filename, datos)` en el pool; None si no aplica o falla"""
+    if _extension(filename) not in config.ALLOWED_FILE_TYPES:
+        return None
+    if buffer.nbytes > config.EXTRACTION_MAX_FILE_SIZE_MB * 1024 * 1024:
+        return None
+    try:
+        future = get_extraction_pool().submit(function, filename, buffer.tobytes())
+        return future.result(timeout=config.EXTRACTION_TIMEOUT_SECONDS)
+    except Exception:
+        return None
+
+def extract_for_upload(filename: str, buffer: memoryview) -> Optional[ExtractedText]:
+    """Prepara el texto comprimido de un documento para enviarlo al webhook.
+
+    Retorna None si el tipo no está permitido, el archivo es demasiado grande
+    para procesarlo, no tiene texto extraíble o la extracción falla.
+    """
+    result = _run_in_pool(prepare_text, filename, buffer)
+    if result is None:
+        return None
+    gzipped, chars = result
+    return ExtractedText(gzipped, chars)
+
+def extract_plain_text(filename: str, buffer: memoryview) -> Optional[str]:
+    """Texto normalizado de un documento (sin comprimir); None si no hay texto"""
+    return _run_in_pool(normalized_text, filename, buffer)
@@ -0,0 +1,117 @@
+"""
+Consultas en paralelo documento por documento.
+
+Para preguntas que comparan varios contratos o normas, una sola búsqueda sobre
+toda la biblioteca es lenta y suele dejar documentos fuera. Aquí la misma
+pregunta se envía una vez por documento elegido, cada una limitada a ese
+documento con el campo `scope` del cuerpo:
+
+```json
+{"message": "...", "session_id": "<session_id>-doc-<hash>",
+ "scope": {"document_id": "<sha256>", "filename": "Ley_1258.pdf",
+           "fanout_id": "<id del grupo>", "index": 0, "total": 3}}
+```
+
+Cada subconsulta le llega a N8N con una sesión derivada del documento
+(`<session_id>-doc-<hash>`): si compartieran la sesión real, el workflow
+mezclaría en la memoria de la conversación N preguntas iguales con respuestas
+sobre documentos distintos, escritas en paralelo y en cualquier orden. Al
+derivarla del documento, las consultas sucesivas sobre un mismo documento
+comparten su memoria. En el planificador las subconsultas cuentan como la
+sesión real, así que una comparación de muchos documentos no le quita turnos
+del chat a las demás sesiones.
+
+Las subconsultas se hacen de forma concurrente con un pool acotado
+(`CHAT_FANOUT_MAX_WORKERS`), así que el tiempo total es el de la más lenta y
+no la suma. A medida que cada una termina se arma la respuesta combinada, con
+una sección numerada por documento y la lista de fuentes al final.
+"""
+
+import html
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Optional
+
+from chat import send_message_to_chat_webhook
+from config import get_config
+
+config = get_config()
+
+def document_session_id(session_id: Optional[str], document: dict) -> Optional[str]:
+    """Sesión de memoria en N8N de las consultas sobre un documento"""
+    return f"{session_id}-doc-{document['content_hash'][:16]}" if session_id else None
+
+def build_scope(document: dict, fanout_id: str, index: int, total: int) -> dict:
+    return {
+        "document_id": document["content_hash"],
+        "filename": document["filename"],
+        "fanout_id": fanout_id,
+        "index": index,
+        "total": total,
+    }
+
+def merge_answers(documents: list[dict], answers: list[Optional[tuple[bool, str]]]) -> str:
+    """Une las respuestas por documento en una sola, citando cada fuente.
+
+    Las subconsultas que aún no terminan (`None`) se muestran como pendientes.
+    """
+    sections = []
+    for number, (document, answer) in enumerate(zip(documents, answers), start=1):
+        if answer is None:
+            text = config.MESSAGES["fanout_pending"]
+        elif answer[0]:
+            text = answer[1]
+        else:
+            text = config.MESSAGES["fanout_failed"].format(error=answer[1])
+        sections.append(f"<strong>[{number}] 📄 {html.escape(document['filename'])}</strong><br>{text}")
+    sources = " • ".join(
+        f"[{number}] {html.escape(document['filename'])}" for number, document in enumerate(documents, start=1)
+    )
+    return "<br><br>".join(sections) + f"<br><br><small>📚 Fuentes: {sources}</small>"
+
+def fan_out_query(
+    message: str,
+    documents: list[dict],
+    webhook_url: str,
+    session_id: Optional[str] = None,
+    on_partial: Optional[Callable[[str, int, int], None]] = None
+) -> tuple[bool, str]:
+    """Hace la consulta sobre cada documento en paralelo y combina las respuestas.
+
+    `documents` son entradas del índice de la biblioteca (`content_hash`,
+    `filename`). `on_partial(respuesta_parcial, terminadas, total)` se invoca
+    en el hilo que llama cada vez que termina una subconsulta. Retorna éxito si
+    al menos un documento respondió.
+    """
+    if not documents:
+        return False, config.MESSAGES["chat_error"]
+
+    total = len(documents)
+    fanout_id = uuid.uuid4().hex
+    answers: list[Optional[tuple[bool, str]]] = [None] * total
+    max_workers = max(1, min(config.CHAT_FANOUT_MAX_WORKERS, total))
+
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="fanout") as executor:
+        futures = {
+            executor.submit(
+                send_message_to_chat_webhook,
+                message,
+                webhook_url,
+                session_id,
+                build_scope(document, fanout_id, index, total),
+                memory_session_id=document_session_id(session_id, document)
+            ): index
+            for index, document in enumerate(documents)
+        }
+        completed = 0
+        for future in as_completed(futures):
+            index = futures[future]
+            try:
+                answers[index] = future.result()
+            except Exception:
+                answers[index] = (False, config.MESSAGES["chat_error"])
+            completed += 1
+            if on_partial is not None:
+                on_partial(merge_answers(documents, answers), completed, total)
+
+    return any(success for success, _ in answers), merge_answers(documents, answers)
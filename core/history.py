@@ -0,0 +1,153 @@
+"""
+Historial de chat persistente por sesión.
+
+Cada mensaje se guarda en el almacén a medida que se crea, y la interfaz solo
+mantiene en `st.session_state` una ventana reciente y acotada. Los mensajes
+más antiguos se leen por páginas cuando el usuario los pide, de modo que la
+memoria del servidor depende de la cantidad de sesiones activas y no del largo
+de las conversaciones.
+
+El almacén es intercambiable (`CHAT_HISTORY_BACKEND`): "sqlite" (por defecto,
+sobrevive a recargas y reinicios) o "memory" (solo para desarrollo).
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import defaultdict
+from typing import Optional
+
+from config import get_config
+
+config = get_config()
+
+ChatMessage = tuple[str, str, str]
+
+class ChatHistoryStore(ABC):
+    """Interfaz de los almacenes de historial. Los mensajes son `(rol, texto, hora)`."""
+
+    @abstractmethod
+    def append(self, session_id: str, role: str, message: str, timestamp: str) -> None:
+        ...
+
+    @abstractmethod
+    def recent(self, session_id: str, limit: int, offset: int = 0) -> list[ChatMessage]:
+        """Retorna hasta `limit` mensajes en orden cronológico, omitiendo los
+        `offset` más recientes"""
+
+    @abstractmethod
+    def count(self, session_id: str) -> int:
+        ...
+
+    @abstractmethod
+    def clear(self, session_id: str) -> None:
+        ...
+
+class MemoryChatHistoryStore(ChatHistoryStore):
+    """Almacén en memoria del proceso; se pierde al reiniciar"""
+
+    def __init__(self):
+        self._messages: dict[str, list[ChatMessage]] = defaultdict(list)
+        self._lock = threading.Lock()
+
+    def append(self, session_id: str, role: str, message: str, timestamp: str) -> None:
+        with self._lock:
+            self._messages[session_id].append((role, message, timestamp))
+
+    def recent(self, session_id: str, limit: int, offset: int = 0) -> list[ChatMessage]:
+        with self._lock:
+            messages = self._messages.get(session_id, [])
+            end = max(0, len(messages) - offset)
+            return list(messages[max(0, end - limit):end])
+
+    def count(self, session_id: str) -> int:
+        with self._lock:
+            return len(self._messages.get(session_id, []))
+
+    def clear(self, session_id: str) -> None:
+        with self._lock:
+            self._messages.pop(session_id, None)
+
+class SQLiteChatHistoryStore(ChatHistoryStore):
+    """Almacén respaldado por SQLite, podado por antigüedad"""
+
+    def __init__(self, path: str, max_age_days: float):
+        self.path = path
+        self.max_age_seconds = max_age_days * 86400
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS chat_messages (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                session_id TEXT NOT NULL,
+                role TEXT NOT NULL,
+                message TEXT NOT NULL,
+                timestamp TEXT NOT NULL,
+                created_at REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_chat_messages_session ON chat_messages (session_id, id)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_chat_messages_created ON chat_messages (created_at)")
+        self._prune()
+
+    def append(self, session_id: str, role: str, message: str, timestamp: str) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO chat_messages (session_id, role, message, timestamp, created_at) VALUES (?, ?, ?, ?, ?)",
+                (session_id, role, message, timestamp, time.time())
+            )
+
+    def recent(self, session_id: str, limit: int, offset: int = 0) -> list[ChatMessage]:
+        if limit <= 0:
+            return []
+        with self._lock:
+            rows = self._conn.execute(
+                """
+                SELECT role, message, timestamp FROM chat_messages
+                WHERE session_id = ? ORDER BY id DESC LIMIT ? OFFSET ?
+                """,
+                (session_id, limit, offset)
+            ).fetchall()
+        return [tuple(row) for row in reversed(rows)]
+
+    def count(self, session_id: str) -> int:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT COUNT(*) FROM chat_messages WHERE session_id = ?", (session_id,)
+            ).fetchone()
+        return row[0]
+
+    def clear(self, session_id: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM chat_messages WHERE session_id = ?", (session_id,))
+
+    def _prune(self) -> None:
+        """Elimina las conversaciones más antiguas que la retención configurada"""
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM chat_messages WHERE created_at < ?", (time.time() - self.max_age_seconds,)
+            )
+
+_store: Optional[ChatHistoryStore] = None
+_store_lock = threading.Lock()
+
+def get_chat_history_store() -> ChatHistoryStore:
+    """Retorna el almacén de historial configurado en `CHAT_HISTORY_BACKEND`"""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                if config.CHAT_HISTORY_BACKEND == "memory":
+                    _store = MemoryChatHistoryStore()
+                else:
+                    _store = SQLiteChatHistoryStore(config.CHAT_HISTORY_DB_PATH, config.CHAT_HISTORY_MAX_AGE_DAYS)
+    return _store
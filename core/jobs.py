@@ -0,0 +1,411 @@
+"""
+Cola persistente de cargas de documentos en segundo plano.
+
+Los documentos se copian a un directorio de spool en disco y cada carga se
+registra como un trabajo en SQLite. Un pool de hilos del proceso consume la
+cola independientemente de los reruns de Streamlit, así que el usuario
+recupera el control de inmediato y cerrar la pestaña no cancela el lote. Si
+la aplicación se reinicia, los trabajos pendientes se retoman y los que ya
+terminaron no se vuelven a enviar.
+
+Varios procesos (`run.py --workers N`) pueden compartir la misma cola: cada
+trabajo se toma en una transacción y queda marcado con el proceso que lo
+envía, de modo que al reiniciarse un proceso retoma de inmediato sus propios
+trabajos interrumpidos. Mientras un trabajo está en curso, el proceso que lo
+envía renueva su latido cada `UPLOAD_JOB_HEARTBEAT_SECONDS`; cualquier proceso
+devuelve a la cola los trabajos sin latido durante `UPLOAD_JOB_STALE_SECONDS`,
+así que los de un proceso que ya no existe (por ejemplo, al reducir
+`--workers`) no quedan varados.
+"""
+
+import logging
+import mmap
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import ExitStack
+from typing import Callable, Optional
+
+from config import get_config
+from ledger import get_upload_ledger
+from uploads import (
+    batching_enabled,
+    register_failed_upload,
+    register_successful_upload,
+    send_file_to_webhook,
+    upload_files_batched,
+)
+
+config = get_config()
+logger = logging.getLogger(__name__)
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+JOB_DUPLICATE = "duplicate"
+
+PENDING_STATUSES = (JOB_QUEUED, JOB_RUNNING)
+
+class SpooledDocument:
+    """Documento guardado en el spool con la misma interfaz que un archivo subido.
+
+    `getbuffer()` expone el archivo mapeado en memoria, de modo que el envío
+    lee directamente del disco sin cargar el documento completo en RAM.
+    """
+
+    def __init__(self, path: str, name: str, content_type: str):
+        self.path = path
+        self.name = name
+        self.type = content_type
+        self.size = os.path.getsize(path)
+        self._file = None
+        self._mmap = None
+        self._views: list[memoryview] = []
+
+    def __enter__(self) -> "SpooledDocument":
+        if self.size:
+            self._file = open(self.path, "rb")
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        for view in self._views:
+            view.release()
+        self._views.clear()
+        if self._mmap is not None:
+            try:
+                self._mmap.close()
+            except BufferError:
+                # Aún hay vistas derivadas vivas; el mapeo se libera con ellas
+                pass
+        if self._file is not None:
+            self._file.close()
+
+    def getbuffer(self) -> memoryview:
+        view = memoryview(self._mmap) if self._mmap is not None else memoryview(b"")
+        self._views.append(view)
+        return view
+
+class UploadJobQueue:
+    """Cola de trabajos de carga persistida en disco y atendida por hilos"""
+
+    def __init__(
+        self,
+        db_path: str,
+        spool_dir: str,
+        workers: int,
+        upload_fn: Callable[[object, str, Optional[str]], tuple[bool, str]],
+        on_success: Optional[Callable[[str, str, int, Optional[str]], None]] = None,
+        on_failure: Optional[Callable[[str, str, int, Optional[str], str], None]] = None,
+        is_duplicate: Optional[Callable[[str], bool]] = None,
+        batch_upload_fn: Optional[Callable[..., list[tuple[object, bool, str]]]] = None,
+        claim_size: int = 1,
+        worker_id: int = 0
+    ):
+        self.db_path = db_path
+        self.spool_dir = spool_dir
+        self.workers = workers
+        self.upload_fn = upload_fn
+        self.on_success = on_success
+        self.on_failure = on_failure
+        self.is_duplicate = is_duplicate
+        # Con `batch_upload_fn` cada worker toma hasta `claim_size` trabajos del
+        # mismo lote y los envía juntos (ingesta por lotes)
+        self.batch_upload_fn = batch_upload_fn
+        self.claim_size = max(1, claim_size) if batch_upload_fn is not None else 1
+        self.worker_id = worker_id
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._threads: list[threading.Thread] = []
+        # Trabajos tomados por este proceso que aún no terminan (sus latidos)
+        self._active: set[str] = set()
+
+        os.makedirs(spool_dir, exist_ok=True)
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None, timeout=10)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS upload_jobs (
+                job_id TEXT PRIMARY KEY,
+                batch_id TEXT NOT NULL,
+                session_id TEXT,
+                webhook_url TEXT NOT NULL,
+                filename TEXT NOT NULL,
+                content_type TEXT,
+                size INTEGER NOT NULL,
+                digest TEXT NOT NULL,
+                force INTEGER NOT NULL DEFAULT 0,
+                status TEXT NOT NULL,
+                message TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )
+            """
+        )
+        columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(upload_jobs)")}
+        if "session_id" not in columns:
+            self._conn.execute("ALTER TABLE upload_jobs ADD COLUMN session_id TEXT")
+        if "worker_id" not in columns:
+            self._conn.execute("ALTER TABLE upload_jobs ADD COLUMN worker_id INTEGER")
+        if "heartbeat_at" not in columns:
+            self._conn.execute("ALTER TABLE upload_jobs ADD COLUMN heartbeat_at REAL")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_upload_jobs_status ON upload_jobs (status, created_at)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_upload_jobs_batch ON upload_jobs (batch_id)")
+
+    def start(self) -> None:
+        """Retoma los trabajos interrumpidos y arranca los hilos de trabajo"""
+        with self._lock:
+            if self._threads:
+                return
+            # Un trabajo "running" de este proceso al arrancar quedó a medias por
+            # un reinicio; los de otros procesos siguen en curso
+            self._conn.execute(
+                "UPDATE upload_jobs SET status = ?, updated_at = ? "
+                "WHERE status = ? AND (worker_id IS NULL OR worker_id = ?)",
+                (JOB_QUEUED, time.time(), JOB_RUNNING, self.worker_id)
+            )
+            self._prune(time.time())
+            for index in range(self.workers):
+                thread = threading.Thread(target=self._work, name=f"upload-job-{index}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+            thread = threading.Thread(target=self._heartbeat, name="upload-job-heartbeat", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def _heartbeat(self) -> None:
+        """Renueva el latido de los trabajos en curso y retoma los abandonados"""
+        while True:
+            time.sleep(config.UPLOAD_JOB_HEARTBEAT_SECONDS)
+            try:
+                self._beat(time.time())
+            except sqlite3.Error:
+                # Base ocupada por otro proceso: se reintenta en el próximo latido
+                pass
+
+    def _beat(self, now: float) -> int:
+        """Un latido; retorna cuántos trabajos abandonados volvieron a la cola"""
+        with self._wakeup:
+            active = list(self._active)
+            if active:
+                placeholders = ",".join("?" for _ in active)
+                self._conn.execute(
+                    f"UPDATE upload_jobs SET heartbeat_at = ? WHERE status = ? AND job_id IN ({placeholders})",
+                    (now, JOB_RUNNING, *active)
+                )
+            # Sin latido reciente: el proceso que los tomó terminó o se colgó
+            requeued = self._conn.execute(
+                "UPDATE upload_jobs SET status = ?, updated_at = ? "
+                "WHERE status = ? AND COALESCE(heartbeat_at, updated_at) < ?",
+                (JOB_QUEUED, now, JOB_RUNNING, now - config.UPLOAD_JOB_STALE_SECONDS)
+            ).rowcount
+            if requeued:
+                self._wakeup.notify_all()
+        return requeued
+
+    def _spool_path(self, job_id: str) -> str:
+        return os.path.join(self.spool_dir, job_id)
+
+    def enqueue(
+        self,
+        files: list[tuple[object, str]],
+        webhook_url: str,
+        force: bool = False,
+        session_id: Optional[str] = None
+    ) -> str:
+        """Guarda los archivos en el spool y los encola; retorna el id del lote"""
+        batch_id = uuid.uuid4().hex
+        now = time.time()
+        rows = []
+        for file, digest in files:
+            job_id = uuid.uuid4().hex
+            with open(self._spool_path(job_id), "wb") as spool_file:
+                spool_file.write(file.getbuffer())
+            rows.append((
+                job_id, batch_id, session_id, webhook_url, file.name, file.type, file.size,
+                digest, int(force), JOB_QUEUED, None, now, now
+            ))
+
+        with self._wakeup:
+            self._conn.executemany(
+                """
+                INSERT INTO upload_jobs (
+                    job_id, batch_id, session_id, webhook_url, filename, content_type, size,
+                    digest, force, status, message, created_at, updated_at
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                rows
+            )
+            self._wakeup.notify_all()
+        return batch_id
+
+    def jobs_for_batches(self, batch_ids: list[str]) -> list[dict]:
+        """Retorna el estado de los trabajos de los lotes indicados"""
+        if not batch_ids:
+            return []
+        placeholders = ",".join("?" for _ in batch_ids)
+        with self._lock:
+            rows = self._conn.execute(
+                f"""
+                SELECT job_id, batch_id, filename, size, status, message, created_at, updated_at
+                FROM upload_jobs WHERE batch_id IN ({placeholders}) ORDER BY created_at, filename
+                """,
+                batch_ids
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def pending_count(self) -> int:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT COUNT(*) FROM upload_jobs WHERE status IN (?, ?)", PENDING_STATUSES
+            ).fetchone()
+        return row[0]
+
+    def _claim_next(self) -> list[sqlite3.Row]:
+        """Toma los trabajos más antiguos de la cola; espera si no hay ninguno.
+
+        Retorna hasta `claim_size` trabajos, todos del mismo lote.
+        """
+        with self._wakeup:
+            while True:
+                # Transacción de escritura: otro proceso no puede tomar los mismos trabajos
+                self._conn.execute("BEGIN IMMEDIATE")
+                try:
+                    row = self._conn.execute(
+                        "SELECT batch_id FROM upload_jobs WHERE status = ? ORDER BY created_at LIMIT 1", (JOB_QUEUED,)
+                    ).fetchone()
+                    rows = []
+                    if row is not None:
+                        rows = self._conn.execute(
+                            """
+                            SELECT * FROM upload_jobs WHERE status = ? AND batch_id = ?
+                            ORDER BY created_at, filename LIMIT ?
+                            """,
+                            (JOB_QUEUED, row["batch_id"], self.claim_size)
+                        ).fetchall()
+                        now = time.time()
+                        self._conn.executemany(
+                            "UPDATE upload_jobs SET status = ?, worker_id = ?, updated_at = ?, heartbeat_at = ? "
+                            "WHERE job_id = ?",
+                            [(JOB_RUNNING, self.worker_id, now, now, job["job_id"]) for job in rows]
+                        )
+                    self._conn.execute("COMMIT")
+                except Exception:
+                    self._conn.execute("ROLLBACK")
+                    raise
+                if rows:
+                    self._active.update(job["job_id"] for job in rows)
+                    return rows
+                self._wakeup.wait(timeout=config.UPLOAD_JOB_POLL_SECONDS)
+
+    def _finish(self, job_id: str, status: str, message: str) -> None:
+        with self._lock:
+            self._conn.execute(
+                "UPDATE upload_jobs SET status = ?, message = ?, updated_at = ? WHERE job_id = ?",
+                (status, message, time.time(), job_id)
+            )
+            self._active.discard(job_id)
+        try:
+            os.remove(self._spool_path(job_id))
+        except FileNotFoundError:
+            pass
+
+    def _unfinished(self, jobs: list[sqlite3.Row]) -> list[sqlite3.Row]:
+        """Trabajos tomados que todavía no tienen un resultado"""
+        placeholders = ",".join("?" for _ in jobs)
+        with self._lock:
+            running = {
+                row["job_id"] for row in self._conn.execute(
+                    f"SELECT job_id FROM upload_jobs WHERE status = ? AND job_id IN ({placeholders})",
+                    (JOB_RUNNING, *(job["job_id"] for job in jobs))
+                )
+            }
+        return [job for job in jobs if job["job_id"] in running]
+
+    def _work(self) -> None:
+        while True:
+            jobs = self._claim_next()
+            try:
+                self._run(jobs)
+            except Exception as e:
+                logger.exception("Error al procesar el lote de carga %s: %s", jobs[0]["batch_id"], e)
+                # Los trabajos que ya terminaron (enviados o duplicados) conservan su resultado
+                message = config.MESSAGES["upload_error"].format(error="Error interno")
+                for job in self._unfinished(jobs):
+                    if self.on_failure is not None:
+                        self.on_failure(job["digest"], job["filename"], job["size"], job["content_type"], message)
+                    self._finish(job["job_id"], JOB_FAILED, message)
+
+    def _run(self, jobs: list[sqlite3.Row]) -> None:
+        ready = []
+        for job in jobs:
+            job_id = job["job_id"]
+            if not job["force"] and self.is_duplicate is not None and self.is_duplicate(job["digest"]):
+                self._finish(job_id, JOB_DUPLICATE, config.MESSAGES["upload_duplicate"].format(filename=job["filename"]))
+            elif not os.path.exists(self._spool_path(job_id)):
+                self._finish(job_id, JOB_FAILED, config.MESSAGES["upload_error"].format(error="Archivo temporal no encontrado"))
+            else:
+                ready.append(job)
+        if not ready:
+            return
+
+        with ExitStack() as stack:
+            documents = [
+                stack.enter_context(SpooledDocument(self._spool_path(job["job_id"]), job["filename"], job["content_type"]))
+                for job in ready
+            ]
+            first = ready[0]
+            if len(ready) > 1:
+                results = self.batch_upload_fn(documents, first["webhook_url"], session_id=first["session_id"])
+                outcomes = [(success, message) for _, success, message in results]
+            else:
+                outcomes = [self.upload_fn(documents[0], first["webhook_url"], first["session_id"])]
+
+        for job, (success, message) in zip(ready, outcomes):
+            if success:
+                if self.on_success is not None:
+                    self.on_success(job["digest"], job["filename"], job["size"], job["content_type"])
+                self._finish(job["job_id"], JOB_DONE, message)
+            else:
+                if self.on_failure is not None:
+                    self.on_failure(job["digest"], job["filename"], job["size"], job["content_type"], message)
+                self._finish(job["job_id"], JOB_FAILED, message)
+
+    def _prune(self, now: float) -> None:
+        """Elimina del historial los trabajos terminados más antiguos"""
+        self._conn.execute(
+            "DELETE FROM upload_jobs WHERE status NOT IN (?, ?) AND updated_at < ?",
+            (*PENDING_STATUSES, now - config.UPLOAD_JOB_RETENTION_HOURS * 3600)
+        )
+
+_queue: Optional[UploadJobQueue] = None
+_queue_lock = threading.Lock()
+
+def get_upload_job_queue() -> UploadJobQueue:
+    """Retorna la cola de cargas del proceso, arrancando los hilos la primera vez"""
+    global _queue
+    if _queue is None:
+        with _queue_lock:
+            if _queue is None:
+                queue = UploadJobQueue(
+                    config.UPLOAD_JOBS_DB_PATH,
+                    config.UPLOAD_SPOOL_DIR,
+                    workers=config.UPLOAD_MAX_WORKERS,
+                    upload_fn=send_file_to_webhook,
+                    on_success=register_successful_upload,
+                    on_failure=register_failed_upload,
+                    is_duplicate=lambda digest: get_upload_ledger().find(digest) is not None,
+                    batch_upload_fn=upload_files_batched if batching_enabled() else None,
+                    claim_size=config.UPLOAD_BATCH_MAX_FILES,
+                    worker_id=config.APP_WORKER_ID
+                )
+                queue.start()
+                _queue = queue
+    return _queue
@@ -0,0 +1,194 @@
+"""
+Bitácora de las llamadas a los webhooks.
+
+Con `JOURNAL_ENABLED=true` cada envío de consulta (`send_message_to_chat_webhook`,
+`stream_message_to_chat_webhook`), de documento (`send_file_to_webhook`) y de
+lote de fragmentos (ingesta por lotes) se agrega como una línea JSON a un archivo local que rota por tamaño
+(`JOURNAL_MAX_MB`, `JOURNAL_BACKUP_COUNT`). Cada entrada guarda los metadatos
+de la petición, la respuesta (recortada), la duración total, el resultado y el
+detalle de cada petición HTTP que hizo la operación (estado, latencia, primer
+byte y bytes), tomado de `metrics`.
+
+El contenido de los documentos nunca se guarda, solo su nombre, tipo y tamaño.
+Con `JOURNAL_INCLUDE_CONTENT=false` tampoco se guardan el texto de las
+consultas ni las respuestas, solo su longitud.
+
+`benchmarks/replay_journal.py` vuelve a ejecutar una bitácora contra cualquier
+URL de webhook.
+"""
+
+import functools
+import inspect
+import json
+import logging
+import os
+import threading
+import time
+from logging.handlers import RotatingFileHandler
+from typing import Callable, Iterator, Optional
+
+from config import get_config
+from metrics import CallRecord, registry
+
+config = get_config()
+
+OUTCOME_NOT_SENT = "not_sent"
+
+class RequestJournal:
+    """Archivo de entradas JSON, una por línea, que rota por tamaño"""
+
+    def __init__(self, path: str, max_bytes: int, backup_count: int):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # El handler de logging aporta la rotación y el bloqueo entre hilos
+        self._handler = RotatingFileHandler(
+            path, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8", delay=True
+        )
+
+    def write(self, entry: dict) -> None:
+        line = json.dumps(entry, ensure_ascii=False, separators=(",", ":"))
+        self._handler.handle(logging.makeLogRecord({"msg": line}))
+
+    def close(self) -> None:
+        self._handler.close()
+
+def journal_files(path: str) -> list[str]:
+    """Archivos de una bitácora (incluidas las rotaciones) del más antiguo al más nuevo"""
+    backups = []
+    index = 1
+    while os.path.exists(f"{path}.{index}"):
+        backups.append(f"{path}.{index}")
+        index += 1
+    files = list(reversed(backups))
+    if os.path.exists(path):
+        files.append(path)
+    return files
+
+def read_journal(path: str) -> Iterator[dict]:
+    """Recorre las entradas de una bitácora en orden cronológico"""
+    for file_path in journal_files(path):
+        with open(file_path, encoding="utf-8") as journal_file:
+            for line in journal_file:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    # Línea cortada por un cierre abrupto del proceso
+                    continue
+
+_journal: Optional[RequestJournal] = None
+_journal_lock = threading.Lock()
+
+# Peticiones HTTP de la operación en curso en cada hilo
+_active = threading.local()
+
+def _collect_call(webhook: str, latency_seconds: float, call: CallRecord) -> None:
+    calls = getattr(_active, "calls", None)
+    if calls is None:
+        return
+    calls.append({
+        "webhook": webhook,
+        "status_code": call.status_code,
+        "outcome": call.outcome,
+        "latency_seconds": round(latency_seconds, 6),
+        "first_byte_seconds": round(call.first_byte_seconds, 6) if call.first_byte_seconds is not None else None,
+        "request_bytes": call.request_bytes,
+        "response_bytes": call.response_bytes,
+    })
+
+def get_request_journal() -> RequestJournal:
+    """Retorna la bitácora del proceso"""
+    global _journal
+    if _journal is None:
+        with _journal_lock:
+            if _journal is None:
+                registry.add_listener(_collect_call)
+                _journal = RequestJournal(
+                    config.JOURNAL_PATH,
+                    max_bytes=int(config.JOURNAL_MAX_MB * 1024 * 1024),
+                    backup_count=config.JOURNAL_BACKUP_COUNT
+                )
+    return _journal
+
+def describe_chat_request(arguments: dict) -> dict:
+    message = arguments["message"]
+    request = {"message_chars": len(message)}
+    if config.JOURNAL_INCLUDE_CONTENT:
+        request["message"] = message
+    if arguments.get("scope"):
+        request["scope"] = arguments["scope"]
+    if arguments.get("memory_session_id"):
+        request["memory_session_id"] = arguments["memory_session_id"]
+    return request
+
+def describe_upload_request(arguments: dict) -> dict:
+    file = arguments["file"]
+    return {
+        "filename": file.name,
+        "content_type": file.type,
+        "file_size": file.getbuffer().nbytes,
+        "preprocess_mode": config.UPLOAD_PREPROCESS_MODE,
+    }
+
+def describe_batch_request(arguments: dict) -> dict:
+    filenames = arguments.get("filenames") or []
+    return {
+        "documents": len(filenames),
+        "filenames": filenames,
+        "request_bytes": len(arguments["body"]),
+    }
+
+def journaled(operation: str, webhook: str, describe: Callable[[dict], dict]):
+    """Decorador que registra en la bitácora cada llamada a una función
+    `(..., webhook_url, ..., session_id) -> (éxito, mensaje)`"""
+    def decorator(function):
+        signature = inspect.signature(function)
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not config.JOURNAL_ENABLED:
+                return function(*args, **kwargs)
+
+            arguments = signature.bind(*args, **kwargs)
+            arguments.apply_defaults()
+            arguments = arguments.arguments
+            journal = get_request_journal()
+            previous_calls = getattr(_active, "calls", None)
+            _active.calls = calls = []
+            started_at = time.time()
+            started = time.perf_counter()
+            try:
+                success, message = function(*args, **kwargs)
+            finally:
+                _active.calls = previous_calls
+            duration = time.perf_counter() - started
+
+            entry = {
+                "timestamp": round(started_at, 6),
+                "operation": operation,
+                "webhook": arguments.get("webhook", webhook),
+                "url": arguments.get("webhook_url"),
+                "session_id": arguments.get("session_id"),
+                "pid": os.getpid(),
+                "request": describe(arguments),
+                "success": success,
+                "outcome": calls[-1]["outcome"] if calls else OUTCOME_NOT_SENT,
+                "duration_seconds": round(duration, 6),
+                "response_chars": len(message),
+                "http": calls,
+            }
+            if config.JOURNAL_INCLUDE_CONTENT:
+                entry["response"] = message[:config.JOURNAL_RESPONSE_MAX_CHARS]
+            try:
+                journal.write(entry)
+            except Exception:
+                # La bitácora nunca debe interrumpir la operación
+                pass
+            return success, message
+
+        return wrapper
+    return decorator
@@ -0,0 +1,158 @@
+"""
+Registro persistente de documentos ya enviados al webhook de carga.
+
+Cada documento se identifica por el hash SHA-256 de su contenido, de modo que
+volver a seleccionar el mismo archivo (aunque cambie el nombre) se detecta
+antes de hacer cualquier petición de red. El registro vive en SQLite y se
+poda por antigüedad y por cantidad de entradas.
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+from config import get_config
+
+config = get_config()
+
+def content_hash(file) -> str:
+    """Calcula el hash SHA-256 del contenido de un archivo subido sin copiarlo"""
+    return hashlib.sha256(file.getbuffer()).hexdigest()
+
+class UploadLedger:
+    """Registro de hashes de documentos ingeridos, respaldado por SQLite"""
+
+    def __init__(self, path: str, max_entries: int, max_age_days: float):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_age_seconds = max_age_days * 86400
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS uploads (
+                content_hash TEXT PRIMARY KEY,
+                filename TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                uploaded_at REAL NOT NULL,
+                last_seen_at REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_uploads_last_seen ON uploads (last_seen_at)")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS chunk_progress (
+                upload_id TEXT PRIMARY KEY,
+                next_chunk INTEGER NOT NULL,
+                updated_at REAL NOT NULL
+            )
+            """
+        )
+
+    def find(self, digest: str) -> Optional[dict]:
+        """Retorna la entrada del documento si ya fue ingerido y no ha expirado"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT filename, size, uploaded_at FROM uploads WHERE content_hash = ? AND uploaded_at >= ?",
+                (digest, time.time() - self.max_age_seconds)
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute(
+                "UPDATE uploads SET last_seen_at = ? WHERE content_hash = ?",
+                (time.time(), digest)
+            )
+        return {"filename": row[0], "size": row[1], "uploaded_at": row[2]}
+
+    def record(self, digest: str, filename: str, size: int) -> None:
+        """Registra un documento ingerido correctamente"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                """
+                INSERT INTO uploads (content_hash, filename, size, uploaded_at, last_seen_at)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(content_hash) DO UPDATE SET
+                    filename = excluded.filename,
+                    uploaded_at = excluded.uploaded_at,
+                    last_seen_at = excluded.last_seen_at
+                """,
+                (digest, filename, size, now, now)
+            )
+            self._evict(now)
+
+    def entries(self) -> list[dict]:
+        """Retorna todos los documentos registrados y vigentes"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT content_hash, filename, size, uploaded_at FROM uploads WHERE uploaded_at >= ?",
+                (time.time() - self.max_age_seconds,)
+            ).fetchall()
+        return [
+            {"content_hash": row[0], "filename": row[1], "size": row[2], "uploaded_at": row[3]}
+            for row in rows
+        ]
+
+    def get_chunk_progress(self, upload_id: str) -> int:
+        """Retorna el índice del próximo fragmento a enviar de una carga por partes"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT next_chunk FROM chunk_progress WHERE upload_id = ? AND updated_at >= ?",
+                (upload_id, time.time() - self.max_age_seconds)
+            ).fetchone()
+        return row[0] if row else 0
+
+    def set_chunk_progress(self, upload_id: str, next_chunk: int) -> None:
+        """Guarda el avance de una carga por partes para poder reanudarla"""
+        with self._lock:
+            self._conn.execute(
+                """
+                INSERT INTO chunk_progress (upload_id, next_chunk, updated_at) VALUES (?, ?, ?)
+                ON CONFLICT(upload_id) DO UPDATE SET
+                    next_chunk = excluded.next_chunk,
+                    updated_at = excluded.updated_at
+                """,
+                (upload_id, next_chunk, time.time())
+            )
+
+    def clear_chunk_progress(self, upload_id: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM chunk_progress WHERE upload_id = ?", (upload_id,))
+
+    def _evict(self, now: float) -> None:
+        """Elimina entradas vencidas y las menos usadas si se supera el límite"""
+        self._conn.execute("DELETE FROM uploads WHERE uploaded_at < ?", (now - self.max_age_seconds,))
+        self._conn.execute("DELETE FROM chunk_progress WHERE updated_at < ?", (now - self.max_age_seconds,))
+        self._conn.execute(
+            """
+            DELETE FROM uploads WHERE content_hash IN (
+                SELECT content_hash FROM uploads ORDER BY last_seen_at DESC LIMIT -1 OFFSET ?
+            )
+            """,
+            (self.max_entries,)
+        )
+
+_ledger: Optional[UploadLedger] = None
+_ledger_lock = threading.Lock()
+
+def get_upload_ledger() -> UploadLedger:
+    """Retorna el registro de cargas compartido por el proceso"""
+    global _ledger
+    if _ledger is None:
+        with _ledger_lock:
+            if _ledger is None:
+                _ledger = UploadLedger(
+                    config.UPLOAD_LEDGER_PATH,
+                    max_entries=config.UPLOAD_LEDGER_MAX_ENTRIES,
+                    max_age_days=config.UPLOAD_LEDGER_MAX_AGE_DAYS
+                )
+    return _ledger
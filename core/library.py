@@ -0,0 +1,208 @@
+"""
+Índice local de la biblioteca de documentos.
+
+Guarda un registro por documento (identificado por el hash de su contenido)
+con nombre, tamaño, tipo, fecha de carga y estado de ingesta. Lo actualiza el
+camino de carga (`uploads`, `jobs`) y lo lee la barra lateral, de modo que el
+conteo y la búsqueda sobreviven a recargas y reinicios sin consultar al
+asistente.
+
+La búsqueda por nombre usa SQLite FTS5 con índices de prefijo ("ley 12"
+encuentra "Ley_1258_2008.pdf") e ignora tildes. Si la instalación de SQLite no
+trae FTS5 se recurre a `LIKE`.
+"""
+
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+from config import get_config
+from ledger import get_upload_ledger
+
+config = get_config()
+
+DOCUMENT_QUEUED = "queued"
+DOCUMENT_INGESTED = "ingested"
+DOCUMENT_FAILED = "failed"
+
+_TERM_PATTERN = re.compile(r"\w+")
+
+class DocumentIndex:
+    """Índice de documentos respaldado por SQLite, seguro entre hilos"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS documents (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                content_hash TEXT NOT NULL UNIQUE,
+                filename TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                content_type TEXT,
+                status TEXT NOT NULL,
+                message TEXT,
+                uploaded_at REAL,
+                updated_at REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_documents_status ON documents (status, updated_at)")
+        self.full_text = self._create_search_index()
+
+    def _create_search_index(self) -> bool:
+        """Crea el índice FTS5 sincronizado por triggers; False si no está disponible"""
+        try:
+            self._conn.execute(
+                """
+                CREATE VIRTUAL TABLE IF NOT EXISTS documents_fts USING fts5(
+                    filename,
+                    content='documents',
+                    content_rowid='id',
+                    tokenize='unicode61 remove_diacritics 2',
+                    prefix='1 2 3'
+                )
+                """
+            )
+        except sqlite3.OperationalError:
+            return False
+        self._conn.executescript(
+            """
+            CREATE TRIGGER IF NOT EXISTS documents_ai AFTER INSERT ON documents BEGIN
+                INSERT INTO documents_fts (rowid, filename) VALUES (new.id, new.filename);
+            END;
+            CREATE TRIGGER IF NOT EXISTS documents_ad AFTER DELETE ON documents BEGIN
+                INSERT INTO documents_fts (documents_fts, rowid, filename) VALUES ('delete', old.id, old.filename);
+            END;
+            CREATE TRIGGER IF NOT EXISTS documents_au AFTER UPDATE OF filename ON documents BEGIN
+                INSERT INTO documents_fts (documents_fts, rowid, filename) VALUES ('delete', old.id, old.filename);
+                INSERT INTO documents_fts (rowid, filename) VALUES (new.id, new.filename);
+            END;
+            """
+        )
+        return True
+
+    def _upsert(self, digest: str, filename: str, size: int, content_type: Optional[str], status: str, message: Optional[str]) -> None:
+        now = time.time()
+        uploaded_at = now if status == DOCUMENT_INGESTED else None
+        with self._lock:
+            # Un documento ya ingerido no vuelve a "en cola" ni a "error" por un reenvío
+            self._conn.execute(
+                """
+                INSERT INTO documents (content_hash, filename, size, content_type, status, message, uploaded_at, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(content_hash) DO UPDATE SET
+                    filename = excluded.filename,
+                    size = excluded.size,
+                    content_type = COALESCE(excluded.content_type, documents.content_type),
+                    status = excluded.status,
+                    message = excluded.message,
+                    uploaded_at = COALESCE(excluded.uploaded_at, documents.uploaded_at),
+                    updated_at = excluded.updated_at
+                WHERE excluded.status = ? OR documents.status != ?
+                """,
+                (digest, filename, size, content_type, status, message, uploaded_at, now,
+                 DOCUMENT_INGESTED, DOCUMENT_INGESTED)
+            )
+
+    def mark_queued(self, digest: str, filename: str, size: int, content_type: Optional[str] = None) -> None:
+        self._upsert(digest, filename, size, content_type, DOCUMENT_QUEUED, None)
+
+    def mark_ingested(self, digest: str, filename: str, size: int, content_type: Optional[str] = None) -> None:
+        self._upsert(digest, filename, size, content_type, DOCUMENT_INGESTED, None)
+
+    def mark_failed(self, digest: str, filename: str, size: int, content_type: Optional[str] = None, message: str = "") -> None:
+        self._upsert(digest, filename, size, content_type, DOCUMENT_FAILED, message)
+
+    def count(self, status: Optional[str] = DOCUMENT_INGESTED) -> int:
+        """Cantidad de documentos en el estado indicado (todos con `None`)"""
+        with self._lock:
+            if status is None:
+                row = self._conn.execute("SELECT COUNT(*) FROM documents").fetchone()
+            else:
+                row = self._conn.execute("SELECT COUNT(*) FROM documents WHERE status = ?", (status,)).fetchone()
+        return row[0]
+
+    def search(self, query: str, limit: int = 10) -> list[dict]:
+        """Busca documentos cuyo nombre contenga todas las palabras (o sus
+        prefijos) de la consulta; sin consulta retorna los más recientes"""
+        terms = _TERM_PATTERN.findall(query.lower())
+        columns = "d.content_hash, d.filename, d.size, d.content_type, d.status, d.message, d.uploaded_at, d.updated_at"
+        with self._lock:
+            if not terms:
+                rows = self._conn.execute(
+                    f"SELECT {columns} FROM documents d ORDER BY d.updated_at DESC LIMIT ?", (limit,)
+                ).fetchall()
+            elif self.full_text:
+                match = " ".join(f'"{term}"*' for term in terms)
+                rows = self._conn.execute(
+                    f"""
+                    SELECT {columns} FROM documents_fts f JOIN documents d ON d.id = f.rowid
+                    WHERE documents_fts MATCH ? ORDER BY bm25(documents_fts), d.updated_at DESC LIMIT ?
+                    """,
+                    (match, limit)
+                ).fetchall()
+            else:
+                conditions = " AND ".join("LOWER(d.filename) LIKE ?" for _ in terms)
+                rows = self._conn.execute(
+                    f"SELECT {columns} FROM documents d WHERE {conditions} ORDER BY d.updated_at DESC LIMIT ?",
+                    (*[f"%{term}%" for term in terms], limit)
+                ).fetchall()
+        return [dict(row) for row in rows]
+
+    def recent(self, limit: int, status: Optional[str] = DOCUMENT_INGESTED) -> list[dict]:
+        """Documentos más recientes en el estado indicado (todos con `None`)"""
+        with self._lock:
+            if status is None:
+                rows = self._conn.execute(
+                    "SELECT content_hash, filename, size, content_type, status, uploaded_at FROM documents "
+                    "ORDER BY updated_at DESC LIMIT ?", (limit,)
+                ).fetchall()
+            else:
+                rows = self._conn.execute(
+                    "SELECT content_hash, filename, size, content_type, status, uploaded_at FROM documents "
+                    "WHERE status = ? ORDER BY updated_at DESC LIMIT ?", (status, limit)
+                ).fetchall()
+        return [dict(row) for row in rows]
+
+    def import_entries(self, entries: list[dict]) -> None:
+        """Agrega como ingeridos documentos registrados antes de existir el índice"""
+        with self._lock:
+            self._conn.executemany(
+                """
+                INSERT OR IGNORE INTO documents (content_hash, filename, size, status, uploaded_at, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+                """,
+                [
+                    (entry["content_hash"], entry["filename"], entry["size"], DOCUMENT_INGESTED,
+                     entry["uploaded_at"], entry["uploaded_at"])
+                    for entry in entries
+                ]
+            )
+
+_index: Optional[DocumentIndex] = None
+_index_lock = threading.Lock()
+
+def get_document_index() -> DocumentIndex:
+    """Retorna el índice de la biblioteca compartido por el proceso"""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                index = DocumentIndex(config.LIBRARY_INDEX_PATH)
+                if not index.count(None):
+                    # Primera ejecución: partir de los documentos del registro de cargas
+                    index.import_entries(get_upload_ledger().entries())
+                _index = index
+    return _index
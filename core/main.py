@@ -1,14 +1,51 @@
+import time
+_script_started_at = time.perf_counter()
+
 import streamlit as st
-import requests
-import json
+import streamlit.components.v1 as components
 from datetime import datetime
-from typing import Optional
-import time
+from typing import Callable, Optional
 from config import get_config
+from chat import send_message_to_chat_webhook, stream_message_to_chat_webhook
+from fanout import fan_out_query
+from history import get_chat_history_store
+from uploads import (
+    partition_new_files,
+    register_failed_upload,
+    register_queued_uploads,
+    register_successful_upload,
+    upload_files,
+)
+from jobs import JOB_DONE, JOB_DUPLICATE, JOB_FAILED, JOB_QUEUED, JOB_RUNNING, PENDING_STATUSES, get_upload_job_queue
+from library import DOCUMENT_FAILED, DOCUMENT_INGESTED, DOCUMENT_QUEUED, get_document_index
+from prefetch import get_prefetcher, suggest_follow_ups
+from response_cache import get_library_version, get_response_cache
+from resilience import open_circuits
+from scheduler import get_scheduler
+from semantic_cache import get_semantic_cache
+from session_memory import get_session_memory, streamlit_session_id
+from routing import route_chat_webhook
+from metrics import registry as metrics_registry, start_metrics_server
+from profiling import finish_rerun_profile, profile_summary, start_rerun_profile
+from proxy import SESSION_COOKIE, is_session_id, new_session_id
+from styles import APP_STYLES
+from chat_html import cached_chat_message_html, chat_message_html
 
-# Obtener configuración
+# Tiempos de esta ejecución del script (ver APP_PROFILE)
+profile = start_rerun_profile(_script_started_at)
+profile.mark("imports")
+
+# Obtener configuración (instancia única por proceso)
 config = get_config()
 
+# Exportador de métricas (idempotente: solo se inicia una vez por proceso)
+start_metrics_server()
+
+# Cola de cargas: retoma los envíos pendientes aunque nadie suba otro documento
+# (idempotente; `run.py` ya la inicia al arrancar el proceso)
+if config.UPLOAD_BACKGROUND_ENABLED:
+    get_upload_job_queue()
+
 # Configuración de la página
 st.set_page_config(
     page_title=config.PAGE_TITLE, 
@@ -16,206 +53,119 @@ st.set_page_config(
     layout="wide",
     initial_sidebar_state="expanded"
 )
+profile.mark("config")
 
-# CSS personalizado para una interfaz moderna y limpia
-st.markdown("""
-<style>
-    .main-header {
-        text-align: center;
-        padding: 2rem 0;
-        background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-        color: white;
-        border-radius: 15px;
-        margin-bottom: 2rem;
-        box-shadow: 0 4px 6px rgba(0, 0, 0, 0.1);
-    }
-    
-    .main-header h1 {
-        margin: 0;
-        font-size: 2.5rem;
-        font-weight: 600;
-    }
-    
-    .main-header p {
-        margin: 0.5rem 0 0 0;
-        font-size: 1.1rem;
-        opacity: 0.9;
-    }
-    
-    .section-container {
-        background-color: #ffffff;
-        padding: 2rem;
-        border-radius: 15px;
-        box-shadow: 0 2px 10px rgba(0, 0, 0, 0.08);
-        border: 1px solid #e2e8f0;
-        margin: 1rem 0;
-    }
-    
-    .upload-area {
-        background: linear-gradient(135deg, #f8fafc 0%, #e2e8f0 100%);
-        padding: 2rem;
-        border-radius: 12px;
-        border: 2px dashed #94a3b8;
-        text-align: center;
-        margin: 1rem 0;
-        transition: all 0.3s ease;
-    }
-    
-    .upload-area:hover {
-        border-color: #667eea;
-        background: linear-gradient(135deg, #f1f5f9 0%, #e2e8f0 100%);
-    }
-    
-    .chat-message-user {
-        background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-        color: white;
-        padding: 1rem 1.5rem;
-        border-radius: 20px 20px 5px 20px;
-        margin: 1rem 0;
-        margin-left: 2rem;
-        box-shadow: 0 2px 8px rgba(102, 126, 234, 0.3);
-    }
-    
-    .chat-message-assistant {
-        background: linear-gradient(135deg, #f8fafc 0%, #e2e8f0 100%);
-        color: #334155;
-        padding: 1rem 1.5rem;
-        border-radius: 20px 20px 20px 5px;
-        margin: 1rem 0;
-        margin-right: 2rem;
-        border: 1px solid #cbd5e1;
-        box-shadow: 0 2px 8px rgba(0, 0, 0, 0.05);
-    }
-    
-    .success-alert {
-        background: linear-gradient(135deg, #dcfce7 0%, #bbf7d0 100%);
-        border: 1px solid #86efac;
-        color: #15803d;
-        padding: 1rem;
-        border-radius: 10px;
-        margin: 1rem 0;
-        box-shadow: 0 2px 8px rgba(134, 239, 172, 0.3);
-    }
-    
-    .error-alert {
-        background: linear-gradient(135deg, #fef2f2 0%, #fecaca 100%);
-        border: 1px solid #f87171;
-        color: #dc2626;
-        padding: 1rem;
-        border-radius: 10px;
-        margin: 1rem 0;
-        box-shadow: 0 2px 8px rgba(248, 113, 113, 0.3);
-    }
-    
-    .info-card {
-        background: linear-gradient(135deg, #f0f9ff 0%, #e0f2fe 100%);
-        border: 1px solid #7dd3fc;
-        color: #0369a1;
-        padding: 1.5rem;
-        border-radius: 12px;
-        margin: 1rem 0;
-    }
-    
-    .stat-card {
-        background: white;
-        padding: 1.5rem;
-        border-radius: 12px;
-        border: 1px solid #e2e8f0;
-        text-align: center;
-        box-shadow: 0 2px 8px rgba(0, 0, 0, 0.05);
-    }
-    
-    .file-item {
-        background: white;
-        padding: 1rem;
-        border-radius: 8px;
-        border: 1px solid #e2e8f0;
-        margin: 0.5rem 0;
-        display: flex;
-        align-items: center;
-        box-shadow: 0 1px 3px rgba(0, 0, 0, 0.1);
-    }
-    
-    .sidebar-section {
-        background: #f8fafc;
-        padding: 1rem;
-        border-radius: 10px;
-        margin: 1rem 0;
-        border: 1px solid #e2e8f0;
-    }
-</style>
-""", unsafe_allow_html=True)
+# CSS personalizado para una interfaz moderna y limpia (ver core/styles.py)
+st.markdown(APP_STYLES, unsafe_allow_html=True)
+profile.mark("styles")
+
+def set_session_cookie(session_id: str):
+    """Guarda el identificador de sesión en una cookie del navegador.
+
+    En modo producción la cookie ya la fija el proxy (con `HttpOnly`); esto
+    cubre `python run.py` y `streamlit run`, donde no hay proxy.
+    """
+    max_age = int(config.CHAT_HISTORY_MAX_AGE_DAYS * 86400)
+    components.html(
+        f"""<script>
+        const secure = window.parent.location.protocol === "https:" ? "; Secure" : "";
+        window.parent.document.cookie = "{SESSION_COOKIE}={session_id}; Path=/; Max-Age={max_age}; SameSite=Lax" + secure;
+        </script>""",
+        height=0
+    )
 
 def initialize_session_state():
     """Inicializa el estado de la sesión"""
-    if "chat_history" not in st.session_state:
-        st.session_state.chat_history = []
-    if "uploaded_files_count" not in st.session_state:
-        st.session_state.uploaded_files_count = 0
-    if "total_documents" not in st.session_state:
-        st.session_state.total_documents = 0
-
-def send_file_to_webhook(file, webhook_url: str) -> tuple[bool, str]:
-    """Envía archivo al servicio de procesamiento"""
-    try:
-        files = {"file": (file.name, file.getvalue(), file.type)}
-        data = {
-            "filename": file.name,
-            "upload_time": datetime.now().isoformat(),
-            "file_size": len(file.getvalue())
-        }
-        
-        response = requests.post(
-            webhook_url,
-            files=files,
-            data=data,
-            timeout=config.WEBHOOK_TIMEOUT_SECONDS
-        )
-        
-        if response.status_code == 200:
-            return True, config.MESSAGES["upload_success"].format(filename=file.name)
-        else:
-            return False, config.MESSAGES["upload_error"].format(error=f"Error del servidor ({response.status_code})")
-            
-    except requests.exceptions.Timeout:
-        return False, config.MESSAGES["timeout_error"]
-    except requests.exceptions.ConnectionError:
-        return False, config.MESSAGES["connection_error"]
-    except Exception as e:
-        return False, config.MESSAGES["upload_error"].format(error="Error interno")
-
-def send_message_to_chat_webhook(message: str, webhook_url: str) -> tuple[bool, str]:
-    """Envía mensaje al asistente legal"""
-    try:
-        payload = {
-            "message": message,
-            "timestamp": datetime.now().isoformat(),
-            "session_id": st.session_state.get("session_id", "user_session")
-        }
-        
-        response = requests.post(
-            webhook_url,
-            json=payload,
-            headers={"Content-Type": "application/json"},
-            timeout=config.WEBHOOK_TIMEOUT_SECONDS
+    if "session_id" not in st.session_state:
+        # Identificador estable de la sesión del navegador: separa la memoria de
+        # conversación en N8N y decide a qué webhook de chat se enruta. Vive en
+        # una cookie aleatoria para recuperar el historial al recargar la página;
+        # nunca en la URL, donde cualquiera con el enlace leería la conversación.
+        session_id = st.context.cookies.get(SESSION_COOKIE)
+        if not is_session_id(session_id):
+            session_id = new_session_id()
+            set_session_cookie(session_id)
+        st.session_state.session_id = session_id
+    if "session" in st.query_params:
+        # Enlaces de versiones anteriores: el parámetro ya no se usa
+        del st.query_params["session"]
+    if "chat_history_total" not in st.session_state:
+        # La ventana reciente del historial la guarda `session_memory`; los
+        # mensajes anteriores quedan en el almacén
+        st.session_state.chat_history_total = get_chat_history_store().count(st.session_state.session_id)
+    if "upload_batch_ids" not in st.session_state:
+        st.session_state.upload_batch_ids = []
+    if "chat_visible_turns" not in st.session_state:
+        st.session_state.chat_visible_turns = config.CHAT_HISTORY_WINDOW_TURNS
+    if "follow_ups" not in st.session_state:
+        st.session_state.follow_ups = []
+    if "uploader_generation" not in st.session_state:
+        st.session_state.uploader_generation = 0
+    
+    # Actividad de la sesión: expulsa las que llevan tiempo inactivas
+    get_session_memory().touch(st.session_state.session_id, streamlit_session_id())
+
+def ask_legal_assistant(
+    message: str,
+    on_token: Optional[Callable[[str], None]] = None,
+    follow_up: bool = False
+) -> tuple[bool, str]:
+    """Responde una consulta usando las cachés de respuestas si están habilitadas.
+
+    Con `on_token` la consulta se hace en modo streaming; sin él, se usa la
+    respuesta completa del webhook. Con `follow_up` la consulta es una pregunta
+    de seguimiento sugerida: su texto es genérico y la respuesta depende de la
+    conversación, así que se usa la respuesta precargada de la sesión y no se
+    consultan ni se llenan las cachés compartidas.
+    """
+    library_version = get_library_version()
+    session_id = st.session_state.session_id
+    cache = get_response_cache() if config.CHAT_CACHE_ENABLED and not follow_up else None
+    cache_key = cache.make_key(message, library_version) if cache is not None else None
+    semantic_cache = get_semantic_cache() if config.CHAT_SEMANTIC_CACHE_ENABLED and not follow_up else None
+    
+    cached_response = cache.get(cache_key) if cache is not None else None
+    if cached_response is None and semantic_cache is not None:
+        cached_response = semantic_cache.get(message, library_version)
+    if follow_up and config.PREFETCH_ENABLED:
+        # Respuesta precargada (o en curso) de esta sesión
+        cached_response = get_prefetcher().take(
+            session_id, message, library_version, config.PREFETCH_CLICK_WAIT_SECONDS
         )
-        
-        if response.status_code == 200:
-            try:
-                response_data = response.json()
-                print(response_data)
-                return True, response_data.get("output", response.text)
-            except json.JSONDecodeError:
-                return True, response.text
-        else:
-            return False, config.MESSAGES["chat_error"]
-            
-    except requests.exceptions.Timeout:
-        return False, config.MESSAGES["timeout_error"]
-    except requests.exceptions.ConnectionError:
-        return False, config.MESSAGES["connection_error"]
-    except Exception as e:
-        return False, config.MESSAGES["chat_error"]
+    if cached_response is not None:
+        if on_token is not None:
+            on_token(cached_response)
+        return True, cached_response
+    
+    webhook_url = route_chat_webhook(session_id)
+    if on_token is not None:
+        success, response = stream_message_to_chat_webhook(message, webhook_url, on_token=on_token, session_id=session_id)
+    else:
+        success, response = send_message_to_chat_webhook(message, webhook_url, session_id=session_id)
+    
+    if success and response:
+        if cache is not None:
+            cache.put(cache_key, response)
+        if semantic_cache is not None:
+            semantic_cache.put(message, library_version, response)
+    
+    return success, response
+
+def prefetch_follow_ups(message: str) -> None:
+    """Propone preguntas de seguimiento y las precarga mientras se lee la respuesta"""
+    follow_ups = suggest_follow_ups(message, config.PREFETCH_FOLLOW_UPS)
+    st.session_state.follow_ups = follow_ups
+    session_id = st.session_state.session_id
+    get_prefetcher().schedule(session_id, message, follow_ups, route_chat_webhook(session_id), get_library_version())
+
+def ask_documents(
+    message: str,
+    documents: list[dict],
+    on_partial: Optional[Callable[[str, int, int], None]] = None
+) -> tuple[bool, str]:
+    """Hace la consulta sobre cada documento elegido en paralelo (ver `fanout`)"""
+    session_id = st.session_state.session_id
+    return fan_out_query(message, documents, route_chat_webhook(session_id), session_id=session_id, on_partial=on_partial)
 
 def render_document_management():
     """Renderiza la sección de gestión de documentos"""
@@ -232,12 +182,16 @@ def render_document_management():
     """)
     
     # Área de upload
+    # Cambiar la clave vacía el selector una vez que los archivos se liberaron
     uploaded_files = st.file_uploader(
         "⬇️ Arrastra tus documentos aquí o haz clic para seleccionar",
         type=config.ALLOWED_FILE_TYPES,
         accept_multiple_files=True,
-        help="Selecciona uno o varios documentos para agregar a tu biblioteca legal"
+        help="Selecciona uno o varios documentos para agregar a tu biblioteca legal",
+        key=f"document_uploader_{st.session_state.uploader_generation}"
     )
+    session_memory = get_session_memory()
+    session_memory.hold_uploads(st.session_state.session_id, uploaded_files or [])
     st.markdown('</div>', unsafe_allow_html=True)
     
     if uploaded_files:
@@ -245,7 +199,7 @@ def render_document_management():
         
         # Mostrar archivos seleccionados
         for file in uploaded_files:
-            file_size_kb = len(file.getvalue()) / 1024
+            file_size_kb = file.size / 1024
             st.markdown(f"""
             <div class="file-item">
                 <span style="margin-right: 1rem;">📄</span>
@@ -258,44 +212,192 @@ def render_document_management():
         
         st.markdown("---")
         
+        force_reupload = st.checkbox(
+            "🔁 Volver a enviar documentos que ya están en mi biblioteca",
+            value=False,
+            help="Por defecto los documentos idénticos a uno ya agregado se omiten"
+        )
+        
         # Botón para procesar archivos
         col1, col2, col3 = st.columns([1, 2, 1])
         with col2:
             if st.button("🚀 Agregar a mi Biblioteca Legal", type="primary", use_container_width=True):
-                progress_bar = st.progress(0)
-                status_text = st.empty()
-                success_count = 0
-                error_messages = []
-                
-                status_text.text(config.MESSAGES["uploading"])
-                
-                for i, file in enumerate(uploaded_files):
-                    progress_bar.progress((i + 1) / len(uploaded_files))
-                    
-                    success, message = send_file_to_webhook(file, config.UPLOAD_WEBHOOK_URL)
-                    
-                    if success:
-                        success_count += 1
-                        st.session_state.uploaded_files_count += 1
-                        st.session_state.total_documents += 1
-                    else:
-                        error_messages.append(f"📄 {file.name}: {message}")
-                    
-                    time.sleep(0.3)  # Pausa para mejor experiencia visual
+                new_files, duplicate_files = partition_new_files(uploaded_files, skip_duplicates=not force_reupload)
+                duplicate_messages = [
+                    config.MESSAGES["upload_duplicate"].format(filename=file.name) for file in duplicate_files
+                ]
                 
-                progress_bar.empty()
-                status_text.empty()
+                if config.UPLOAD_BACKGROUND_ENABLED:
+                    if new_files:
+                        register_queued_uploads(new_files)
+                        batch_id = get_upload_job_queue().enqueue(
+                            new_files,
+                            config.UPLOAD_WEBHOOK_URL,
+                            force=force_reupload,
+                            session_id=st.session_state.session_id
+                        )
+                        st.session_state.upload_batch_ids = (st.session_state.upload_batch_ids + [batch_id])[-5:]
+                        st.markdown(f'<div class="info-card">{config.MESSAGES["upload_queued"].format(count=len(new_files))}</div>', unsafe_allow_html=True)
+                else:
+                    upload_files_now(new_files)
                 
-                # Mostrar resultados
-                if success_count > 0:
-                    st.markdown(f'<div class="success-alert">🎉 ¡Perfecto! Se agregaron {success_count} documento(s) a tu biblioteca legal.</div>', unsafe_allow_html=True)
+                # Los archivos ya están en el spool o enviados: no hace falta tenerlos en memoria
+                session_memory.release_uploads(st.session_state.session_id, uploaded_files)
+                st.session_state.uploader_generation += 1
                 
-                if error_messages:
-                    for error in error_messages:
-                        st.markdown(f'<div class="error-alert">{error}</div>', unsafe_allow_html=True)
+                for duplicate_message in duplicate_messages:
+                    st.markdown(f'<div class="info-card">{duplicate_message}</div>', unsafe_allow_html=True)
+    
+    if st.session_state.upload_batch_ids:
+        render_upload_jobs_status()
     
     st.markdown('</div>', unsafe_allow_html=True)
 
+def upload_files_now(new_files: list[tuple[object, str]]):
+    """Envía los archivos en el hilo de la página mostrando el progreso"""
+    progress_bar = st.progress(0)
+    status_text = st.empty()
+    success_count = 0
+    error_messages = []
+    
+    status_text.text(config.MESSAGES["uploading"])
+    
+    def on_file_complete(completed, total, file, success, message):
+        progress_bar.progress(completed / total)
+        status_text.text(f"{config.MESSAGES['uploading']} ({completed}/{total}) • {file.name}")
+    
+    results = upload_files(
+        [file for file, _ in new_files],
+        config.UPLOAD_WEBHOOK_URL,
+        on_complete=on_file_complete,
+        session_id=st.session_state.session_id
+    )
+    
+    for (file, success, message), (_, digest) in zip(results, new_files):
+        if success:
+            register_successful_upload(digest, file.name, file.size, file.type)
+            success_count += 1
+        else:
+            register_failed_upload(digest, file.name, file.size, file.type, message)
+            error_messages.append(f"📄 {file.name}: {message}")
+    
+    progress_bar.empty()
+    status_text.empty()
+    
+    # Mostrar resultados
+    if success_count > 0:
+        st.markdown(f'<div class="success-alert">🎉 ¡Perfecto! Se agregaron {success_count} documento(s) a tu biblioteca legal.</div>', unsafe_allow_html=True)
+    
+    if error_messages:
+        for error in error_messages:
+            st.markdown(f'<div class="error-alert">{error}</div>', unsafe_allow_html=True)
+
+JOB_STATUS_LABELS = {
+    JOB_QUEUED: "⏳ En cola",
+    JOB_RUNNING: "📤 Enviando",
+    JOB_DONE: "✅ Agregado",
+    JOB_FAILED: "❌ Error",
+    JOB_DUPLICATE: "♻️ Ya estaba en tu biblioteca",
+}
+
+def render_upload_jobs(jobs: list[dict]):
+    """Muestra el estado de los documentos encolados por esta sesión"""
+    finished = sum(1 for job in jobs if job["status"] not in PENDING_STATUSES)
+    st.markdown(f"**📋 Estado de tus cargas: {finished}/{len(jobs)} procesados**")
+    st.progress(finished / len(jobs) if jobs else 1.0)
+    
+    for job in jobs:
+        detail = job["message"] if job["status"] == JOB_FAILED else ""
+        st.markdown(f"""
+            <div class="file-item">
+                <span style="margin-right: 1rem;">📄</span>
+                <div style="flex-grow: 1;">
+                    <strong>{job["filename"]}</strong><br>
+                    <small style="color: #64748b;">{JOB_STATUS_LABELS.get(job["status"], job["status"])} {detail}</small>
+                </div>
+            </div>
+            """, unsafe_allow_html=True)
+
+@st.fragment(run_every=config.UPLOAD_STATUS_REFRESH_SECONDS)
+def poll_upload_jobs():
+    """Refresca periódicamente el estado de las cargas mientras haya pendientes"""
+    jobs = get_upload_job_queue().jobs_for_batches(st.session_state.upload_batch_ids)
+    render_upload_jobs(jobs)
+    if not any(job["status"] in PENDING_STATUSES for job in jobs):
+        # Rerun completo para dejar de consultar y actualizar la barra lateral
+        st.rerun()
+
+def render_upload_jobs_status():
+    """Renderiza el panel de cargas, consultándolo solo si hay trabajos pendientes"""
+    jobs = get_upload_job_queue().jobs_for_batches(st.session_state.upload_batch_ids)
+    if any(job["status"] in PENDING_STATUSES for job in jobs):
+        poll_upload_jobs()
+    else:
+        render_upload_jobs(jobs)
+
+def append_chat_message(role: str, message: str, timestamp: str):
+    """Guarda un mensaje en el almacén y en la ventana acotada de la sesión"""
+    get_chat_history_store().append(st.session_state.session_id, role, message, timestamp)
+    get_session_memory().append_message(st.session_state.session_id, (role, message, timestamp))
+    st.session_state.chat_history_total += 1
+
+def load_earlier_chat_turns():
+    """Amplía la ventana visible del historial de chat"""
+    st.session_state.chat_visible_turns += config.CHAT_HISTORY_WINDOW_TURNS
+
+def choose_follow_up(follow_up: str):
+    """Envía una pregunta de seguimiento sugerida como si se hubiera escrito"""
+    st.session_state.follow_up_choice = follow_up
+
+def render_follow_ups():
+    """Botones con las preguntas de seguimiento sugeridas para la última respuesta"""
+    follow_ups = st.session_state.follow_ups
+    if not follow_ups:
+        return
+    columns = st.columns(len(follow_ups))
+    for index, (column, follow_up) in enumerate(zip(columns, follow_ups)):
+        with column:
+            st.button(
+                f"💡 {follow_up}",
+                key=f"follow_up_{index}",
+                on_click=choose_follow_up,
+                args=(follow_up,),
+                use_container_width=True
+            )
+
+def render_chat_history():
+    """Renderiza solo la ventana más reciente del historial de chat.
+
+    Los turnos que no caben en la ventana de la sesión se leen del almacén en
+    cada rerun sin guardarlos en memoria.
+    """
+    history = get_session_memory().chat_window(st.session_state.session_id)
+    if not history:
+        return
+    
+    # Cada turno es una consulta y su respuesta
+    visible_messages = st.session_state.chat_visible_turns * 2
+    if visible_messages <= len(history):
+        messages = history[-visible_messages:]
+    else:
+        older = get_chat_history_store().recent(
+            st.session_state.session_id, visible_messages - len(history), offset=len(history)
+        )
+        messages = older + history
+    hidden_count = max(0, st.session_state.chat_history_total - len(messages))
+    
+    if hidden_count:
+        st.button(
+            f"⬆️ Cargar mensajes anteriores ({hidden_count})",
+            on_click=load_earlier_chat_turns,
+            use_container_width=True
+        )
+    
+    st.markdown(
+        "".join(cached_chat_message_html(role, message, timestamp) for role, message, timestamp in messages),
+        unsafe_allow_html=True
+    )
+
 def render_legal_chat():
     """Renderiza la sección de chat legal"""
     
@@ -306,22 +408,9 @@ def render_legal_chat():
     chat_container = st.container()
     
     with chat_container:
-        if st.session_state.chat_history:
-            for role, message, timestamp in st.session_state.chat_history:
-                if role == "user":
-                    st.markdown(f'''
-                    <div class="chat-message-user">
-                        <strong>🧑‍💼 Tú • {timestamp}</strong><br><br>
-                        {message}
-                    </div>
-                    ''', unsafe_allow_html=True)
-                else:
-                    st.markdown(f'''
-                    <div class="chat-message-assistant">
-                        <strong>⚖️ Asistente Legal • {timestamp}</strong><br><br>
-                        {message}
-                    </div>
-                    ''', unsafe_allow_html=True)
+        render_chat_history()
+        if config.PREFETCH_ENABLED:
+            render_follow_ups()
     
     # Formulario de chat
     st.markdown("---")
@@ -334,6 +423,19 @@ def render_legal_chat():
             help="Haz preguntas específicas sobre tus documentos legales"
         )
         
+        selected_documents = []
+        if config.CHAT_FANOUT_ENABLED:
+            library_documents = get_document_index().recent(config.CHAT_FANOUT_DOCUMENT_OPTIONS)
+            if len(library_documents) > 1:
+                selected_documents = st.multiselect(
+                    "📑 Comparar documento por documento (opcional)",
+                    library_documents,
+                    format_func=lambda document: document["filename"],
+                    max_selections=config.CHAT_FANOUT_MAX_DOCUMENTS,
+                    placeholder="Toda la biblioteca",
+                    help="La consulta se hace sobre cada documento elegido en paralelo y las respuestas se combinan con sus fuentes"
+                )
+        
         col1, col2, col3 = st.columns([2, 2, 1])
         
         with col1:
@@ -345,8 +447,16 @@ def render_legal_chat():
         with col3:
             st.markdown("")  # Espaciado
     
+    follow_up = st.session_state.pop("follow_up_choice", None)
+    if follow_up:
+        user_message, selected_documents, submit_button = follow_up, [], True
+    
     if clear_button:
-        st.session_state.chat_history = []
+        get_chat_history_store().clear(st.session_state.session_id)
+        get_session_memory().clear_messages(st.session_state.session_id)
+        st.session_state.follow_ups = []
+        st.session_state.chat_history_total = 0
+        st.session_state.chat_visible_turns = config.CHAT_HISTORY_WINDOW_TURNS
         st.rerun()
     
     if submit_button and user_message.strip():
@@ -356,25 +466,166 @@ def render_legal_chat():
         
         timestamp = datetime.now().strftime("%H:%M")
         
+        if config.PREFETCH_ENABLED:
+            # Las sugerencias anteriores ya no aplican a la nueva consulta
+            st.session_state.follow_ups = []
+            if not follow_up:
+                get_prefetcher().cancel(st.session_state.session_id)
+        
         # Agregar mensaje del usuario
-        st.session_state.chat_history.append(("user", user_message, timestamp))
+        append_chat_message("user", user_message, timestamp)
         
         # Procesar consulta
-        with st.spinner(config.MESSAGES["processing"]):
-            success, response = send_message_to_chat_webhook(user_message, config.CHAT_WEBHOOK_URL)
+        if selected_documents:
+            with chat_container:
+                st.markdown(chat_message_html("user", user_message, timestamp), unsafe_allow_html=True)
+                answer_placeholder = st.empty()
+            answer_placeholder.markdown(chat_message_html("assistant", config.MESSAGES["processing"], timestamp), unsafe_allow_html=True)
+            
+            def on_partial(partial_answer: str, completed: int, total: int):
+                answer_placeholder.markdown(
+                    chat_message_html("assistant", f"{partial_answer}<br><small>⏳ {completed}/{total} documentos</small>", timestamp),
+                    unsafe_allow_html=True
+                )
+            
+            success, response = ask_documents(user_message, selected_documents, on_partial=on_partial)
+            append_chat_message("assistant", response, timestamp)
+        elif config.CHAT_STREAMING_ENABLED:
+            with chat_container:
+                st.markdown(chat_message_html("user", user_message, timestamp), unsafe_allow_html=True)
+                answer_placeholder = st.empty()
+            answer_placeholder.markdown(chat_message_html("assistant", config.MESSAGES["processing"], timestamp), unsafe_allow_html=True)
+            last_render = 0.0
             
-            if success:
-                st.session_state.chat_history.append(("assistant", response, timestamp))
-            else:
-                st.session_state.chat_history.append(("assistant", response, timestamp))
+            def on_token(partial_answer: str):
+                nonlocal last_render
+                now = time.monotonic()
+                if now - last_render < config.CHAT_STREAM_RENDER_INTERVAL_SECONDS:
+                    return
+                last_render = now
+                answer_placeholder.markdown(chat_message_html("assistant", partial_answer + " ▌", timestamp), unsafe_allow_html=True)
+            
+            success, response = ask_legal_assistant(user_message, on_token=on_token, follow_up=bool(follow_up))
+            append_chat_message("assistant", response, timestamp)
+        else:
+            with st.spinner(config.MESSAGES["processing"]):
+                success, response = ask_legal_assistant(user_message, follow_up=bool(follow_up))
+                
+                if success:
+                    append_chat_message("assistant", response, timestamp)
+                else:
+                    append_chat_message("assistant", response, timestamp)
+        
+        if config.PREFETCH_ENABLED and success and not selected_documents:
+            prefetch_follow_ups(user_message)
         
         st.rerun()
     
     st.markdown('</div>', unsafe_allow_html=True)
 
-def main():
-    """Función principal de la aplicación"""
-    initialize_session_state()
+def format_latency(seconds: Optional[float]) -> str:
+    if seconds is None:
+        return "—"
+    return f"{seconds * 1000:.0f} ms" if seconds < 1 else f"{seconds:.1f} s"
+
+def format_bytes(size: int) -> str:
+    if size < 1024:
+        return f"{size} B"
+    if size < 1024 * 1024:
+        return f"{size / 1024:.1f} KB"
+    return f"{size / (1024 * 1024):.1f} MB"
+
+def render_system_status():
+    """Muestra el estado de conexión calculado a partir de las llamadas recientes"""
+    st.markdown("## ⚡ Estado del Sistema")
+    
+    summaries = {webhook: metrics_registry.summary(webhook) for webhook in ("chat", "upload")}
+    recent = [summary for summary in summaries.values() if summary["recent"]]
+    
+    if open_circuits("chat") or open_circuits("upload"):
+        st.markdown("🔴 **Asistente no disponible, reintentando en unos segundos**")
+    elif not recent:
+        st.markdown("⚪ **Esperando la primera consulta**")
+    else:
+        error_rate = max(summary["error_rate"] for summary in recent)
+        if error_rate >= 0.5:
+            st.markdown("🔴 **Problemas de conexión con el asistente**")
+        elif error_rate > 0.1:
+            st.markdown("🟡 **Conectado con algunos errores**")
+        else:
+            st.markdown("🟢 **Conectado y funcionando**")
+    
+    for webhook, label in (("chat", "💬 Consultas"), ("upload", "📤 Cargas")):
+        summary = summaries[webhook]
+        if summary["recent"]:
+            st.caption(
+                f"{label}: p50 {format_latency(summary['p50'])} • p95 {format_latency(summary['p95'])} • "
+                f"errores {summary['error_rate']:.0%} ({summary['calls']} llamadas)"
+            )
+    
+    if config.SCHEDULER_ENABLED:
+        queued = sum(lane["queued"] for lane in get_scheduler().snapshot().values())
+        if queued:
+            st.caption(f"⏳ {queued} solicitud(es) esperando turno")
+    
+    if config.PREFETCH_ENABLED:
+        prefetch_stats = get_prefetcher().stats()
+        if prefetch_stats["issued"]:
+            st.caption(
+                f"💡 Seguimientos precargados: {prefetch_stats['served']} usados de {prefetch_stats['issued']} "
+                f"• {prefetch_stats['skipped']} omitidos por presupuesto o carga"
+            )
+
+LIBRARY_STATUS_ICONS = {
+    DOCUMENT_INGESTED: "✅",
+    DOCUMENT_QUEUED: "⏳",
+    DOCUMENT_FAILED: "❌",
+}
+
+def render_library_search():
+    """Buscador por nombre de los documentos de la biblioteca"""
+    query = st.text_input(
+        "🔎 Buscar en mi biblioteca",
+        placeholder="Ej.: ley 1258, arrendamiento",
+        key="library_search"
+    )
+    if not query.strip():
+        return
+    
+    results = get_document_index().search(query, limit=config.LIBRARY_SEARCH_LIMIT)
+    if not results:
+        st.caption("No hay documentos con ese nombre en tu biblioteca.")
+        return
+    for document in results:
+        uploaded_at = document["uploaded_at"] or document["updated_at"]
+        st.caption(
+            f"{LIBRARY_STATUS_ICONS.get(document['status'], '📄')} **{document['filename']}** • "
+            f"{document['size'] / 1024:.0f} KB • {datetime.fromtimestamp(uploaded_at):%d/%m/%Y}"
+        )
+
+def render_profile():
+    """Muestra los tiempos de esta ejecución y la mediana de las anteriores"""
+    summary = profile_summary()
+    with st.sidebar.expander("⏱️ Perfil de ejecución", expanded=False):
+        rows = [
+            {
+                "Sección": name,
+                "Actual (ms)": round(seconds * 1000, 1),
+                "p50 (ms)": round(summary[name]["p50"] * 1000, 1) if name in summary else None,
+            }
+            for name, seconds in profile.sections
+        ]
+        st.dataframe(rows, hide_index=True, use_container_width=True)
+        if "total" in summary:
+            st.caption(
+                f"Rerun p50 {format_latency(summary['total']['p50'])} • "
+                f"p95 {format_latency(summary['total']['p95'])} ({summary['total']['count']} reruns)"
+            )
+
+def render_app():
+    """Arma la página completa midiendo cada sección"""
+    with profile.section("session"):
+        initialize_session_state()
     
     # Header principal
     st.markdown(f"""
@@ -385,7 +636,7 @@ def main():
     """, unsafe_allow_html=True)
     
     # Sidebar con información y navegación
-    with st.sidebar:
+    with profile.section("sidebar"), st.sidebar:
         st.markdown("## 🧭 Secciones")
         page = st.radio(
             "",
@@ -398,10 +649,12 @@ def main():
         
         col1, col2 = st.columns(2)
         with col1:
-            st.metric("📄 Documentos", st.session_state.total_documents)
+            st.metric("📄 Documentos", get_document_index().count())
         
         with col2:
-            st.metric("💬 Consultas", len(st.session_state.chat_history))
+            st.metric("💬 Consultas", st.session_state.chat_history_total)
+        
+        render_library_search()
         
         
         # Guía rápida
@@ -418,17 +671,35 @@ def main():
         st.markdown('</div>', unsafe_allow_html=True)
         
         # Estado del sistema
-        st.markdown("## ⚡ Estado del Sistema")
-        st.markdown("🟢 **Conectado y funcionando**")
+        render_system_status()
         st.markdown("🔒 **Tus datos están seguros**")
         st.markdown("🤖 **Asistente listo para ayudar**")
+        if config.CHAT_CACHE_ENABLED:
+            cache_stats = get_response_cache().stats()
+            st.caption(
+                f"🗃️ Caché de respuestas: {cache_stats['hits']} aciertos • "
+                f"{cache_stats['misses']} fallos • {cache_stats['entries']} guardadas"
+            )
+        if config.CHAT_SEMANTIC_CACHE_ENABLED:
+            semantic_stats = get_semantic_cache().stats()
+            st.caption(
+                f"🧠 Caché semántica: {semantic_stats['hits']} aciertos • "
+                f"{semantic_stats['misses']} fallos • {semantic_stats['entries']} guardadas"
+            )
+        session_memory = get_session_memory()
+        memory_stats = session_memory.stats()
+        st.caption(
+            f"💾 Memoria de esta sesión: {format_bytes(session_memory.usage(st.session_state.session_id))} • "
+            f"total {format_bytes(memory_stats['bytes'])} en {memory_stats['sessions']} sesión(es)"
+        )
         st.markdown('</div>', unsafe_allow_html=True)
     
     # Contenido principal
-    if page == "📚 Mis Documentos":
-        render_document_management()
-    elif page == "💬 Consultas Legales":
-        render_legal_chat()
+    with profile.section("content"):
+        if page == "📚 Mis Documentos":
+            render_document_management()
+        elif page == "💬 Consultas Legales":
+            render_legal_chat()
     
     # Footer
     st.markdown("---")
@@ -438,6 +709,17 @@ def main():
         🔒 Información segura y privada
     </div>
     """, unsafe_allow_html=True)
+    
+    if config.PROFILE_ENABLED:
+        render_profile()
+
+def main():
+    """Función principal de la aplicación"""
+    try:
+        render_app()
+    finally:
+        # También al cortar la ejecución con st.rerun() o st.stop()
+        finish_rerun_profile(profile)
 
 if __name__ == "__main__":
     main()
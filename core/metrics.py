@@ -0,0 +1,282 @@
+"""
+Métricas de latencia y volumen de las llamadas a los webhooks.
+
+Registra por webhook la latencia (histograma y ventana de muestras recientes
+para percentiles), bytes enviados y recibidos, códigos de estado y errores de
+timeout o conexión. Las métricas se exponen en formato de texto de Prometheus
+mediante un endpoint HTTP local opcional y/o un archivo que se actualiza
+periódicamente.
+"""
+
+import math
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Iterator, Optional
+
+import requests
+
+from config import get_config
+
+config = get_config()
+
+METRIC_PREFIX = "legal_assistant"
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0)
+
+OUTCOME_SUCCESS = "success"
+OUTCOME_HTTP_ERROR = "http_error"
+OUTCOME_TIMEOUT = "timeout"
+OUTCOME_CONNECTION_ERROR = "connection_error"
+OUTCOME_ERROR = "error"
+
+class Histogram:
+    """Histograma acumulativo con los límites de `LATENCY_BUCKETS`"""
+
+    def __init__(self, buckets: tuple = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.total += 1
+        self.sum += value
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+
+class CallRecord:
+    """Datos de una llamada que el código instrumentado completa durante la petición"""
+
+    def __init__(self):
+        self.status_code: Optional[int] = None
+        self.request_bytes = 0
+        self.response_bytes = 0
+        self.first_byte_seconds: Optional[float] = None
+        self.outcome = OUTCOME_SUCCESS
+        self.started_at = time.perf_counter()
+
+    def mark_first_byte(self) -> None:
+        """Registra el tiempo hasta el primer fragmento de la respuesta"""
+        if self.first_byte_seconds is None:
+            self.first_byte_seconds = time.perf_counter() - self.started_at
+
+class MetricsRegistry:
+    """Almacén de métricas del proceso, seguro entre hilos"""
+
+    def __init__(self, window_size: int):
+        self._lock = threading.Lock()
+        self.window_size = window_size
+        self.started_at = time.time()
+        self.calls: dict[tuple[str, str], int] = defaultdict(int)
+        self.status_codes: dict[tuple[str, int], int] = defaultdict(int)
+        self.request_bytes: dict[str, int] = defaultdict(int)
+        self.response_bytes: dict[str, int] = defaultdict(int)
+        self.latency: dict[str, Histogram] = defaultdict(Histogram)
+        self.first_byte: dict[str, Histogram] = defaultdict(Histogram)
+        self.recent: dict[str, deque] = defaultdict(lambda: deque(maxlen=self.window_size))
+        self.gauges: dict[str, float] = {}
+        self.wait_time: dict[str, Histogram] = defaultdict(Histogram)
+        self._listeners: list = []
+
+    def record(self, webhook: str, latency_seconds: float, call: CallRecord) -> None:
+        with self._lock:
+            self.calls[(webhook, call.outcome)] += 1
+            if call.status_code is not None:
+                self.status_codes[(webhook, call.status_code)] += 1
+            self.request_bytes[webhook] += call.request_bytes
+            self.response_bytes[webhook] += call.response_bytes
+            self.latency[webhook].observe(latency_seconds)
+            if call.first_byte_seconds is not None:
+                self.first_byte[webhook].observe(call.first_byte_seconds)
+            self.recent[webhook].append((latency_seconds, call.outcome, time.monotonic()))
+        for listener in self._listeners:
+            listener(webhook, latency_seconds, call)
+
+    def add_listener(self, listener) -> None:
+        """Registra `listener(webhook, latencia, call)`, invocado tras cada llamada"""
+        self._listeners.append(listener)
+
+    def record_wait(self, webhook: str, wait_seconds: float) -> None:
+        """Registra el tiempo que una llamada esperó turno en el planificador"""
+        with self._lock:
+            self.wait_time[webhook].observe(wait_seconds)
+
+    def set_gauge(self, name: str, value: float) -> None:
+        """Publica un valor instantáneo (por ejemplo, el tamaño de una cola)"""
+        with self._lock:
+            self.gauges[name] = value
+
+    def recent_latencies(
+        self,
+        webhook: str,
+        outcomes: Optional[tuple[str, ...]] = None,
+        max_age_seconds: Optional[float] = None
+    ) -> list[float]:
+        """Latencias de la ventana reciente, ordenadas de menor a mayor.
+
+        `outcomes` limita las muestras a esos resultados y `max_age_seconds`
+        descarta las registradas hace más de ese tiempo.
+        """
+        with self._lock:
+            samples = list(self.recent.get(webhook, ()))
+        oldest = time.monotonic() - max_age_seconds if max_age_seconds is not None else None
+        return sorted(
+            latency for latency, outcome, recorded_at in samples
+            if (outcomes is None or outcome in outcomes) and (oldest is None or recorded_at >= oldest)
+        )
+
+    def summary(self, webhook: str) -> dict:
+        """Resumen de las llamadas recientes: cantidad, errores y percentiles"""
+        with self._lock:
+            samples = list(self.recent.get(webhook, ()))
+            total_calls = sum(count for (name, _), count in self.calls.items() if name == webhook)
+        if not samples:
+            return {"calls": total_calls, "recent": 0, "error_rate": 0.0, "p50": None, "p95": None, "p99": None}
+
+        latencies = sorted(latency for latency, _, _ in samples)
+        failures = sum(1 for _, outcome, _ in samples if outcome != OUTCOME_SUCCESS)
+        return {
+            "calls": total_calls,
+            "recent": len(samples),
+            "error_rate": failures / len(samples),
+            "p50": percentile(latencies, 50),
+            "p95": percentile(latencies, 95),
+            "p99": percentile(latencies, 99),
+        }
+
+    def render_prometheus(self) -> str:
+        """Serializa las métricas en el formato de texto de Prometheus"""
+        lines = []
+        with self._lock:
+            lines.append(f"# TYPE {METRIC_PREFIX}_webhook_requests_total counter")
+            for (webhook, outcome), count in sorted(self.calls.items()):
+                lines.append(f'{METRIC_PREFIX}_webhook_requests_total{{webhook="{webhook}",outcome="{outcome}"}} {count}')
+
+            lines.append(f"# TYPE {METRIC_PREFIX}_webhook_responses_total counter")
+            for (webhook, status), count in sorted(self.status_codes.items()):
+                lines.append(f'{METRIC_PREFIX}_webhook_responses_total{{webhook="{webhook}",status="{status}"}} {count}')
+
+            for metric, values in (("request_bytes_total", self.request_bytes), ("response_bytes_total", self.response_bytes)):
+                lines.append(f"# TYPE {METRIC_PREFIX}_webhook_{metric} counter")
+                for webhook, value in sorted(values.items()):
+                    lines.append(f'{METRIC_PREFIX}_webhook_{metric}{{webhook="{webhook}"}} {value}')
+
+            for metric, histograms in (
+                ("webhook_latency_seconds", self.latency),
+                ("webhook_first_byte_seconds", self.first_byte),
+                ("scheduler_wait_seconds", self.wait_time),
+            ):
+                name = f"{METRIC_PREFIX}_{metric}"
+                lines.append(f"# TYPE {name} histogram")
+                for webhook, histogram in sorted(histograms.items()):
+                    for bound, count in zip(histogram.buckets, histogram.counts):
+                        lines.append(f'{name}_bucket{{webhook="{webhook}",le="{bound}"}} {count}')
+                    lines.append(f'{name}_bucket{{webhook="{webhook}",le="+Inf"}} {histogram.total}')
+                    lines.append(f'{name}_sum{{webhook="{webhook}"}} {histogram.sum:.6f}')
+                    lines.append(f'{name}_count{{webhook="{webhook}"}} {histogram.total}')
+
+            for name, value in sorted(self.gauges.items()):
+                lines.append(f"# TYPE {METRIC_PREFIX}_{name} gauge")
+                lines.append(f"{METRIC_PREFIX}_{name} {value}")
+
+        return "\n".join(lines) + "\n"
+
+def percentile(sorted_values: list[float], pct: float) -> Optional[float]:
+    """Percentil por rango más cercano de una lista ya ordenada"""
+    if not sorted_values:
+        return None
+    rank = max(0, min(len(sorted_values) - 1, math.ceil(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[rank]
+
+registry = MetricsRegistry(window_size=config.METRICS_WINDOW_SIZE)
+
+_last_dump = 0.0
+_dump_lock = threading.Lock()
+
+def dump_metrics(path: str) -> None:
+    """Escribe las métricas en un archivo de forma atómica"""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as metrics_file:
+        metrics_file.write(registry.render_prometheus())
+    os.replace(temp_path, path)
+
+def _maybe_dump() -> None:
+    global _last_dump
+    if not config.METRICS_FILE_PATH:
+        return
+    now = time.monotonic()
+    if now - _last_dump < config.METRICS_DUMP_INTERVAL_SECONDS or not _dump_lock.acquire(blocking=False):
+        return
+    try:
+        _last_dump = now
+        dump_metrics(config.METRICS_FILE_PATH)
+    except OSError:
+        pass
+    finally:
+        _dump_lock.release()
+
+@contextmanager
+def track_call(webhook: str) -> Iterator[CallRecord]:
+    """Mide una llamada a un webhook y clasifica su resultado.
+
+    Las excepciones se registran y se vuelven a lanzar para que el código que
+    llama mantenga su manejo de errores.
+    """
+    call = CallRecord()
+    try:
+        yield call
+        if call.status_code is not None and call.status_code != 200:
+            call.outcome = OUTCOME_HTTP_ERROR
+    except requests.exceptions.Timeout:
+        call.outcome = OUTCOME_TIMEOUT
+        raise
+    except requests.exceptions.ConnectionError:
+        call.outcome = OUTCOME_CONNECTION_ERROR
+        raise
+    except Exception:
+        call.outcome = OUTCOME_ERROR
+        raise
+    finally:
+        registry.record(webhook, time.perf_counter() - call.started_at, call)
+        _maybe_dump()
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.rstrip("/") not in ("", "/metrics"):
+            self.send_error(404)
+            return
+        body = registry.render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+_server_started = False
+_server_lock = threading.Lock()
+
+def start_metrics_server() -> None:
+    """Inicia el endpoint /metrics local si `METRICS_PORT` está configurado"""
+    global _server_started
+    if not config.METRICS_PORT or _server_started:
+        return
+    with _server_lock:
+        if _server_started:
+            return
+        _server_started = True
+        try:
+            server = ThreadingHTTPServer((config.METRICS_HOST, config.METRICS_PORT), _MetricsHandler)
+        except OSError:
+            # Otro proceso ya expone las métricas en ese puerto
+            return
+        threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
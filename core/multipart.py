@@ -0,0 +1,90 @@
+"""
+Cuerpo multipart/form-data que se envía por partes sin copiar los archivos.
+
+`requests` arma el cuerpo multipart completo en memoria (una copia adicional
+del documento). `MultipartStream` en cambio expone un objeto tipo archivo que
+lee directamente de una vista (`memoryview`) del buffer original, de modo que
+solo existe en memoria el bloque que se está enviando en cada momento.
+"""
+
+import io
+import uuid
+
+from urllib3.fields import format_multipart_header_param
+
+class MultipartStream(io.RawIOBase):
+    """Cuerpo multipart de solo lectura con campos de texto y uno o más archivos.
+
+    `files` es una lista de tuplas `(campo, nombre_archivo, content_type, buffer)`.
+    """
+
+    def __init__(self, fields: dict, files: list[tuple[str, str, str, memoryview]]):
+        super().__init__()
+        self.boundary = uuid.uuid4().hex
+        self.content_type = f"multipart/form-data; boundary={self.boundary}"
+
+        head = io.BytesIO()
+        for name, value in fields.items():
+            head.write(f"--{self.boundary}\r\n".encode())
+            head.write(f"Content-Disposition: form-data; {format_multipart_header_param('name', name)}\r\n\r\n".encode())
+            head.write(f"{value}\r\n".encode())
+
+        self._segments = []
+        for index, (file_field, filename, content_type, buffer) in enumerate(files):
+            if index:
+                head.write(b"\r\n")
+            head.write(f"--{self.boundary}\r\n".encode())
+            head.write(
+                (
+                    f"Content-Disposition: form-data; {format_multipart_header_param('name', file_field)}; "
+                    f"{format_multipart_header_param('filename', filename)}\r\n"
+                    f"Content-Type: {content_type or 'application/octet-stream'}\r\n\r\n"
+                ).encode()
+            )
+            self._segments += [memoryview(head.getvalue()), buffer.cast("B")]
+            head = io.BytesIO()
+        head.write(f"\r\n--{self.boundary}--\r\n".encode())
+        self._segments.append(memoryview(head.getvalue()))
+
+        self._length = sum(segment.nbytes for segment in self._segments)
+        self._position = 0
+
+    def __len__(self) -> int:
+        return self._length
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._position
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            offset += self._position
+        elif whence == io.SEEK_END:
+            offset += self._length
+        self._position = max(0, min(offset, self._length))
+        return self._position
+
+    def read(self, size: int = -1) -> bytes:
+        if size is None or size < 0:
+            size = self._length - self._position
+        chunks = []
+        remaining = min(size, self._length - self._position)
+        segment_start = 0
+
+        for segment in self._segments:
+            segment_end = segment_start + segment.nbytes
+            if remaining and self._position < segment_end:
+                start = self._position - segment_start
+                end = min(segment.nbytes, start + remaining)
+                chunks.append(segment[start:end].tobytes())
+                read_bytes = end - start
+                self._position += read_bytes
+                remaining -= read_bytes
+            segment_start = segment_end
+
+        return b"".join(chunks)
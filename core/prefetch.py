@@ -0,0 +1,200 @@
+"""
+Precarga especulativa de preguntas de seguimiento.
+
+Mientras el abogado lee una respuesta la conexión con N8N queda ociosa. Con
+`PREFETCH_ENABLED=true`, después de cada respuesta se proponen algunas
+preguntas de seguimiento (plantillas según el tema de la consulta) y se piden
+en segundo plano. Si el usuario elige una, la respuesta sale del almacén sin
+esperar al asistente.
+
+Para no quitarle capacidad a las consultas reales:
+- Las llamadas pasan por el planificador como "prefetch", con la menor
+  prioridad, sin acceso a los cupos reservados del chat y descartándose si
+  esperan más de `SCHEDULER_PREFETCH_MAX_WAIT_SECONDS`.
+- No se precarga nada si hay consultas reales esperando turno.
+- Cada sesión tiene un presupuesto de `PREFETCH_SESSION_BUDGET` consultas por
+  ventana de `PREFETCH_BUDGET_WINDOW_SECONDS`.
+
+Las consultas especulativas se envían con una sesión aparte
+(`<session_id>-prefetch`) y con la pregunta original incluida en el texto,
+para no mezclarse con la memoria de conversación de la sesión real.
+
+Con `SHARED_STORE_ENABLED=true` las respuestas precargadas se guardan en el
+almacén compartido (`shared_store`), así que sobreviven al reinicio del
+proceso que las pidió y no se vuelven a pedir desde otro. Las precargas en
+curso y los presupuestos por sesión siguen siendo de cada proceso.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Optional
+
+from chat import send_message_to_chat_webhook
+from config import get_config
+from response_cache import ResponseCache, SharedResponseCache, normalize_message
+from scheduler import TokenBucket, get_scheduler
+
+config = get_config()
+
+# Preguntas de seguimiento por tema: (palabras clave, preguntas)
+FOLLOW_UP_TOPICS: list[tuple[tuple[str, ...], tuple[str, ...]]] = [
+    (
+        ("sociedad", "sas", "empresa", "constituir", "registro mercantil", "camara de comercio"),
+        ("¿Qué documentos necesito para ese trámite?", "¿Cuánto cuesta y cuánto tarda?"),
+    ),
+    (
+        ("contrato", "arrendamiento", "clausula", "arriendo", "compraventa"),
+        ("¿Qué pasa si una de las partes incumple?", "¿Cómo se puede terminar de forma anticipada?"),
+    ),
+    (
+        ("plazo", "termino", "prescripcion", "caducidad", "vencimiento"),
+        ("¿Desde cuándo se empieza a contar ese plazo?", "¿Se puede interrumpir o suspender?"),
+    ),
+    (
+        ("despido", "laboral", "trabajador", "empleador", "liquidacion", "salario"),
+        ("¿Qué indemnización corresponde?", "¿Qué pruebas debo conservar?"),
+    ),
+    (
+        ("demanda", "proceso", "tutela", "recurso", "juez", "apelacion"),
+        ("¿Cuáles son los pasos del procedimiento?", "¿Ante qué autoridad se presenta?"),
+    ),
+]
+DEFAULT_FOLLOW_UPS = ("¿Puedes darme un ejemplo práctico?", "¿Qué riesgos debo tener en cuenta?")
+
+def suggest_follow_ups(question: str, limit: int) -> list[str]:
+    """Preguntas de seguimiento probables para una consulta"""
+    normalized = normalize_message(question)
+    suggestions: list[str] = []
+    for keywords, follow_ups in FOLLOW_UP_TOPICS:
+        if any(keyword in normalized for keyword in keywords):
+            suggestions.extend(follow_ups)
+    suggestions.extend(DEFAULT_FOLLOW_UPS)
+    return list(dict.fromkeys(suggestions))[:max(0, limit)]
+
+def follow_up_prompt(question: str, follow_up: str) -> str:
+    """Texto autocontenido de una pregunta de seguimiento"""
+    return f'En relación con esta consulta: "{question}". {follow_up}'
+
+class SharedPrefetchStore(SharedResponseCache):
+    """Respuestas precargadas guardadas en el almacén compartido entre procesos"""
+
+    NAMESPACE = "prefetch"
+
+class FollowUpPrefetcher:
+    """Pide en segundo plano las preguntas de seguimiento y guarda sus respuestas"""
+
+    def __init__(self, max_workers: int, session_budget: int, budget_window_seconds: float, ttl_seconds: float):
+        self.session_budget = max(0, session_budget)
+        self.budget_window_seconds = budget_window_seconds
+        self._executor = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="prefetch")
+        store_class = SharedPrefetchStore if config.SHARED_STORE_ENABLED else ResponseCache
+        self._store = store_class(max_entries=1024, max_bytes=8 * 1024 * 1024, ttl_seconds=ttl_seconds)
+        self._pending: dict[str, tuple[str, Future]] = {}
+        self._budgets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.issued = 0
+        self.served = 0
+        self.skipped = 0
+
+    @staticmethod
+    def _key(session_id: str, follow_up: str, library_version: int) -> str:
+        return ResponseCache.make_key(f"{session_id}\x00{follow_up}", library_version)
+
+    def _budget(self, session_id: str) -> TokenBucket:
+        bucket = self._budgets.get(session_id)
+        if bucket is None:
+            rate = self.session_budget / max(self.budget_window_seconds, 1.0)
+            bucket = self._budgets[session_id] = TokenBucket(rate, self.session_budget)
+            while len(self._budgets) > 10000:
+                self._budgets.popitem(last=False)
+        self._budgets.move_to_end(session_id)
+        return bucket
+
+    def schedule(self, session_id: str, question: str, follow_ups: list[str], webhook_url: str, library_version: int) -> int:
+        """Encola las preguntas que aún no están precargadas; retorna cuántas se enviaron"""
+        if not self.session_budget or get_scheduler().snapshot().get("chat", {}).get("queued"):
+            with self._lock:
+                self.skipped += len(follow_ups)
+            return 0
+
+        issued = 0
+        with self._lock:
+            budget = self._budget(session_id)
+            for follow_up in follow_ups:
+                key = self._key(session_id, follow_up, library_version)
+                if key in self._pending or self._store.get(key) is not None:
+                    continue
+                now = time.monotonic()
+                if not budget.available(now):
+                    self.skipped += 1
+                    continue
+                budget.consume(now)
+                future = self._executor.submit(
+                    self._fetch, key, follow_up_prompt(question, follow_up), webhook_url, session_id
+                )
+                self._pending[key] = (session_id, future)
+                issued += 1
+            self.issued += issued
+        return issued
+
+    def _fetch(self, key: str, prompt: str, webhook_url: str, session_id: str) -> None:
+        try:
+            success, answer = send_message_to_chat_webhook(
+                prompt, webhook_url, session_id=f"{session_id}-prefetch", webhook="prefetch"
+            )
+            if success and answer:
+                self._store.put(key, answer)
+        finally:
+            with self._lock:
+                self._pending.pop(key, None)
+
+    def take(self, session_id: str, follow_up: str, library_version: int, wait_seconds: float = 0.0) -> Optional[str]:
+        """Retorna la respuesta precargada; si todavía está en curso espera hasta `wait_seconds`"""
+        key = self._key(session_id, follow_up, library_version)
+        with self._lock:
+            pending = self._pending.get(key)
+        if pending is not None and wait_seconds > 0:
+            try:
+                pending[1].result(timeout=wait_seconds)
+            except Exception:
+                pass
+        answer = self._store.get(key)
+        if answer is not None:
+            with self._lock:
+                self.served += 1
+        return answer
+
+    def cancel(self, session_id: str) -> None:
+        """Descarta las precargas de la sesión que todavía no empezaron"""
+        with self._lock:
+            for key, (owner, future) in list(self._pending.items()):
+                if owner == session_id and future.cancel():
+                    del self._pending[key]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "issued": self.issued,
+                "served": self.served,
+                "skipped": self.skipped,
+                "pending": len(self._pending),
+            }
+
+_prefetcher: Optional[FollowUpPrefetcher] = None
+_prefetcher_lock = threading.Lock()
+
+def get_prefetcher() -> FollowUpPrefetcher:
+    """Retorna el precargador compartido por el proceso"""
+    global _prefetcher
+    if _prefetcher is None:
+        with _prefetcher_lock:
+            if _prefetcher is None:
+                _prefetcher = FollowUpPrefetcher(
+                    max_workers=config.PREFETCH_MAX_WORKERS,
+                    session_budget=config.PREFETCH_SESSION_BUDGET,
+                    budget_window_seconds=config.PREFETCH_BUDGET_WINDOW_SECONDS,
+                    ttl_seconds=config.PREFETCH_TTL_SECONDS
+                )
+    return _prefetcher
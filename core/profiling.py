@@ -0,0 +1,84 @@
+"""
+Perfil de tiempos de arranque y de cada rerun de Streamlit.
+
+`core/main.py` se vuelve a ejecutar completo en cada interacción. Con
+`APP_PROFILE=true` cada ejecución mide el tiempo de sus secciones (imports,
+configuración, estilos, sesión, barra lateral, contenido...), lo imprime en la
+terminal y la barra lateral muestra el último rerun junto con la mediana de
+los anteriores. La primera ejecución del proceso se reporta como arranque.
+"""
+
+import sys
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+from config import get_config
+from metrics import percentile
+
+config = get_config()
+
+class RerunProfile:
+    """Tiempos de las secciones de una ejecución del script"""
+
+    def __init__(self, started_at: Optional[float] = None):
+        self.started_at = started_at if started_at is not None else time.perf_counter()
+        self.cold_start = False
+        self.sections: list[tuple[str, float]] = []
+        self._last_mark = self.started_at
+
+    def mark(self, name: str) -> None:
+        """Registra el tiempo transcurrido desde la marca anterior"""
+        now = time.perf_counter()
+        self.sections.append((name, now - self._last_mark))
+        self._last_mark = now
+
+    @contextmanager
+    def section(self, name: str) -> Iterator[None]:
+        """Mide el bloque indicado"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            now = time.perf_counter()
+            self.sections.append((name, now - started))
+            self._last_mark = now
+
+    @property
+    def total(self) -> float:
+        return self._last_mark - self.started_at
+
+_history: dict[str, deque] = defaultdict(lambda: deque(maxlen=config.PROFILE_HISTORY_SIZE))
+_history_lock = threading.Lock()
+_reruns = 0
+
+def start_rerun_profile(started_at: Optional[float] = None) -> RerunProfile:
+    """Crea el perfil de la ejecución actual del script"""
+    return RerunProfile(started_at)
+
+def finish_rerun_profile(profile: RerunProfile) -> None:
+    """Acumula el perfil en el historial del proceso y lo imprime si está activo"""
+    global _reruns
+    with _history_lock:
+        profile.cold_start = _reruns == 0
+        _reruns += 1
+        if not profile.cold_start:
+            for name, seconds in profile.sections:
+                _history[name].append(seconds)
+            _history["total"].append(profile.total)
+
+    if config.PROFILE_ENABLED:
+        label = "arranque" if profile.cold_start else "rerun"
+        sections = " ".join(f"{name}={seconds * 1000:.1f}ms" for name, seconds in profile.sections)
+        print(f"[perfil] {label} total={profile.total * 1000:.1f}ms {sections}", file=sys.stderr, flush=True)
+
+def profile_summary() -> dict[str, dict]:
+    """Mediana y p95 por sección de los reruns recientes (sin el arranque)"""
+    with _history_lock:
+        samples = {name: sorted(values) for name, values in _history.items()}
+    return {
+        name: {"p50": percentile(values, 50), "p95": percentile(values, 95), "count": len(values)}
+        for name, values in samples.items() if values
+    }
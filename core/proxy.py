@@ -0,0 +1,168 @@
+"""
+Proxy inverso con sesiones fijas para el modo de producción (`run.py --workers N`).
+
+Streamlit guarda el estado de cada sesión (`st.session_state`, el websocket,
+los archivos subidos) en la memoria del proceso que la atiende, así que todas
+las peticiones de un navegador deben llegar siempre al mismo proceso. El proxy
+lo asigna con la cookie `legal_assistant_worker`: un navegador sin cookie va al
+proceso con menos conexiones abiertas y la respuesta le fija la cookie. Si el
+proceso asignado no acepta conexiones (por ejemplo, mientras se reinicia) se
+elige otro y se reemplaza la cookie.
+
+El proxy también asigna a cada navegador el identificador de su sesión de chat
+(cookie `legal_assistant_session`, aleatoria y `HttpOnly`), con el que la
+aplicación recupera el historial al recargar la página.
+
+Solo se interpreta la cabecera de la primera petición de cada conexión; después
+se copian bytes en ambos sentidos, lo que sirve igual para HTTP con keep-alive
+y para el websocket de Streamlit. Ambos sentidos se copian desde el principio
+(el cuerpo de un POST llega al proceso mientras se espera su respuesta) y la
+cookie se inserta en la cabecera de la primera respuesta a su paso. Solo usa
+la biblioteca estándar.
+"""
+
+import asyncio
+import secrets
+from typing import Optional
+
+WORKER_COOKIE = "legal_assistant_worker"
+SESSION_COOKIE = "legal_assistant_session"
+MAX_HEADER_BYTES = 64 * 1024
+BUFFER_SIZE = 64 * 1024
+
+BAD_GATEWAY = (
+    b"HTTP/1.1 502 Bad Gateway\r\nContent-Type: text/plain; charset=utf-8\r\n"
+    b"Content-Length: 31\r\nConnection: close\r\n\r\nLa aplicacion se esta iniciando"
+)
+
+def request_cookie(request_head: bytes, name: str) -> Optional[str]:
+    """Valor de una cookie de la petición"""
+    for line in request_head.split(b"\r\n")[1:]:
+        header, _, value = line.partition(b":")
+        if header.strip().lower() != b"cookie":
+            continue
+        for cookie in value.split(b";"):
+            key, _, cookie_value = cookie.strip().partition(b"=")
+            if key.decode("latin-1") == name:
+                return cookie_value.decode("latin-1")
+    return None
+
+def sticky_worker(request_head: bytes, workers: int) -> Optional[int]:
+    """Proceso fijado por la cookie de la petición, si es válido"""
+    value = request_cookie(request_head, WORKER_COOKIE)
+    if value is None or not value.isdigit():
+        return None
+    index = int(value)
+    return index if index < workers else None
+
+def is_session_id(value: Optional[str]) -> bool:
+    """Identificador de sesión bien formado (32 caracteres hexadecimales)"""
+    return bool(value) and len(value) == 32 and all(char in "0123456789abcdef" for char in value)
+
+def new_session_id() -> str:
+    return secrets.token_hex(16)
+
+def with_cookies(response_head: bytes, cookies: list[str]) -> bytes:
+    """Agrega a la cabecera de la respuesta una línea `Set-Cookie` por cookie"""
+    lines = b"".join(f"Set-Cookie: {cookie}\r\n".encode("latin-1") for cookie in cookies)
+    # La cabecera termina en una línea vacía: las cookies van justo antes
+    return response_head[:-2] + lines + b"\r\n"
+
+async def _pipe(
+    reader: asyncio.StreamReader,
+    writer: asyncio.StreamWriter,
+    cookies: Optional[list[str]] = None
+) -> None:
+    """Copia bytes de `reader` a `writer`; con `cookies` las agrega a la
+    primera cabecera de respuesta que pase"""
+    try:
+        if cookies:
+            try:
+                response_head = await reader.readuntil(b"\r\n\r\n")
+            except asyncio.IncompleteReadError as error:
+                # El proceso cerró antes de completar la cabecera
+                writer.write(error.partial)
+                return
+            writer.write(with_cookies(response_head, cookies))
+            await writer.drain()
+        while True:
+            data = await reader.read(BUFFER_SIZE)
+            if not data:
+                break
+            writer.write(data)
+            await writer.drain()
+    except (asyncio.LimitOverrunError, ConnectionError, OSError):
+        pass
+    finally:
+        # Al cerrarse un sentido se cierra la conexión completa
+        writer.close()
+
+class StickyProxy:
+    """Reparte conexiones entre procesos de Streamlit manteniendo cada navegador en el suyo"""
+
+    def __init__(self, upstreams: list[tuple[str, int]], host: str, port: int, session_max_age: int = 30 * 86400):
+        self.upstreams = upstreams
+        self.host = host
+        self.port = port
+        self.session_max_age = session_max_age
+        self.connections = [0] * len(upstreams)
+
+    def _cookies(self, request_head: bytes, pinned: Optional[int], index: int) -> list[str]:
+        """Cookies que debe fijar la respuesta a la primera petición de la conexión"""
+        cookies = []
+        if index != pinned:
+            cookies.append(f"{WORKER_COOKIE}={index}; Path=/; HttpOnly; SameSite=Lax")
+        if not is_session_id(request_cookie(request_head, SESSION_COOKIE)):
+            cookies.append(
+                f"{SESSION_COOKIE}={new_session_id()}; Path=/; Max-Age={self.session_max_age}; HttpOnly; SameSite=Lax"
+            )
+        return cookies
+
+    def _candidates(self, pinned: Optional[int]) -> list[int]:
+        others = sorted(
+            (index for index in range(len(self.upstreams)) if index != pinned),
+            key=lambda index: self.connections[index]
+        )
+        return ([pinned] if pinned is not None else []) + others
+
+    async def _connect(self, pinned: Optional[int]):
+        for index in self._candidates(pinned):
+            try:
+                reader, writer = await asyncio.open_connection(*self.upstreams[index], limit=MAX_HEADER_BYTES)
+            except OSError:
+                continue
+            return index, reader, writer
+        return None, None, None
+
+    async def _handle(self, client_reader: asyncio.StreamReader, client_writer: asyncio.StreamWriter) -> None:
+        try:
+            request_head = await client_reader.readuntil(b"\r\n\r\n")
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+            client_writer.close()
+            return
+
+        pinned = sticky_worker(request_head, len(self.upstreams))
+        index, upstream_reader, upstream_writer = await self._connect(pinned)
+        if index is None:
+            client_writer.write(BAD_GATEWAY)
+            client_writer.close()
+            return
+
+        self.connections[index] += 1
+        try:
+            upstream_writer.write(request_head)
+            await upstream_writer.drain()
+            await asyncio.gather(
+                _pipe(client_reader, upstream_writer),
+                _pipe(upstream_reader, client_writer, self._cookies(request_head, pinned, index))
+            )
+        except (ConnectionError, OSError):
+            upstream_writer.close()
+            client_writer.close()
+        finally:
+            self.connections[index] -= 1
+
+    async def serve_forever(self) -> None:
+        server = await asyncio.start_server(self._handle, self.host, self.port, limit=MAX_HEADER_BYTES)
+        async with server:
+            await server.serve_forever()
@@ -0,0 +1,174 @@
+"""
+Circuit breaker y timeouts adaptativos para las llamadas a los webhooks.
+
+Cada URL de webhook tiene su propio circuito. Tras `CIRCUIT_FAILURE_THRESHOLD`
+fallos consecutivos (timeouts, errores de conexión o respuestas 5xx/429) el
+circuito se abre y las llamadas fallan de inmediato sin tocar la red durante
+`CIRCUIT_RESET_SECONDS`. Después pasa a semiabierto: se deja pasar una
+petición de prueba y, según su resultado, el circuito se cierra o vuelve a
+abrirse.
+
+El timeout de lectura se ajusta según el p99 de las llamadas recientes (ver
+`metrics`), acotado entre `ADAPTIVE_TIMEOUT_MIN_SECONDS` y
+`WEBHOOK_TIMEOUT_SECONDS`, de modo que un backend degradado no retiene cada
+hilo durante el timeout máximo. Las llamadas que agotan el timeout cuentan con
+la duración que esperaron, así que si el backend se vuelve más lento el
+timeout vuelve a subir en lugar de quedar fijo en el valor bajo; y solo se usan
+las muestras de los últimos `ADAPTIVE_TIMEOUT_WINDOW_SECONDS`. Mientras el
+circuito no está cerrado (la petición de prueba) se usa el timeout completo.
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+from config import get_config
+from metrics import (
+    OUTCOME_CONNECTION_ERROR,
+    OUTCOME_HTTP_ERROR,
+    OUTCOME_TIMEOUT,
+    OUTCOME_SUCCESS,
+    CallRecord,
+    percentile,
+    registry,
+    track_call,
+)
+from scheduler import scheduled
+
+config = get_config()
+
+CIRCUIT_CLOSED = "closed"
+CIRCUIT_OPEN = "open"
+CIRCUIT_HALF_OPEN = "half_open"
+
+class CircuitOpenError(Exception):
+    """El circuito del webhook está abierto y la llamada se rechazó sin enviarse"""
+
+class CircuitBreaker:
+    """Circuito de un webhook, seguro entre hilos"""
+
+    def __init__(self, failure_threshold: int, reset_seconds: float, half_open_max_calls: int = 1):
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_seconds = reset_seconds
+        self.half_open_max_calls = max(1, half_open_max_calls)
+        self.state = CIRCUIT_CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self._probes = 0
+        self._lock = threading.Lock()
+
+    def before_call(self) -> None:
+        """Autoriza una llamada o lanza `CircuitOpenError`"""
+        with self._lock:
+            if self.state == CIRCUIT_OPEN:
+                if time.monotonic() - self.opened_at < self.reset_seconds:
+                    raise CircuitOpenError()
+                self.state = CIRCUIT_HALF_OPEN
+                self._probes = 0
+            if self.state == CIRCUIT_HALF_OPEN:
+                if self._probes >= self.half_open_max_calls:
+                    raise CircuitOpenError()
+                self._probes += 1
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.state = CIRCUIT_CLOSED
+            self.consecutive_failures = 0
+            self._probes = 0
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.consecutive_failures += 1
+            if self.state == CIRCUIT_HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+                self.state = CIRCUIT_OPEN
+                self.opened_at = time.monotonic()
+                self._probes = 0
+
+    def release(self) -> None:
+        """Libera el turno de prueba de una llamada que no llegó a evaluarse"""
+        with self._lock:
+            if self.state == CIRCUIT_HALF_OPEN and self._probes:
+                self._probes -= 1
+
+    def is_open(self) -> bool:
+        with self._lock:
+            return self.state == CIRCUIT_OPEN and time.monotonic() - self.opened_at < self.reset_seconds
+
+_breakers: dict[tuple[str, str], CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+def get_circuit_breaker(webhook: str, url: str) -> CircuitBreaker:
+    """Retorna el circuito de la URL indicada, creándolo la primera vez"""
+    key = (webhook, url)
+    breaker = _breakers.get(key)
+    if breaker is None:
+        with _breakers_lock:
+            breaker = _breakers.setdefault(key, CircuitBreaker(
+                failure_threshold=config.CIRCUIT_FAILURE_THRESHOLD,
+                reset_seconds=config.CIRCUIT_RESET_SECONDS,
+                half_open_max_calls=config.CIRCUIT_HALF_OPEN_MAX_CALLS
+            ))
+    return breaker
+
+def open_circuits(webhook: str) -> int:
+    """Cantidad de URLs del webhook con el circuito abierto"""
+    with _breakers_lock:
+        breakers = [breaker for (name, _), breaker in _breakers.items() if name == webhook]
+    return sum(1 for breaker in breakers if breaker.is_open())
+
+def _is_backend_failure(call: CallRecord) -> bool:
+    if call.outcome in (OUTCOME_TIMEOUT, OUTCOME_CONNECTION_ERROR):
+        return True
+    return call.outcome == OUTCOME_HTTP_ERROR and call.status_code is not None and (
+        call.status_code >= 500 or call.status_code == 429
+    )
+
+def webhook_timeout(webhook: str, url: Optional[str] = None) -> tuple[float, float]:
+    """Timeout `(conexión, lectura)` para la próxima llamada al webhook.
+
+    Con `url`, si el circuito de esa URL no está cerrado la llamada es la
+    petición de prueba y recibe el timeout completo: un timeout reducido
+    volvería a abrir el circuito aunque el backend solo esté lento.
+    """
+    connect_timeout = min(config.WEBHOOK_CONNECT_TIMEOUT_SECONDS, config.WEBHOOK_TIMEOUT_SECONDS)
+    if not config.ADAPTIVE_TIMEOUT_ENABLED:
+        return connect_timeout, config.WEBHOOK_TIMEOUT_SECONDS
+    if url is not None and get_circuit_breaker(webhook, url).state != CIRCUIT_CLOSED:
+        return connect_timeout, config.WEBHOOK_TIMEOUT_SECONDS
+
+    # Los timeouts entran con la duración que esperaron; si se excluyeran, el
+    # p99 de las exitosas solo podría bajar
+    latencies = registry.recent_latencies(
+        webhook,
+        outcomes=(OUTCOME_SUCCESS, OUTCOME_TIMEOUT),
+        max_age_seconds=config.ADAPTIVE_TIMEOUT_WINDOW_SECONDS
+    )
+    if len(latencies) < config.ADAPTIVE_TIMEOUT_MIN_SAMPLES:
+        return connect_timeout, config.WEBHOOK_TIMEOUT_SECONDS
+    read_timeout = percentile(latencies, 99) * config.ADAPTIVE_TIMEOUT_MULTIPLIER
+    read_timeout = max(config.ADAPTIVE_TIMEOUT_MIN_SECONDS, min(read_timeout, config.WEBHOOK_TIMEOUT_SECONDS))
+    return connect_timeout, read_timeout
+
+@contextmanager
+def guarded_call(webhook: str, url: str, session_id: Optional[str] = None) -> Iterator[CallRecord]:
+    """Igual que `metrics.track_call`, pero pasando por el circuito de la URL
+    y esperando turno en el planificador (`scheduler`).
+
+    Lanza `CircuitOpenError` sin hacer la llamada si el circuito está abierto,
+    o `scheduler.QueueTimeoutError` si la espera en la cola se agota.
+    """
+    breaker = get_circuit_breaker(webhook, url)
+    breaker.before_call()
+    call = None
+    try:
+        with scheduled(webhook, session_id), track_call(webhook) as call:
+            yield call
+    finally:
+        if call is None:
+            breaker.release()
+        elif _is_backend_failure(call):
+            breaker.record_failure()
+        else:
+            breaker.record_success()
+        registry.set_gauge(f"webhook_circuit_open_{webhook}", open_circuits(webhook))
@@ -0,0 +1,184 @@
+"""
+Caché en memoria de respuestas del asistente legal.
+
+Las claves combinan la consulta normalizada con la versión de la biblioteca de
+documentos, que cambia cada vez que se agrega un documento: así una respuesta
+nunca se reutiliza después de que la base de conocimiento cambió. La caché es
+LRU, tiene vencimiento (TTL) y está acotada por cantidad de entradas y bytes.
+
+Con `SHARED_STORE_ENABLED=true` (modo de producción con varios procesos) la
+caché y la versión de la biblioteca se guardan en el almacén compartido
+(`shared_store`) en lugar de la memoria del proceso.
+"""
+
+import hashlib
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Optional
+
+from config import get_config
+from shared_store import get_shared_store
+
+config = get_config()
+
+LIBRARY_VERSION_COUNTER = "library_version"
+
+_library_version = 0
+_library_version_lock = threading.Lock()
+
+def get_library_version() -> int:
+    """Retorna la versión actual de la biblioteca de documentos"""
+    if config.SHARED_STORE_ENABLED:
+        return get_shared_store().counter(LIBRARY_VERSION_COUNTER)
+    return _library_version
+
+def bump_library_version() -> int:
+    """Marca la biblioteca como modificada (por ejemplo, tras una carga exitosa)"""
+    global _library_version
+    if config.SHARED_STORE_ENABLED:
+        return get_shared_store().increment(LIBRARY_VERSION_COUNTER)
+    with _library_version_lock:
+        _library_version += 1
+        return _library_version
+
+def normalize_message(message: str) -> str:
+    """Normaliza una consulta: minúsculas, sin tildes, espacios y signos de los extremos"""
+    text = unicodedata.normalize("NFKD", message.casefold())
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    text = " ".join(text.split())
+    return text.strip(" ¿?¡!.,;:")
+
+class ResponseCache:
+    """Caché LRU con TTL acotada por número de entradas y tamaño total"""
+
+    def __init__(self, max_entries: int, max_bytes: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, tuple[str, float, int]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(message: str, library_version: int) -> str:
+        normalized = normalize_message(message)
+        return hashlib.sha256(f"{library_version}\x00{normalized}".encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, stored_at, size = entry
+            if time.monotonic() - stored_at > self.ttl_seconds:
+                self._remove(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: str, value: str) -> None:
+        size = len(key) + len(value.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, time.monotonic(), size)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                oldest_key = next(iter(self._entries))
+                self._remove(oldest_key)
+                self.evictions += 1
+
+    def _remove(self, key: str) -> None:
+        _, _, size = self._entries.pop(key)
+        self._bytes -= size
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        """Retorna los contadores de uso de la caché"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "evictions": self.evictions,
+            }
+
+class SharedResponseCache(ResponseCache):
+    """Caché de respuestas guardada en el almacén compartido entre procesos.
+
+    Los aciertos y fallos se cuentan por proceso; las entradas y los bytes son
+    los del almacén.
+    """
+
+    NAMESPACE = "responses"
+
+    def __init__(self, max_entries: int, max_bytes: int, ttl_seconds: float):
+        super().__init__(max_entries, max_bytes, ttl_seconds)
+        self._store = get_shared_store()
+
+    def get(self, key: str) -> Optional[str]:
+        value = self._store.cache_get(self.NAMESPACE, key, self.ttl_seconds)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def put(self, key: str, value: str) -> None:
+        size = len(key) + len(value.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        evicted = self._store.cache_put(self.NAMESPACE, key, value, size, self.max_entries, self.max_bytes)
+        with self._lock:
+            self.evictions += evicted
+
+    def clear(self) -> None:
+        self._store.cache_clear(self.NAMESPACE)
+
+    def stats(self) -> dict:
+        entries, size = self._store.cache_usage(self.NAMESPACE)
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": entries,
+                "bytes": size,
+                "evictions": self.evictions,
+            }
+
+_cache: Optional[ResponseCache] = None
+_cache_lock = threading.Lock()
+
+def get_response_cache() -> ResponseCache:
+    """Retorna la caché de respuestas compartida por el proceso"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                cache_class = SharedResponseCache if config.SHARED_STORE_ENABLED else ResponseCache
+                _cache = cache_class(
+                    max_entries=config.CHAT_CACHE_MAX_ENTRIES,
+                    max_bytes=config.CHAT_CACHE_MAX_BYTES,
+                    ttl_seconds=config.CHAT_CACHE_TTL_SECONDS
+                )
+    return _cache
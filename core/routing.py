@@ -0,0 +1,60 @@
+"""
+Enrutamiento de sesiones a varios webhooks de chat.
+
+Usa hashing consistente para que cada sesión vaya siempre al mismo worker de
+N8N (y por lo tanto a la misma memoria de conversación). Agregar o quitar un
+webhook solo reasigna la fracción de sesiones que le corresponde.
+"""
+
+import bisect
+import hashlib
+import threading
+from typing import Optional
+
+from config import get_config
+
+config = get_config()
+
+def _hash(value: str) -> int:
+    return int.from_bytes(hashlib.sha1(value.encode("utf-8")).digest()[:8], "big")
+
+class ConsistentHashRouter:
+    """Anillo de hashing consistente con nodos virtuales"""
+
+    def __init__(self, urls: list[str], virtual_nodes: int = 100):
+        if not urls:
+            raise ValueError("Se necesita al menos una URL de webhook")
+        self.urls = list(dict.fromkeys(urls))
+        ring = sorted(
+            (_hash(f"{url}#{replica}"), url)
+            for url in self.urls
+            for replica in range(virtual_nodes)
+        )
+        self._points = [point for point, _ in ring]
+        self._targets = [url for _, url in ring]
+
+    def route(self, key: str) -> str:
+        """Retorna la URL asignada a la clave (por ejemplo, el id de sesión)"""
+        if len(self.urls) == 1:
+            return self.urls[0]
+        index = bisect.bisect(self._points, _hash(key)) % len(self._points)
+        return self._targets[index]
+
+_router: Optional[ConsistentHashRouter] = None
+_router_lock = threading.Lock()
+
+def get_chat_router() -> ConsistentHashRouter:
+    """Retorna el router de webhooks de chat compartido por el proceso"""
+    global _router
+    if _router is None:
+        with _router_lock:
+            if _router is None:
+                _router = ConsistentHashRouter(
+                    config.CHAT_WEBHOOK_URLS,
+                    virtual_nodes=config.CHAT_ROUTER_VIRTUAL_NODES
+                )
+    return _router
+
+def route_chat_webhook(session_id: str) -> str:
+    """URL del webhook de chat que atiende a la sesión indicada"""
+    return get_chat_router().route(session_id)
@@ -0,0 +1,247 @@
+"""
+Planificador del tráfico saliente hacia los webhooks.
+
+Todas las llamadas del proceso (de todas las sesiones de usuario y de la cola
+de cargas) pasan por aquí antes de salir a la red:
+
+- Cada webhook tiene un límite de tasa (token bucket) y de llamadas
+  simultáneas.
+- Hay un límite global de llamadas simultáneas, del que las cargas no pueden
+  usar los cupos reservados para el chat.
+- El chat tiene prioridad sobre las cargas, y las cargas sobre las consultas
+  especulativas (`prefetch`): cuando se libera un cupo, lo toma primero una
+  consulta en espera.
+- Dentro de cada webhook, las sesiones se atienden por turnos (round-robin),
+  de modo que un lote de 60 archivos de un usuario no deja esperando al
+  documento único de otro.
+
+La profundidad de cada cola, las llamadas en curso y el tiempo de espera se
+publican en `metrics`.
+"""
+
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+from config import get_config
+from metrics import registry
+
+config = get_config()
+
+# Menor número = mayor prioridad
+WEBHOOK_PRIORITIES = {"chat": 0, "upload": 1, "prefetch": 2}
+
+class QueueTimeoutError(Exception):
+    """La llamada esperó en la cola más que el máximo permitido"""
+
+class TokenBucket:
+    """Límite de tasa con ráfagas; `rate <= 0` significa sin límite"""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.capacity = max(1.0, burst)
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def available(self, now: float) -> bool:
+        if self.rate <= 0:
+            return True
+        self._refill(now)
+        return self.tokens >= 1.0
+
+    def consume(self, now: float) -> None:
+        if self.rate > 0:
+            self._refill(now)
+            self.tokens -= 1.0
+
+    def seconds_until_available(self, now: float) -> float:
+        if self.rate <= 0:
+            return 0.0
+        self._refill(now)
+        return max(0.0, (1.0 - self.tokens) / self.rate)
+
+class _Ticket:
+    def __init__(self, webhook: str, session_id: str):
+        self.webhook = webhook
+        self.session_id = session_id
+        self.enqueued_at = time.monotonic()
+        self.admitted = False
+
+class _WebhookLane:
+    """Cola de un webhook con una subcola por sesión"""
+
+    def __init__(self, name: str, rate: float, burst: float, max_concurrent: int):
+        self.name = name
+        self.priority = WEBHOOK_PRIORITIES.get(name, max(WEBHOOK_PRIORITIES.values()))
+        self.bucket = TokenBucket(rate, burst)
+        self.max_concurrent = max_concurrent
+        self.in_flight = 0
+        self.sessions: "OrderedDict[str, deque[_Ticket]]" = OrderedDict()
+        self.depth = 0
+
+    def head(self) -> Optional[_Ticket]:
+        for tickets in self.sessions.values():
+            return tickets[0]
+        return None
+
+    def push(self, ticket: _Ticket) -> None:
+        self.sessions.setdefault(ticket.session_id, deque()).append(ticket)
+        self.depth += 1
+
+    def pop_head(self) -> _Ticket:
+        session_id, tickets = next(iter(self.sessions.items()))
+        ticket = tickets.popleft()
+        # La sesión atendida pasa al final del turno
+        del self.sessions[session_id]
+        if tickets:
+            self.sessions[session_id] = tickets
+        self.depth -= 1
+        return ticket
+
+    def remove(self, ticket: _Ticket) -> None:
+        tickets = self.sessions.get(ticket.session_id)
+        if tickets is not None and ticket in tickets:
+            tickets.remove(ticket)
+            self.depth -= 1
+            if not tickets:
+                del self.sessions[ticket.session_id]
+
+class WebhookScheduler:
+    """Admite las llamadas a los webhooks según tasa, cupos, prioridad y turnos"""
+
+    def __init__(self, max_concurrent: int, reserved_for_chat: int, lanes: dict[str, tuple[float, float, int]]):
+        self.max_concurrent = max(1, max_concurrent)
+        self.reserved_for_chat = max(0, min(reserved_for_chat, self.max_concurrent - 1))
+        self._lanes = {
+            name: _WebhookLane(name, rate, burst, max_concurrent)
+            for name, (rate, burst, max_concurrent) in lanes.items()
+        }
+        self._in_flight = 0
+        self._condition = threading.Condition()
+
+    def _lane(self, webhook: str) -> _WebhookLane:
+        lane = self._lanes.get(webhook)
+        if lane is None:
+            lane = self._lanes[webhook] = _WebhookLane(webhook, 0, 1, self.max_concurrent)
+        return lane
+
+    def _global_limit(self, lane: _WebhookLane) -> int:
+        if lane.priority == 0:
+            return self.max_concurrent
+        return self.max_concurrent - self.reserved_for_chat
+
+    def _admit_ready(self, now: float) -> float:
+        """Admite todos los tickets posibles; retorna cuánto esperar como máximo
+        antes de volver a intentarlo"""
+        next_check = 1.0
+        admitted = True
+        while admitted:
+            admitted = False
+            for lane in sorted(self._lanes.values(), key=lambda lane: lane.priority):
+                ticket = lane.head()
+                if ticket is None:
+                    continue
+                if lane.in_flight >= lane.max_concurrent or self._in_flight >= self._global_limit(lane):
+                    continue
+                if not lane.bucket.available(now):
+                    next_check = min(next_check, lane.bucket.seconds_until_available(now))
+                    continue
+                lane.pop_head()
+                lane.bucket.consume(now)
+                lane.in_flight += 1
+                self._in_flight += 1
+                ticket.admitted = True
+                admitted = True
+                break
+        return max(0.001, next_check)
+
+    def _publish(self) -> None:
+        for lane in self._lanes.values():
+            registry.set_gauge(f"scheduler_queue_depth_{lane.name}", lane.depth)
+            registry.set_gauge(f"scheduler_in_flight_{lane.name}", lane.in_flight)
+
+    def acquire(self, webhook: str, session_id: Optional[str], max_wait: Optional[float] = None) -> None:
+        """Espera el turno de una llamada; lanza `QueueTimeoutError` si se agota `max_wait`"""
+        ticket = _Ticket(webhook, session_id or "")
+        with self._condition:
+            lane = self._lane(webhook)
+            lane.push(ticket)
+            self._admit_ready(time.monotonic())
+            while not ticket.admitted:
+                now = time.monotonic()
+                waited = now - ticket.enqueued_at
+                if max_wait is not None and waited >= max_wait:
+                    lane.remove(ticket)
+                    self._publish()
+                    self._condition.notify_all()
+                    raise QueueTimeoutError()
+                self._publish()
+                timeout = self._admit_ready(now)
+                if ticket.admitted:
+                    break
+                if max_wait is not None:
+                    timeout = min(timeout, max_wait - waited)
+                self._condition.wait(timeout=timeout)
+            self._publish()
+            self._condition.notify_all()
+        registry.record_wait(webhook, time.monotonic() - ticket.enqueued_at)
+
+    def release(self, webhook: str) -> None:
+        with self._condition:
+            lane = self._lane(webhook)
+            lane.in_flight -= 1
+            self._in_flight -= 1
+            self._admit_ready(time.monotonic())
+            self._publish()
+            self._condition.notify_all()
+
+    def snapshot(self) -> dict[str, dict]:
+        """Estado de cada webhook: en cola, en curso y sesiones en espera"""
+        with self._condition:
+            return {
+                name: {"queued": lane.depth, "in_flight": lane.in_flight, "sessions": len(lane.sessions)}
+                for name, lane in self._lanes.items()
+            }
+
+_scheduler: Optional[WebhookScheduler] = None
+_scheduler_lock = threading.Lock()
+
+def get_scheduler() -> WebhookScheduler:
+    """Retorna el planificador compartido por el proceso"""
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                _scheduler = WebhookScheduler(
+                    max_concurrent=config.SCHEDULER_MAX_CONCURRENT,
+                    reserved_for_chat=config.SCHEDULER_CHAT_RESERVED_SLOTS,
+                    lanes={
+                        "chat": (config.SCHEDULER_CHAT_RATE_PER_SECOND, config.SCHEDULER_CHAT_BURST, config.SCHEDULER_MAX_CONCURRENT),
+                        "upload": (config.SCHEDULER_UPLOAD_RATE_PER_SECOND, config.SCHEDULER_UPLOAD_BURST, config.SCHEDULER_UPLOAD_MAX_CONCURRENT),
+                        "prefetch": (config.SCHEDULER_PREFETCH_RATE_PER_SECOND, config.SCHEDULER_PREFETCH_BURST, config.SCHEDULER_PREFETCH_MAX_CONCURRENT),
+                    }
+                )
+    return _scheduler
+
+@contextmanager
+def scheduled(webhook: str, session_id: Optional[str] = None) -> Iterator[None]:
+    """Ocupa un cupo del planificador durante la llamada (sin efecto si está desactivado)"""
+    if not config.SCHEDULER_ENABLED:
+        yield
+        return
+    scheduler = get_scheduler()
+    max_wait = {
+        "chat": config.SCHEDULER_CHAT_MAX_WAIT_SECONDS,
+        "prefetch": config.SCHEDULER_PREFETCH_MAX_WAIT_SECONDS,
+    }.get(webhook)
+    scheduler.acquire(webhook, session_id, max_wait=max_wait)
+    try:
+        yield
+    finally:
+        scheduler.release(webhook)
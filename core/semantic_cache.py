@@ -0,0 +1,282 @@
+"""
+Caché semántica de respuestas para consultas casi idénticas.
+
+La caché exacta (`response_cache`) no reconoce variaciones de redacción
+("¿Cuáles son los requisitos para crear una SAS?" frente a "requisitos crear
+una SAS, por favor"). Aquí cada consulta
+se convierte en un vector con un vectorizador de n-gramas con hashing (sin
+modelos ni descargas) y se busca en un índice NumPy en memoria la consulta
+anterior más parecida por similitud coseno. Si supera el umbral se devuelve
+la respuesta guardada.
+
+El índice pertenece a una versión de la biblioteca de documentos: cuando la
+versión cambia se descarta completo. Está acotado por cantidad de entradas
+(se reemplaza la usada hace más tiempo) y las entradas vencen según el TTL.
+Por seguridad, dos consultas con números distintos (plazos, artículos,
+montos) o con distintas negaciones ("¿puedo despedir con preaviso?" frente a
+"¿puedo despedir sin preaviso?") nunca se consideran equivalentes; entre las
+consultas que superan el umbral se usa la más parecida que cumpla ambas
+condiciones.
+
+Con `SHARED_STORE_ENABLED=true` las entradas se guardan en el almacén
+compartido (`shared_store`) y cada proceso las incorpora a su índice, así que
+una consulta respondida en un proceso sirve para las parecidas en los demás.
+"""
+
+import json
+import re
+import threading
+import time
+import zlib
+from typing import Optional
+
+import numpy as np
+
+from config import get_config
+from response_cache import ResponseCache, normalize_message
+from shared_store import get_shared_store
+
+config = get_config()
+
+_WORD_PATTERN = re.compile(r"\w+")
+_NUMBER_PATTERN = re.compile(r"\d+")
+
+# Palabras que invierten el sentido de una consulta (ya normalizadas, sin tildes)
+NEGATIONS = frozenset("no sin nunca ni tampoco jamas".split())
+
+# Palabras muy frecuentes que no distinguen una consulta de otra
+STOPWORDS = frozenset(
+    "a al como con cual cuales cuando de del el en es esta este hay la las lo los me mi "
+    "para por puedo que se sobre son su sus tengo un una y yo".split()
+)
+
+class HashedNgramVectorizer:
+    """Vectorizador de palabras, pares de palabras y n-gramas de caracteres.
+
+    Cada rasgo se proyecta con un hash a una de `dimensions` posiciones (con
+    signo, para que las colisiones tiendan a cancelarse) y el vector resultante
+    se normaliza a norma 1, de modo que el producto punto es la similitud coseno.
+    """
+
+    def __init__(self, dimensions: int, char_ngram: int = 4):
+        self.dimensions = dimensions
+        self.char_ngram = char_ngram
+
+    def features(self, text: str) -> list[str]:
+        words = [word for word in _WORD_PATTERN.findall(normalize_message(text)) if word not in STOPWORDS]
+        features = [f"w:{word}" for word in words]
+        features += [f"b:{first} {second}" for first, second in zip(words, words[1:])]
+        for word in words:
+            padded = f"#{word}#"
+            features += [
+                f"c:{padded[index:index + self.char_ngram]}"
+                for index in range(max(1, len(padded) - self.char_ngram + 1))
+            ]
+        return features
+
+    def transform(self, text: str) -> np.ndarray:
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        for feature in self.features(text):
+            digest = zlib.crc32(feature.encode("utf-8"))
+            vector[digest % self.dimensions] += 1.0 if digest & 0x80000000 else -1.0
+        norm = float(np.linalg.norm(vector))
+        if norm:
+            vector /= norm
+        return vector
+
+def _numbers(text: str) -> tuple[str, ...]:
+    return tuple(sorted(_NUMBER_PATTERN.findall(text)))
+
+def _negations(text: str) -> tuple[str, ...]:
+    return tuple(sorted(word for word in _WORD_PATTERN.findall(normalize_message(text)) if word in NEGATIONS))
+
+class SemanticCache:
+    """Índice de vectores de consultas con sus respuestas, seguro entre hilos"""
+
+    def __init__(self, dimensions: int, max_entries: int, threshold: float, ttl_seconds: float):
+        self.vectorizer = HashedNgramVectorizer(dimensions)
+        self.max_entries = max_entries
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.library_version: Optional[int] = None
+        self._vectors = np.zeros((max_entries, dimensions), dtype=np.float32)
+        self._answers: list[Optional[str]] = [None] * max_entries
+        self._numbers: list[tuple[str, ...]] = [()] * max_entries
+        self._negations: list[tuple[str, ...]] = [()] * max_entries
+        self._stored_at = np.zeros(max_entries, dtype=np.float64)
+        self._last_used = np.zeros(max_entries, dtype=np.float64)
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _reset(self, library_version: int) -> None:
+        self.library_version = library_version
+        self._vectors[:self._size] = 0.0
+        self._answers = [None] * self.max_entries
+        self._numbers = [()] * self.max_entries
+        self._negations = [()] * self.max_entries
+        self._size = 0
+
+    def get(self, message: str, library_version: int) -> Optional[str]:
+        """Retorna la respuesta de una consulta equivalente o None"""
+        vector = self.vectorizer.transform(message)
+        numbers = _numbers(message)
+        negations = _negations(message)
+        with self._lock:
+            if library_version != self.library_version or not self._size:
+                self.misses += 1
+                return None
+
+            similarities = self._vectors[:self._size] @ vector
+            now = time.monotonic()
+            expired = now - self._stored_at[:self._size] > self.ttl_seconds
+            similarities[expired] = -1.0
+            candidates = np.flatnonzero(similarities >= self.threshold)
+            # La más parecida puede diferir en números o negaciones y otra no
+            for slot in candidates[np.argsort(-similarities[candidates])]:
+                if self._numbers[slot] == numbers and self._negations[slot] == negations:
+                    self._last_used[slot] = now
+                    self.hits += 1
+                    return self._answers[slot]
+            self.misses += 1
+            return None
+
+    def put(self, message: str, library_version: int, answer: str) -> None:
+        self._add(message, library_version, answer)
+
+    def _add(self, message: str, library_version: int, answer: str, age_seconds: float = 0.0) -> None:
+        vector = self.vectorizer.transform(message)
+        if not vector.any():
+            return
+        with self._lock:
+            if self.library_version is not None and library_version < self.library_version:
+                # Respuesta calculada antes de que cambiara la biblioteca
+                return
+            if library_version != self.library_version:
+                self._reset(library_version)
+
+            if self._size < self.max_entries:
+                slot = self._size
+                self._size += 1
+            else:
+                # Reemplazar la entrada usada hace más tiempo
+                slot = int(np.argmin(self._last_used[:self._size]))
+                self.evictions += 1
+
+            now = time.monotonic()
+            self._vectors[slot] = vector
+            self._answers[slot] = answer
+            self._numbers[slot] = _numbers(message)
+            self._negations[slot] = _negations(message)
+            self._stored_at[slot] = now - age_seconds
+            self._last_used[slot] = now
+
+    def clear(self) -> None:
+        with self._lock:
+            self._reset(self.library_version)
+
+    def stats(self) -> dict:
+        """Retorna los contadores de uso de la caché"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": self._size,
+                "evictions": self.evictions,
+            }
+
+class SharedSemanticCache(SemanticCache):
+    """Caché semántica cuyas entradas se guardan en el almacén compartido.
+
+    El almacén guarda la consulta y la respuesta; cada proceso mantiene su
+    propio índice de vectores y, antes de cada búsqueda, incorpora las
+    entradas que los demás procesos guardaron desde la última vez. Los
+    aciertos y fallos se cuentan por proceso; las entradas son las del almacén.
+    """
+
+    NAMESPACE = "semantic"
+    # Margen para no perder entradas cuyo proceso tardó en escribirlas después
+    # de tomar la hora
+    SYNC_OVERLAP_SECONDS = 5.0
+
+    def __init__(self, dimensions: int, max_entries: int, threshold: float, ttl_seconds: float, max_bytes: int):
+        super().__init__(dimensions, max_entries, threshold, ttl_seconds)
+        self.max_bytes = max_bytes
+        self._store = get_shared_store()
+        self._synced_until = 0.0
+        # Entradas ya incorporadas dentro del margen: clave -> momento de guardado
+        self._recent: dict[str, float] = {}
+        self._sync_lock = threading.Lock()
+
+    def _sync(self, library_version: int) -> None:
+        with self._sync_lock:
+            since = self._synced_until - self.SYNC_OVERLAP_SECONDS
+            now = time.time()
+            for key, value, stored_at in self._store.cache_entries_since(self.NAMESPACE, since):
+                if self._recent.get(key) == stored_at:
+                    continue
+                self._recent[key] = stored_at
+                self._synced_until = max(self._synced_until, stored_at)
+                entry = json.loads(value)
+                age = now - stored_at
+                # Las de versiones anteriores ya no sirven y no se vuelven a leer
+                if entry["library_version"] >= library_version and age <= self.ttl_seconds:
+                    self._add(entry["message"], entry["library_version"], entry["answer"], age_seconds=max(0.0, age))
+            limit = self._synced_until - self.SYNC_OVERLAP_SECONDS
+            self._recent = {key: stored_at for key, stored_at in self._recent.items() if stored_at > limit}
+
+    def get(self, message: str, library_version: int) -> Optional[str]:
+        self._sync(library_version)
+        return super().get(message, library_version)
+
+    def put(self, message: str, library_version: int, answer: str) -> None:
+        if not self.vectorizer.transform(message).any():
+            return
+        # Se incorpora al índice local en la próxima búsqueda, igual que en los demás procesos
+        value = json.dumps({"message": message, "answer": answer, "library_version": library_version})
+        size = len(value.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        key = ResponseCache.make_key(message, library_version)
+        evicted = self._store.cache_put(self.NAMESPACE, key, value, size, self.max_entries, self.max_bytes)
+        with self._lock:
+            self.evictions += evicted
+
+    def clear(self) -> None:
+        self._store.cache_clear(self.NAMESPACE)
+        super().clear()
+
+    def stats(self) -> dict:
+        stats = super().stats()
+        stats["entries"], _ = self._store.cache_usage(self.NAMESPACE)
+        return stats
+
+_cache: Optional[SemanticCache] = None
+_cache_lock = threading.Lock()
+
+def get_semantic_cache() -> SemanticCache:
+    """Retorna la caché semántica compartida por el proceso"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                if config.SHARED_STORE_ENABLED:
+                    _cache = SharedSemanticCache(
+                        dimensions=config.CHAT_SEMANTIC_CACHE_DIMENSIONS,
+                        max_entries=config.CHAT_SEMANTIC_CACHE_MAX_ENTRIES,
+                        threshold=config.CHAT_SEMANTIC_CACHE_THRESHOLD,
+                        ttl_seconds=config.CHAT_CACHE_TTL_SECONDS,
+                        max_bytes=config.CHAT_CACHE_MAX_BYTES
+                    )
+                else:
+                    _cache = SemanticCache(
+                        dimensions=config.CHAT_SEMANTIC_CACHE_DIMENSIONS,
+                        max_entries=config.CHAT_SEMANTIC_CACHE_MAX_ENTRIES,
+                        threshold=config.CHAT_SEMANTIC_CACHE_THRESHOLD,
+                        ttl_seconds=config.CHAT_CACHE_TTL_SECONDS
+                    )
+    return _cache
@@ -0,0 +1,261 @@
+"""
+Memoria acotada de las sesiones del navegador.
+
+Streamlit conserva `st.session_state` y los archivos subidos de cada sesión
+hasta que se cierra el websocket, así que en un servidor compartido la memoria
+crece durante toda la jornada. Aquí se lleva la cuenta de lo que ocupa cada
+sesión y se libera lo que ya está en disco:
+
+- La ventana de historial de chat vive en este administrador y no en
+  `st.session_state`. Si una sesión supera `SESSION_MEMORY_MAX_BYTES` se
+  sueltan sus turnos más antiguos, que siguen en el almacén de historial y se
+  leen por páginas. Si el proceso supera `SESSION_MEMORY_TOTAL_MAX_BYTES` se
+  sueltan las ventanas de las sesiones usadas hace más tiempo.
+- Los archivos subidos cuentan mientras Streamlit los tiene en memoria. Se
+  liberan apenas quedan copiados al spool (o enviados) con `release_uploads`.
+- Una sesión sin actividad durante `SESSION_IDLE_TIMEOUT_SECONDS` se expulsa:
+  se descarta su ventana y se liberan sus archivos subidos. Si el usuario
+  vuelve, el historial se recarga desde el almacén.
+
+El uso total, la sesión más grande y las expulsiones se publican en `metrics`.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from config import get_config
+from history import ChatHistoryStore, ChatMessage, get_chat_history_store
+from metrics import registry
+
+config = get_config()
+
+def message_bytes(message: ChatMessage) -> int:
+    """Tamaño aproximado de un mensaje del historial"""
+    role, text, timestamp = message
+    return len(role) + len(text.encode("utf-8")) + len(timestamp)
+
+def streamlit_session_id() -> Optional[str]:
+    """Identificador interno de Streamlit de la sesión que ejecuta el script"""
+    from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+    ctx = get_script_run_ctx()
+    return ctx.session_id if ctx is not None else None
+
+def _release_streamlit_files(streamlit_session: Optional[str], file_ids: list[str]) -> None:
+    """Quita los archivos del administrador de cargas de Streamlit"""
+    if not streamlit_session or not file_ids:
+        return
+    from streamlit import runtime
+
+    if not runtime.exists():
+        return
+    try:
+        manager = runtime.get_instance().uploaded_file_mgr
+        for file_id in file_ids:
+            manager.remove_file(streamlit_session, file_id)
+    except Exception:
+        # API interna de Streamlit: si cambia, los archivos se liberan al cerrar la sesión
+        pass
+
+class _SessionUsage:
+    """Ventana de historial y archivos subidos de una sesión"""
+
+    def __init__(self):
+        self.streamlit_session: Optional[str] = None
+        self.messages: Optional[list[ChatMessage]] = None
+        self.message_bytes = 0
+        self.uploads: dict[str, int] = {}
+        self.last_seen = time.monotonic()
+
+    @property
+    def bytes(self) -> int:
+        return self.message_bytes + sum(self.uploads.values())
+
+class SessionMemoryManager:
+    """Lleva el uso de memoria por sesión y aplica los topes y la expulsión por inactividad"""
+
+    def __init__(
+        self,
+        store: ChatHistoryStore,
+        window_messages: int,
+        session_max_bytes: int,
+        total_max_bytes: int,
+        idle_seconds: float
+    ):
+        self.store = store
+        self.window_messages = max(2, window_messages)
+        self.session_max_bytes = session_max_bytes
+        self.total_max_bytes = total_max_bytes
+        self.idle_seconds = idle_seconds
+        # Ordenadas de la menos a la más recientemente activa
+        self._sessions: "OrderedDict[str, _SessionUsage]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.evicted = 0
+        self.spilled = 0
+
+    def _usage(self, session_id: str) -> _SessionUsage:
+        usage = self._sessions.get(session_id)
+        if usage is None:
+            usage = self._sessions[session_id] = _SessionUsage()
+        return usage
+
+    def _set_messages(self, usage: _SessionUsage, messages: Optional[list[ChatMessage]]) -> None:
+        size = sum(message_bytes(message) for message in messages) if messages else 0
+        self._bytes += size - usage.message_bytes
+        usage.messages = messages
+        usage.message_bytes = size
+
+    def _trim(self, usage: _SessionUsage) -> None:
+        """Suelta los turnos más antiguos que excedan la ventana o el tope de la sesión"""
+        messages = usage.messages
+        # Siempre se conserva al menos el último turno (consulta y respuesta)
+        while messages and len(messages) > 2 and (
+            len(messages) > self.window_messages or usage.bytes > self.session_max_bytes
+        ):
+            size = message_bytes(messages.pop(0))
+            usage.message_bytes -= size
+            self._bytes -= size
+            self.spilled += 1
+
+    def _spill_over_total(self, current: str) -> None:
+        """Si el proceso supera el tope total, suelta las ventanas de historial
+        de las sesiones menos recientes (los archivos subidos no se pueden soltar)"""
+        for session_id, usage in self._sessions.items():
+            if self._bytes <= self.total_max_bytes:
+                break
+            if session_id != current and usage.messages:
+                self.spilled += len(usage.messages)
+                self._set_messages(usage, None)
+
+    def _evict_idle(self, now: float, current: str) -> list[tuple[Optional[str], list[str]]]:
+        """Expulsa las sesiones inactivas; retorna los archivos a liberar"""
+        released = []
+        while self._sessions:
+            session_id, usage = next(iter(self._sessions.items()))
+            if session_id == current or now - usage.last_seen <= self.idle_seconds:
+                break
+            del self._sessions[session_id]
+            self._bytes -= usage.bytes
+            self.evicted += 1
+            released.append((usage.streamlit_session, list(usage.uploads)))
+        return released
+
+    def touch(self, session_id: str, streamlit_session: Optional[str] = None) -> None:
+        """Registra actividad de la sesión y aplica la expulsión por inactividad"""
+        now = time.monotonic()
+        with self._lock:
+            usage = self._usage(session_id)
+            usage.last_seen = now
+            if streamlit_session:
+                usage.streamlit_session = streamlit_session
+            self._sessions.move_to_end(session_id)
+            released = self._evict_idle(now, session_id)
+            self._spill_over_total(session_id)
+            self._publish()
+        for owner, file_ids in released:
+            _release_streamlit_files(owner, file_ids)
+
+    def chat_window(self, session_id: str) -> list[ChatMessage]:
+        """Mensajes recientes de la sesión; los recarga del almacén si se soltaron"""
+        with self._lock:
+            usage = self._usage(session_id)
+            if usage.messages is not None:
+                return list(usage.messages)
+        messages = self.store.recent(session_id, self.window_messages)
+        with self._lock:
+            usage = self._usage(session_id)
+            if usage.messages is None:
+                self._set_messages(usage, messages)
+                self._trim(usage)
+                self._spill_over_total(session_id)
+                self._publish()
+            return list(usage.messages)
+
+    def append_message(self, session_id: str, message: ChatMessage) -> None:
+        """Agrega un mensaje (ya guardado en el almacén) a la ventana de la sesión"""
+        with self._lock:
+            usage = self._usage(session_id)
+            if usage.messages is None:
+                # La ventana se cargará del almacén, que ya incluye el mensaje
+                return
+            usage.messages.append(message)
+            size = message_bytes(message)
+            usage.message_bytes += size
+            self._bytes += size
+            self._trim(usage)
+            self._spill_over_total(session_id)
+            self._publish()
+
+    def clear_messages(self, session_id: str) -> None:
+        with self._lock:
+            self._set_messages(self._usage(session_id), [])
+            self._publish()
+
+    def hold_uploads(self, session_id: str, files: list) -> None:
+        """Registra los archivos que el selector de la sesión tiene en memoria"""
+        with self._lock:
+            usage = self._usage(session_id)
+            uploads = {file.file_id: file.size for file in files if hasattr(file, "file_id")}
+            self._bytes += sum(uploads.values()) - sum(usage.uploads.values())
+            usage.uploads = uploads
+            self._trim(usage)
+            self._spill_over_total(session_id)
+            self._publish()
+
+    def release_uploads(self, session_id: str, files: list) -> None:
+        """Libera los archivos subidos cuyo contenido ya está en disco o fue enviado"""
+        file_ids = [file.file_id for file in files if hasattr(file, "file_id")]
+        with self._lock:
+            usage = self._usage(session_id)
+            for file_id in file_ids:
+                self._bytes -= usage.uploads.pop(file_id, 0)
+            streamlit_session = usage.streamlit_session
+            self._publish()
+        _release_streamlit_files(streamlit_session, file_ids)
+
+    def usage(self, session_id: str) -> int:
+        """Bytes en memoria de una sesión"""
+        with self._lock:
+            usage = self._sessions.get(session_id)
+            return usage.bytes if usage is not None else 0
+
+    def _largest_session_bytes(self) -> int:
+        return max((usage.bytes for usage in self._sessions.values()), default=0)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "sessions": len(self._sessions),
+                "bytes": self._bytes,
+                "largest_session_bytes": self._largest_session_bytes(),
+                "evicted": self.evicted,
+                "spilled": self.spilled,
+            }
+
+    def _publish(self) -> None:
+        registry.set_gauge("session_memory_bytes", self._bytes)
+        registry.set_gauge("session_memory_sessions", len(self._sessions))
+        registry.set_gauge("session_memory_largest_session_bytes", self._largest_session_bytes())
+        registry.set_gauge("session_memory_evicted_sessions", self.evicted)
+        registry.set_gauge("session_memory_spilled_messages", self.spilled)
+
+_manager: Optional[SessionMemoryManager] = None
+_manager_lock = threading.Lock()
+
+def get_session_memory() -> SessionMemoryManager:
+    """Retorna el administrador de memoria de sesiones del proceso"""
+    global _manager
+    if _manager is None:
+        with _manager_lock:
+            if _manager is None:
+                _manager = SessionMemoryManager(
+                    get_chat_history_store(),
+                    window_messages=config.CHAT_HISTORY_MEMORY_TURNS * 2,
+                    session_max_bytes=config.SESSION_MEMORY_MAX_BYTES,
+                    total_max_bytes=config.SESSION_MEMORY_TOTAL_MAX_BYTES,
+                    idle_seconds=config.SESSION_IDLE_TIMEOUT_SECONDS
+                )
+    return _manager
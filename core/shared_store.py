@@ -0,0 +1,157 @@
+"""
+Almacén local compartido entre los procesos de la aplicación.
+
+En el modo de producción (`run.py --workers N`) cada proceso de Streamlit
+tiene su propia memoria, así que la caché de respuestas, la caché semántica,
+las respuestas precargadas y la versión de la biblioteca se guardan en un
+archivo SQLite común (`SHARED_STORE_PATH`): una respuesta obtenida por un
+proceso la aprovechan los demás y una carga exitosa invalida la caché de
+todos. El registro de cargas, el índice de la
+biblioteca, el historial y la cola de cargas ya viven en SQLite y se
+comparten sin cambios.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+from config import get_config
+
+config = get_config()
+
+class SharedStore:
+    """Contadores y entradas de caché en SQLite, seguros entre hilos y procesos"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=10)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS counters (
+                name TEXT PRIMARY KEY,
+                value INTEGER NOT NULL
+            )
+            """
+        )
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS cache_entries (
+                namespace TEXT NOT NULL,
+                key TEXT NOT NULL,
+                value TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                stored_at REAL NOT NULL,
+                used_at REAL NOT NULL,
+                PRIMARY KEY (namespace, key)
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_cache_entries_used ON cache_entries (namespace, used_at)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_cache_entries_stored ON cache_entries (namespace, stored_at)")
+
+    def counter(self, name: str) -> int:
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM counters WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else 0
+
+    def increment(self, name: str) -> int:
+        """Incrementa un contador de forma atómica y retorna el nuevo valor"""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute(
+                    "INSERT INTO counters (name, value) VALUES (?, 1) "
+                    "ON CONFLICT(name) DO UPDATE SET value = value + 1",
+                    (name,)
+                )
+                value = self._conn.execute("SELECT value FROM counters WHERE name = ?", (name,)).fetchone()[0]
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return value
+
+    def cache_get(self, namespace: str, key: str, ttl_seconds: float) -> Optional[str]:
+        """Retorna el valor guardado si no venció, marcándolo como usado"""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, stored_at FROM cache_entries WHERE namespace = ? AND key = ?", (namespace, key)
+            ).fetchone()
+            if row is None:
+                return None
+            if now - row[1] > ttl_seconds:
+                self._conn.execute("DELETE FROM cache_entries WHERE namespace = ? AND key = ?", (namespace, key))
+                return None
+            self._conn.execute(
+                "UPDATE cache_entries SET used_at = ? WHERE namespace = ? AND key = ?", (now, namespace, key)
+            )
+        return row[0]
+
+    def cache_put(self, namespace: str, key: str, value: str, size: int, max_entries: int, max_bytes: int) -> int:
+        """Guarda un valor y descarta los menos usados que excedan los límites;
+        retorna cuántas entradas se descartaron"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache_entries (namespace, key, value, size, stored_at, used_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (namespace, key, value, size, now, now)
+            )
+            evicted = self._conn.execute(
+                """
+                DELETE FROM cache_entries WHERE namespace = ? AND key IN (
+                    SELECT key FROM (
+                        SELECT key,
+                               ROW_NUMBER() OVER (ORDER BY used_at DESC) AS position,
+                               SUM(size) OVER (ORDER BY used_at DESC ROWS UNBOUNDED PRECEDING) AS total_size
+                        FROM cache_entries WHERE namespace = ?
+                    ) WHERE position > ? OR total_size > ?
+                )
+                """,
+                (namespace, namespace, max_entries, max_bytes)
+            ).rowcount
+        return evicted
+
+    def cache_entries_since(self, namespace: str, since: float) -> list[tuple[str, str, float]]:
+        """Entradas (clave, valor, momento de guardado) guardadas después de
+        `since`, de la más antigua a la más reciente"""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT key, value, stored_at FROM cache_entries "
+                "WHERE namespace = ? AND stored_at > ? ORDER BY stored_at",
+                (namespace, since)
+            ).fetchall()
+
+    def cache_usage(self, namespace: str) -> tuple[int, int]:
+        """Cantidad de entradas y bytes guardados en un espacio de nombres"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache_entries WHERE namespace = ?", (namespace,)
+            ).fetchone()
+        return row[0], row[1]
+
+    def cache_clear(self, namespace: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM cache_entries WHERE namespace = ?", (namespace,))
+
+_store: Optional[SharedStore] = None
+_store_lock = threading.Lock()
+
+def get_shared_store() -> SharedStore:
+    """Retorna el almacén compartido del proceso"""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = SharedStore(config.SHARED_STORE_PATH)
+    return _store
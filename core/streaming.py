@@ -0,0 +1,165 @@
+"""
+Lectura incremental de respuestas del webhook de chat.
+
+Soporta los formatos que puede devolver N8N u otro backend compatible:
+- Server-Sent Events (`text/event-stream`)
+- JSON delimitado por líneas (`application/x-ndjson`, `application/jsonl` o
+  `application/json` enviado con `Transfer-Encoding: chunked`)
+- Texto plano enviado por partes (`text/plain`)
+- JSON tradicional con el campo "output" (respuesta completa de una vez)
+"""
+
+import codecs
+import json
+from typing import Iterator
+
+import requests
+
+STREAM_ACCEPT_HEADER = "text/event-stream, application/x-ndjson, text/plain;q=0.9, application/json;q=0.8"
+
+# Campos donde los distintos backends suelen colocar el fragmento de texto
+_TOKEN_FIELDS = ("content", "output", "text", "token", "response", "delta")
+_NDJSON_TYPES = ("application/x-ndjson", "application/jsonl", "application/json-seq")
+
+class StreamError(Exception):
+    """El backend informó un error en medio del streaming"""
+
+def _content_type(response: requests.Response) -> str:
+    return response.headers.get("Content-Type", "").split(";")[0].strip().lower()
+
+def _charset(response: requests.Response) -> str:
+    """Charset declarado por el servidor; UTF-8 si no se indica ninguno"""
+    for param in response.headers.get("Content-Type", "").split(";")[1:]:
+        name, _, value = param.partition("=")
+        if name.strip().lower() == "charset" and value.strip():
+            return value.strip().strip('"')
+    return "utf-8"
+
+def _iter_text(response: requests.Response) -> Iterator[str]:
+    """Decodifica el cuerpo a medida que llegan los bytes"""
+    decoder = codecs.getincrementaldecoder(_charset(response))(errors="replace")
+    for chunk in response.iter_content(chunk_size=None):
+        text = decoder.decode(chunk)
+        if text:
+            yield text
+    tail = decoder.decode(b"", final=True)
+    if tail:
+        yield tail
+
+def _iter_lines(chunks: Iterator[str]) -> Iterator[str]:
+    """Agrupa fragmentos de texto en líneas completas"""
+    pending = ""
+    for chunk in chunks:
+        pending += chunk
+        *lines, pending = pending.split("\n")
+        for line in lines:
+            yield line.rstrip("\r")
+    if pending:
+        yield pending.rstrip("\r")
+
+def extract_token(data) -> str:
+    """Obtiene el fragmento de texto de un evento JSON del backend"""
+    if isinstance(data, str):
+        return data
+    if not isinstance(data, dict):
+        return ""
+
+    event_type = data.get("type")
+    if event_type == "error":
+        raise StreamError(str(data.get("content") or data.get("message") or "stream error"))
+    if event_type in ("begin", "end"):
+        return ""
+
+    choices = data.get("choices")
+    if isinstance(choices, list) and choices:
+        delta = choices[0].get("delta") or choices[0].get("message") or {}
+        return delta.get("content") or ""
+
+    for field in _TOKEN_FIELDS:
+        value = data.get(field)
+        if isinstance(value, str):
+            return value
+    return ""
+
+def _parse_json_token(raw: str) -> str:
+    try:
+        return extract_token(json.loads(raw))
+    except json.JSONDecodeError:
+        return raw
+
+def _iter_sse(response: requests.Response) -> Iterator[str]:
+    data_lines: list[str] = []
+    done = False
+    for line in _iter_lines(_iter_text(response)):
+        # Tras [DONE] se sigue leyendo hasta el final para que la conexión
+        # vuelva al pool en lugar de cerrarse
+        if done:
+            continue
+        if line.startswith("data:"):
+            data_lines.append(line[5:].lstrip(" "))
+            continue
+        if line or not data_lines:
+            continue
+
+        data = "\n".join(data_lines)
+        data_lines = []
+        if data.strip() == "[DONE]":
+            done = True
+            continue
+        token = _parse_json_token(data)
+        if token:
+            yield token
+
+    if data_lines and "\n".join(data_lines).strip() != "[DONE]":
+        token = _parse_json_token("\n".join(data_lines))
+        if token:
+            yield token
+
+def _iter_ndjson(response: requests.Response, strict: bool) -> Iterator[str]:
+    """Lee JSON por líneas.
+
+    Con `strict=False` (JSON enviado por partes) la primera línea que no sea un
+    JSON completo indica que en realidad se trata de un documento JSON normal:
+    se lee el resto del cuerpo y se procesa entero.
+    """
+    lines = _iter_lines(_iter_text(response))
+    for line in lines:
+        if not line.strip():
+            continue
+        try:
+            data = json.loads(line)
+        except json.JSONDecodeError:
+            if strict:
+                continue
+            body = "\n".join([line, *lines])
+            yield _parse_json_token(body) or body
+            return
+        token = extract_token(data)
+        if token:
+            yield token
+
+def _iter_buffered_json(response: requests.Response) -> Iterator[str]:
+    try:
+        response_data = response.json()
+    except json.JSONDecodeError:
+        yield response.text
+        return
+    if isinstance(response_data, dict):
+        yield response_data.get("output", response.text)
+    else:
+        yield response.text
+
+def iter_response_tokens(response: requests.Response) -> Iterator[str]:
+    """Devuelve los fragmentos de texto de la respuesta según su formato"""
+    content_type = _content_type(response)
+    chunked = "chunked" in response.headers.get("Transfer-Encoding", "").lower()
+
+    if content_type == "text/event-stream":
+        return _iter_sse(response)
+    if content_type in _NDJSON_TYPES:
+        return _iter_ndjson(response, strict=True)
+    if content_type == "application/json":
+        if chunked:
+            return _iter_ndjson(response, strict=False)
+        return _iter_buffered_json(response)
+    return _iter_text(response)
@@ -0,0 +1,81 @@
+"""
+Capa de transporte HTTP compartida por los clientes de webhooks.
+
+Mantiene una `requests.Session` por host de webhook con un pool de conexiones
+keep-alive y reintentos con backoff. Al vivir en un módulo importado (y no en
+el script de Streamlit), las sesiones sobreviven a cada rerun y se reutilizan
+entre todas las sesiones de usuario del proceso.
+"""
+
+import threading
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from config import get_config
+
+config = get_config()
+
+_sessions: dict[tuple[str, str], requests.Session] = {}
+_sessions_lock = threading.Lock()
+
+def _host_key(url: str) -> tuple[str, str]:
+    """Devuelve la clave (esquema, host:puerto) usada para agrupar conexiones"""
+    parts = urlsplit(url)
+    return parts.scheme.lower(), parts.netloc.lower()
+
+def _build_retry() -> Retry:
+    """Política de reintentos para los webhooks.
+
+    Los errores de conexión siempre se reintentan porque la petición no llegó a
+    enviarse. Los errores de lectura no, ya que el POST pudo haberse procesado;
+    con `read=False` urllib3 relanza el error original, así que un timeout de
+    lectura llega como `requests.exceptions.ReadTimeout` y no como un error de
+    conexión.
+    """
+    return Retry(
+        total=config.WEBHOOK_MAX_RETRIES,
+        connect=config.WEBHOOK_MAX_RETRIES,
+        read=False,
+        status=config.WEBHOOK_MAX_RETRIES,
+        status_forcelist=config.WEBHOOK_RETRY_STATUSES,
+        allowed_methods=frozenset({"GET", "POST"}),
+        backoff_factor=config.WEBHOOK_BACKOFF_FACTOR,
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+
+def _build_session(scheme: str, netloc: str) -> requests.Session:
+    """Crea una sesión con un adaptador de pool dedicado al host"""
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=config.WEBHOOK_POOL_CONNECTIONS,
+        pool_maxsize=config.WEBHOOK_POOL_MAXSIZE,
+        max_retries=_build_retry(),
+    )
+    session.mount(f"{scheme}://{netloc}", adapter)
+    session.headers.update({"Connection": "keep-alive"})
+    return session
+
+def get_http_session(url: str) -> requests.Session:
+    """Retorna la sesión HTTP compartida para el host de la URL indicada"""
+    key = _host_key(url)
+    session = _sessions.get(key)
+    if session is not None:
+        return session
+
+    with _sessions_lock:
+        session = _sessions.get(key)
+        if session is None:
+            session = _build_session(*key)
+            _sessions[key] = session
+        return session
+
+def close_http_sessions() -> None:
+    """Cierra todas las sesiones y libera las conexiones del pool"""
+    with _sessions_lock:
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
@@ -0,0 +1,376 @@
+"""
+Cliente del webhook de carga de documentos.
+
+Agrupa el envío de archivos (completo o por partes), la carga concurrente de
+lotes, la ingesta por lotes de fragmentos y la detección de documentos ya
+ingeridos. No depende de Streamlit, por lo que lo usan tanto la interfaz como
+la cola de cargas en segundo plano.
+"""
+
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+from typing import Callable, Optional
+
+import requests
+
+from batching import build_batch_payloads, chunk_text
+from config import get_config
+from extraction import extract_for_upload, extract_plain_text
+from journal import describe_batch_request, describe_upload_request, journaled
+from ledger import content_hash, get_upload_ledger
+from library import get_document_index
+from multipart import MultipartStream
+from resilience import CircuitOpenError, guarded_call, webhook_timeout
+from response_cache import bump_library_version
+from scheduler import QueueTimeoutError
+from transport import get_http_session
+
+config = get_config()
+
+def _post_file_part(webhook_url: str, fields: dict, files: list[tuple[str, str, str, memoryview]]):
+    """Envía un cuerpo multipart leyendo directamente de los buffers indicados"""
+    body = MultipartStream(fields, files)
+    with guarded_call("upload", webhook_url, fields.get("session_id")) as call:
+        call.request_bytes = len(body)
+        response = get_http_session(webhook_url).post(
+            webhook_url,
+            data=body,
+            headers={"Content-Type": body.content_type},
+            timeout=webhook_timeout("upload", webhook_url)
+        )
+        call.status_code = response.status_code
+        call.response_bytes = len(response.content)
+    return response
+
+def _send_file_in_chunks(
+    file,
+    buffer: memoryview,
+    fields: dict,
+    webhook_url: str,
+    extra_files: Optional[list[tuple[str, str, str, memoryview]]] = None
+) -> tuple[bool, str]:
+    """Envía un archivo grande en fragmentos que el webhook reensambla.
+
+    Cada fragmento lleva `upload_id` (hash del contenido), `chunk_index`,
+    `chunk_count` y `chunk_offset`. El avance se guarda en el registro local,
+    de modo que un nuevo intento continúa desde el último fragmento aceptado.
+    `extra_files` (por ejemplo, el texto extraído) viaja con el último fragmento.
+    """
+    ledger = get_upload_ledger()
+    upload_id = content_hash(file)
+    chunk_size = config.UPLOAD_CHUNK_SIZE_MB * 1024 * 1024
+    chunk_count = (buffer.nbytes + chunk_size - 1) // chunk_size
+    
+    for chunk_index in range(ledger.get_chunk_progress(upload_id), chunk_count):
+        offset = chunk_index * chunk_size
+        chunk_fields = {
+            **fields,
+            "upload_id": upload_id,
+            "chunk_index": chunk_index,
+            "chunk_count": chunk_count,
+            "chunk_offset": offset
+        }
+        parts = [("file", file.name, file.type, buffer[offset:offset + chunk_size])]
+        if extra_files and chunk_index == chunk_count - 1:
+            parts += extra_files
+        response = _post_file_part(webhook_url, chunk_fields, parts)
+        if response.status_code != 200:
+            return False, config.MESSAGES["upload_error"].format(error=f"Error del servidor ({response.status_code})")
+        ledger.set_chunk_progress(upload_id, chunk_index + 1)
+    
+    ledger.clear_chunk_progress(upload_id)
+    return True, config.MESSAGES["upload_success"].format(filename=file.name)
+
+@journaled("send_file", "upload", describe_upload_request)
+def send_file_to_webhook(file, webhook_url: str, session_id: Optional[str] = None) -> tuple[bool, str]:
+    """Envía archivo al servicio de procesamiento"""
+    try:
+        # Vista sin copia del contenido: se usa para el tamaño y para el envío
+        buffer = file.getbuffer()
+        file_size = buffer.nbytes
+        max_size_bytes = config.MAX_FILE_SIZE_MB * 1024 * 1024
+        if file_size > max_size_bytes:
+            return False, config.MESSAGES["file_too_large"].format(filename=file.name, max_size_mb=config.MAX_FILE_SIZE_MB)
+        
+        data = {
+            "filename": file.name,
+            "upload_time": datetime.now().isoformat(),
+            "file_size": file_size
+        }
+        if session_id:
+            data["session_id"] = session_id
+        
+        parts = [("file", file.name, file.type, buffer)]
+        
+        # Texto extraído localmente (opcional): reemplaza al original o lo acompaña
+        extracted = None
+        if config.UPLOAD_PREPROCESS_MODE in ("replace", "alongside"):
+            extracted = extract_for_upload(file.name, buffer)
+        if extracted is not None:
+            text_part = ("text", f"{file.name}.txt.gz", "application/gzip", memoryview(extracted.gzipped))
+            data["text_encoding"] = "gzip"
+            data["text_chars"] = extracted.chars
+            if config.UPLOAD_PREPROCESS_MODE == "replace" and len(extracted.gzipped) < file_size:
+                data["content_mode"] = "text"
+                parts = [text_part]
+            else:
+                parts.append(text_part)
+        
+        if (
+            parts[0][0] == "file"
+            and config.UPLOAD_CHUNKING_ENABLED
+            and file_size > config.UPLOAD_CHUNK_SIZE_MB * 1024 * 1024
+        ):
+            return _send_file_in_chunks(file, buffer, data, webhook_url, extra_files=parts[1:])
+        
+        response = _post_file_part(webhook_url, data, parts)
+        
+        if response.status_code == 200:
+            return True, config.MESSAGES["upload_success"].format(filename=file.name)
+        else:
+            return False, config.MESSAGES["upload_error"].format(error=f"Error del servidor ({response.status_code})")
+            
+    except CircuitOpenError:
+        return False, config.MESSAGES["service_unavailable"]
+    except QueueTimeoutError:
+        return False, config.MESSAGES["service_busy"]
+    except requests.exceptions.Timeout:
+        return False, config.MESSAGES["timeout_error"]
+    except requests.exceptions.ConnectionError:
+        return False, config.MESSAGES["connection_error"]
+    except Exception as e:
+        return False, config.MESSAGES["upload_error"].format(error="Error interno")
+
+def upload_files_concurrently(
+    files: list,
+    webhook_url: str,
+    on_complete: Optional[Callable[[int, int, object, bool, str], None]] = None,
+    session_id: Optional[str] = None
+) -> list[tuple[object, bool, str]]:
+    """Envía varios archivos en paralelo con un número acotado de workers.
+
+    `on_complete(completados, total, archivo, exito, mensaje)` se invoca en el
+    hilo que llama a la función a medida que termina cada envío, por lo que
+    puede actualizar elementos de Streamlit sin problemas.
+    """
+    if not files:
+        return []
+    
+    total = len(files)
+    results: list[Optional[tuple[object, bool, str]]] = [None] * total
+    max_workers = max(1, min(config.UPLOAD_MAX_WORKERS, total))
+    
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="upload") as executor:
+        futures = {
+            executor.submit(send_file_to_webhook, file, webhook_url, session_id): index
+            for index, file in enumerate(files)
+        }
+        for completed, future in enumerate(as_completed(futures), start=1):
+            index = futures[future]
+            file = files[index]
+            success, message = future.result()
+            results[index] = (file, success, message)
+            if on_complete is not None:
+                on_complete(completed, total, file, success, message)
+    
+    return results
+
+def _post_batch(webhook_url: str, body: bytes, session_id: Optional[str] = None):
+    """Envía una petición de ingesta por lotes ya serializada"""
+    with guarded_call("upload", webhook_url, session_id) as call:
+        call.request_bytes = len(body)
+        response = get_http_session(webhook_url).post(
+            webhook_url,
+            data=body,
+            headers={"Content-Type": "application/json"},
+            timeout=webhook_timeout("upload", webhook_url)
+        )
+        call.status_code = response.status_code
+        call.response_bytes = len(response.content)
+    return response
+
+def batching_enabled() -> bool:
+    """La ingesta por lotes necesita su propio webhook: el de upload espera multipart"""
+    return config.UPLOAD_BATCHING_ENABLED and bool(config.UPLOAD_BATCH_WEBHOOK_URL)
+
+@journaled("send_batch", "upload", describe_batch_request)
+def _send_batch_request(
+    webhook_url: str,
+    body: bytes,
+    session_id: Optional[str] = None,
+    filenames: Optional[list[str]] = None
+) -> tuple[bool, str]:
+    """Envía una petición de lote; `filenames` solo se usa en la bitácora"""
+    try:
+        response = _post_batch(webhook_url, body, session_id)
+        if response.status_code == 200:
+            return True, ""
+        return False, config.MESSAGES["upload_error"].format(error=f"Error del servidor ({response.status_code})")
+    except CircuitOpenError:
+        return False, config.MESSAGES["service_unavailable"]
+    except QueueTimeoutError:
+        return False, config.MESSAGES["service_busy"]
+    except requests.exceptions.Timeout:
+        return False, config.MESSAGES["timeout_error"]
+    except requests.exceptions.ConnectionError:
+        return False, config.MESSAGES["connection_error"]
+    except Exception as e:
+        return False, config.MESSAGES["upload_error"].format(error="Error interno")
+
+def upload_files_batched(
+    files: list,
+    webhook_url: str,
+    on_complete: Optional[Callable[[int, int, object, bool, str], None]] = None,
+    session_id: Optional[str] = None
+) -> list[tuple[object, bool, str]]:
+    """Envía varios documentos agrupando sus fragmentos en pocas peticiones.
+
+    El texto de cada archivo se extrae y se divide localmente; los fragmentos
+    de todos los archivos se empaquetan en peticiones JSON de hasta
+    `UPLOAD_BATCH_MAX_REQUEST_KB` al webhook de lotes. Los archivos sin texto
+    extraíble o demasiado grandes se envían por separado como siempre. Un
+    documento se da por agregado cuando todas las peticiones que contienen
+    sus fragmentos fueron aceptadas. `on_complete` funciona igual que en
+    `upload_files_concurrently`. Sin `N8N_UPLOAD_BATCH_WEBHOOK_URL` los
+    archivos se envían uno por uno.
+    """
+    if not files:
+        return []
+    if not config.UPLOAD_BATCH_WEBHOOK_URL:
+        return upload_files_concurrently(files, webhook_url, on_complete=on_complete, session_id=session_id)
+    
+    total = len(files)
+    results: list[Optional[tuple[object, bool, str]]] = [None] * total
+    batch_url = config.UPLOAD_BATCH_WEBHOOK_URL
+    max_workers = max(1, min(config.UPLOAD_MAX_WORKERS, total))
+    max_size_bytes = config.MAX_FILE_SIZE_MB * 1024 * 1024
+    
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="upload") as executor:
+        def extract(file) -> Optional[str]:
+            buffer = file.getbuffer()
+            if buffer.nbytes > max_size_bytes:
+                return None
+            return extract_plain_text(file.name, buffer)
+        
+        texts = list(executor.map(extract, files))
+        
+        documents = []
+        document_files = []
+        for index, (file, text) in enumerate(zip(files, texts)):
+            if text is None:
+                continue
+            documents.append({
+                "document_id": content_hash(file),
+                "filename": file.name,
+                "file_size": file.getbuffer().nbytes,
+                "content_type": file.type,
+                "chunks": chunk_text(text, config.UPLOAD_BATCH_CHUNK_CHARS, config.UPLOAD_BATCH_CHUNK_OVERLAP),
+            })
+            document_files.append(index)
+        
+        fields = {
+            "batch_id": uuid.uuid4().hex,
+            "upload_time": datetime.now().isoformat(),
+            "chunk_chars": config.UPLOAD_BATCH_CHUNK_CHARS,
+            "chunk_overlap": config.UPLOAD_BATCH_CHUNK_OVERLAP,
+        }
+        if session_id:
+            fields["session_id"] = session_id
+        payloads = build_batch_payloads(documents, fields, config.UPLOAD_BATCH_MAX_REQUEST_KB * 1024)
+        
+        # Peticiones pendientes y primer error de cada documento del lote
+        pending_requests = {index: 0 for index in range(len(documents))}
+        for _, document_indexes in payloads:
+            for document_index in document_indexes:
+                pending_requests[document_index] += 1
+        errors: dict[int, str] = {}
+        
+        futures = {}
+        for body, document_indexes in payloads:
+            filenames = [files[document_files[index]].name for index in sorted(document_indexes)]
+            future = executor.submit(_send_batch_request, batch_url, body, session_id, filenames)
+            futures[future] = ("batch", document_indexes)
+        batched = set(document_files)
+        for index, file in enumerate(files):
+            if index not in batched:
+                futures[executor.submit(send_file_to_webhook, file, webhook_url, session_id)] = ("file", index)
+        
+        completed = 0
+        for future in as_completed(futures):
+            kind, target = futures[future]
+            success, message = future.result()
+            if kind == "file":
+                finished = [(target, success, message)]
+            else:
+                finished = []
+                for document_index in sorted(target):
+                    if not success:
+                        errors.setdefault(document_index, message)
+                    pending_requests[document_index] -= 1
+                    if pending_requests[document_index] == 0:
+                        file_index = document_files[document_index]
+                        if document_index in errors:
+                            finished.append((file_index, False, errors[document_index]))
+                        else:
+                            finished.append((
+                                file_index, True,
+                                config.MESSAGES["upload_success"].format(filename=files[file_index].name)
+                            ))
+            
+            for file_index, file_success, file_message in finished:
+                completed += 1
+                results[file_index] = (files[file_index], file_success, file_message)
+                if on_complete is not None:
+                    on_complete(completed, total, files[file_index], file_success, file_message)
+    
+    return results
+
+def upload_files(
+    files: list,
+    webhook_url: str,
+    on_complete: Optional[Callable[[int, int, object, bool, str], None]] = None,
+    session_id: Optional[str] = None
+) -> list[tuple[object, bool, str]]:
+    """Envía un lote de archivos usando la ingesta por lotes si está activada"""
+    if batching_enabled() and len(files) > 1:
+        return upload_files_batched(files, webhook_url, on_complete=on_complete, session_id=session_id)
+    return upload_files_concurrently(files, webhook_url, on_complete=on_complete, session_id=session_id)
+
+def register_successful_upload(digest: str, filename: str, size: int, content_type: Optional[str] = None) -> None:
+    """Registra un documento ingerido y marca la biblioteca como modificada"""
+    get_upload_ledger().record(digest, filename, size)
+    get_document_index().mark_ingested(digest, filename, size, content_type)
+    bump_library_version()
+
+def register_failed_upload(digest: str, filename: str, size: int, content_type: Optional[str] = None, message: str = "") -> None:
+    """Deja constancia en el índice de la biblioteca de un documento que no se pudo agregar"""
+    get_document_index().mark_failed(digest, filename, size, content_type, message)
+
+def register_queued_uploads(files: list[tuple[object, str]]) -> None:
+    """Agrega al índice de la biblioteca los documentos encolados para carga"""
+    index = get_document_index()
+    for file, digest in files:
+        index.mark_queued(digest, file.name, file.size, file.type)
+
+def partition_new_files(files: list, skip_duplicates: bool = True) -> tuple[list[tuple[object, str]], list]:
+    """Separa los archivos nuevos de los que ya están en la biblioteca.
+
+    Retorna `(nuevos, duplicados)`, donde `nuevos` es una lista de pares
+    `(archivo, hash)`. La comprobación se hace contra el registro local, sin
+    ninguna petición de red, e incluye archivos repetidos dentro del lote.
+    """
+    ledger = get_upload_ledger()
+    new_files = []
+    duplicates = []
+    seen = set()
+    
+    for file in files:
+        digest = content_hash(file)
+        if skip_duplicates and (digest in seen or ledger.find(digest) is not None):
+            duplicates.append(file)
+            continue
+        seen.add(digest)
+        new_files.append((file, digest))
+    
+    return new_files, duplicates
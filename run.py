@@ -2,22 +2,35 @@
 """
 Script de inicio rápido para el Asistente Legal Inteligente.
 Este script facilita el inicio de la aplicación Streamlit.
+
+Uso:
+    python run.py                          # desarrollo: un proceso, recarga al guardar
+    python run.py --production             # producción: un proceso por núcleo
+    python run.py --workers 4 --port 8501  # producción con 4 procesos
 """
 
+import argparse
+import asyncio
+import importlib.util
+import secrets
+import signal
 import subprocess
 import sys
 import os
+import threading
+import time
 from pathlib import Path
 
 def check_requirements():
     """Verifica que las dependencias estén instaladas"""
-    try:
-        import streamlit
-        import requests
+    # Solo se busca el paquete, sin importarlo: Streamlit se importa una única
+    # vez, al iniciar la aplicación
+    missing = [name for name in ("streamlit", "requests") if importlib.util.find_spec(name) is None]
+    if not missing:
         print("✅ Todas las dependencias están instaladas")
         return True
-    except ImportError as e:
-        print(f"❌ Falta instalar dependencias: {e}")
+    else:
+        print(f"❌ Falta instalar dependencias: {', '.join(missing)}")
         print("💡 Ejecuta: pip install -r requirements.txt")
         return False
 
@@ -47,11 +60,25 @@ def check_config():
             print("⚠️  Los webhooks usan URLs de ejemplo")
             print("💡 Para funcionalidad completa, configura las URLs reales en core/config.py")
         
+        if config.UPLOAD_BATCHING_ENABLED and not config.UPLOAD_BATCH_WEBHOOK_URL:
+            print("⚠️  UPLOAD_BATCHING_ENABLED requiere N8N_UPLOAD_BATCH_WEBHOOK_URL; los documentos se enviarán uno por uno")
+        
         return True
     except Exception as e:
         print(f"❌ Error al verificar configuración: {e}")
         return False
 
+def start_upload_jobs():
+    """Inicia la cola de cargas de este proceso para retomar los envíos
+    pendientes sin esperar a que se abra una sesión"""
+    core_dir = str(Path("core").resolve())
+    if core_dir not in sys.path:
+        sys.path.insert(0, core_dir)
+    from config import get_config
+    if get_config().UPLOAD_BACKGROUND_ENABLED:
+        from jobs import get_upload_job_queue
+        get_upload_job_queue()
+
 def run_streamlit():
     """Ejecuta la aplicación Streamlit"""
     try:
@@ -61,22 +88,127 @@ def run_streamlit():
         print("⛔ Presiona Ctrl+C para detener la aplicación")
         print("✨ ¡Disfruta de tu asistente legal!\n")
         
-        # Ejecutar streamlit
-        subprocess.run([
-            sys.executable, "-m", "streamlit", "run", 
+        # Ejecutar streamlit en este mismo proceso (sin un segundo intérprete);
+        # la aplicación usa la misma cola de cargas
+        start_upload_jobs()
+        from streamlit.web import cli as streamlit_cli
+        
+        sys.argv = [
+            "streamlit", "run",
             "core/main.py",
             "--server.headless", "false",
             "--server.runOnSave", "true",
             "--browser.gatherUsageStats", "false"
-        ])
+        ]
+        streamlit_cli.main()
         
     except KeyboardInterrupt:
         print("\n👋 ¡Gracias por usar el Asistente Legal Inteligente!")
     except Exception as e:
         print(f"❌ Error al ejecutar la aplicación: {e}")
 
+def worker_path(path: str, index: int) -> str:
+    """Archivo propio de un proceso: `webhooks.jsonl` -> `webhooks.worker1.jsonl`"""
+    root, extension = os.path.splitext(path)
+    return f"{root}.worker{index}{extension}"
+
+def worker_environment(index: int, cookie_secret: str) -> dict:
+    """Variables de entorno de un proceso de Streamlit del modo de producción"""
+    from core.config import get_config
+    config = get_config()
+    
+    env = dict(os.environ, APP_WORKER_ID=str(index), SHARED_STORE_ENABLED="true")
+    env["STREAMLIT_SERVER_COOKIE_SECRET"] = cookie_secret
+    # Los archivos que cada proceso escribe por su cuenta no se comparten
+    env["JOURNAL_PATH"] = worker_path(config.JOURNAL_PATH, index)
+    if config.METRICS_FILE_PATH:
+        env["METRICS_FILE_PATH"] = worker_path(config.METRICS_FILE_PATH, index)
+    if config.METRICS_PORT:
+        env["METRICS_PORT"] = str(config.METRICS_PORT + index)
+    return env
+
+def start_worker(index: int, port: int, cookie_secret: str) -> subprocess.Popen:
+    return subprocess.Popen(
+        [
+            sys.executable, "-m", "streamlit", "run",
+            "core/main.py",
+            "--server.address", "127.0.0.1",
+            "--server.port", str(port),
+            "--server.headless", "true",
+            "--server.runOnSave", "false",
+            "--server.fileWatcherType", "none",
+            "--browser.gatherUsageStats", "false"
+        ],
+        env=worker_environment(index, cookie_secret)
+    )
+
+def supervise_workers(workers: list, ports: list[int], cookie_secret: str, stopping: threading.Event):
+    """Reinicia los procesos de Streamlit que terminen inesperadamente"""
+    while not stopping.wait(1.0):
+        for index, process in enumerate(workers):
+            if process.poll() is not None:
+                print(f"⚠️  El proceso {index} terminó (código {process.returncode}); reiniciando...")
+                workers[index] = start_worker(index, ports[index], cookie_secret)
+
+def run_production(workers: int, host: str, port: int):
+    """Ejecuta N procesos de Streamlit detrás del proxy con sesiones fijas"""
+    from core.config import get_config
+    from core.proxy import StickyProxy
+    
+    config = get_config()
+    
+    ports = [port + 1 + index for index in range(workers)]
+    # Todos los procesos firman las cookies de Streamlit con el mismo secreto
+    cookie_secret = os.getenv("STREAMLIT_SERVER_COOKIE_SECRET") or secrets.token_hex(32)
+    processes = [start_worker(index, worker_port, cookie_secret) for index, worker_port in enumerate(ports)]
+    # Los procesos de Streamlit solo inician su cola al abrirse la primera
+    # sesión; este proceso la atiende desde el arranque como un proceso más
+    os.environ.update(worker_environment(workers, cookie_secret))
+    start_upload_jobs()
+    stopping = threading.Event()
+    # Con SIGTERM (systemd, docker stop) también se detienen los procesos hijos
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    threading.Thread(
+        target=supervise_workers, args=(processes, ports, cookie_secret, stopping), daemon=True
+    ).start()
+    
+    print(f"\n🚀 Iniciando el Asistente Legal Inteligente en modo producción ({workers} procesos)...")
+    print(f"🌐 URL: http://{'localhost' if host in ('0.0.0.0', '::') else host}:{port}")
+    print(f"⚙️  Procesos de Streamlit en los puertos {ports[0]}-{ports[-1]} (solo locales)")
+    print("⛔ Presiona Ctrl+C para detener la aplicación\n")
+    
+    try:
+        asyncio.run(StickyProxy(
+            [("127.0.0.1", worker_port) for worker_port in ports], host, port,
+            session_max_age=int(config.CHAT_HISTORY_MAX_AGE_DAYS * 86400)
+        ).serve_forever())
+    except KeyboardInterrupt:
+        print("\n👋 ¡Gracias por usar el Asistente Legal Inteligente!")
+    except Exception as e:
+        print(f"❌ Error al ejecutar la aplicación: {e}")
+    finally:
+        stopping.set()
+        for process in processes:
+            process.terminate()
+        deadline = time.monotonic() + 10
+        for process in processes:
+            try:
+                process.wait(timeout=max(0.1, deadline - time.monotonic()))
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Inicia el Asistente Legal Inteligente")
+    parser.add_argument("--production", action="store_true", help="Un proceso de Streamlit por núcleo detrás de un proxy")
+    parser.add_argument("--workers", type=int, default=0, help="Procesos de Streamlit (implica --production)")
+    parser.add_argument("--host", default="0.0.0.0", help="Dirección del proxy en modo producción")
+    parser.add_argument("--port", type=int, default=8501, help="Puerto público en modo producción")
+    return parser.parse_args()
+
 def main():
     """Función principal"""
+    args = parse_arguments()
+    
     print("⚖️ Asistente Legal Inteligente - Inicio Rápido")
     print("=" * 55)
     print("🎯 Aplicación plug-and-play para consultas legales inteligentes")
@@ -103,7 +235,10 @@ def main():
     print("\n🎉 Todo listo para comenzar!")
     
     # Ejecutar aplicación
-    run_streamlit()
+    if args.production or args.workers:
+        run_production(args.workers or os.cpu_count() or 1, args.host, args.port)
+    else:
+        run_streamlit()
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file